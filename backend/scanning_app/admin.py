@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ScannedItem
+from .models import ScannedItem, LabelCategory, ScanDailyStats, ScanLabel
 # Register your models here.
 
 @admin.register(ScannedItem)
@@ -12,3 +12,23 @@ class ScannedItemAdmin(admin.ModelAdmin):
 
     def get_query(self,request):
         return super().get_queryset(request).select_related()
+
+
+@admin.register(LabelCategory)
+class LabelCategoryAdmin(admin.ModelAdmin):
+    list_display = ['label','category','source','updated_at']
+    list_filter = ['category','source']
+    search_fields = ['label']
+
+
+@admin.register(ScanDailyStats)
+class ScanDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['day','user','scan_type','status','count']
+    list_filter = ['scan_type','status','day']
+
+
+@admin.register(ScanLabel)
+class ScanLabelAdmin(admin.ModelAdmin):
+    list_display = ['label','category','confidence','scan','scanned_at']
+    list_filter = ['category']
+    raw_id_fields = ['scan','user']
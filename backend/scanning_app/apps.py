@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ScanningAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scanning_app'
+
+    def ready(self):
+        from . import signal
@@ -0,0 +1,17 @@
+import time
+from django.core.management.base import BaseCommand
+from ...services.archive_service import ArchiveService
+
+
+class Command(BaseCommand):
+    help = 'Move scans older than the retention window from ScannedItem into compressed ArchivedScan rows'
+
+    def add_arguments(self,parser):
+        parser.add_argument('--days',type=int,default=None,help='Retention window in days (default: SCAN_ARCHIVE_RETENTION_DAYS)')
+        parser.add_argument('--chunk-size',type=int,default=1000,help='Scans moved per transaction')
+        parser.add_argument('--limit',type=int,default=None,help='Stop after moving this many scans')
+
+    def handle(self,*args,**options):
+        started = time.monotonic()
+        archived = ArchiveService.archive(days=options['days'],chunk_size=options['chunk_size'],limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} scans in {time.monotonic() - started:.1f}s"))
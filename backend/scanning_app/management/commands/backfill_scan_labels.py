@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ...services.label_service import LabelService
+
+
+class Command(BaseCommand):
+    help = 'Populate ScanLabel from the object_labels and detection metadata of existing scans'
+
+    def add_arguments(self,parser):
+        parser.add_argument('--chunk-size',type=int,default=1000,help='Scans processed per transaction')
+
+    def handle(self,*args,**options):
+        written = LabelService.backfill(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} scan labels"))
@@ -0,0 +1,126 @@
+import math
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from PIL import Image
+from ...services.provider_standin import ProviderStandinServer, VOCABULARY, load_profiles
+
+
+def percentile(ordered,p):
+    # Nearest rank on an already sorted list.
+    return ordered[max(0,min(len(ordered) - 1,math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark VisionService detect_objects / get_product_details against the provider stand-in'
+
+    def add_arguments(self,parser):
+        parser.add_argument('--target',choices=['detect','product','both'],default='both',help='Which call to drive')
+        parser.add_argument('--requests',type=int,default=200,help='Timed calls per target')
+        parser.add_argument('--warmup',type=int,default=10,help='Untimed calls before each run')
+        parser.add_argument('--concurrency',type=int,default=8,help='Calls in flight at once')
+        parser.add_argument('--mode',choices=['sequential','hedged'],help='VISION_DETECTION_MODE for the run')
+        parser.add_argument('--batching',action='store_true',help='Enable VISION_BATCHING for Google Vision/Clarifai')
+        parser.add_argument('--enrich',action='store_true',help='Let unknown labels go to Datamuse (writes LabelCategory rows)')
+        parser.add_argument('--standin',help='URL of a running run_provider_standin; by default one is started in-process')
+        parser.add_argument('--profiles',help='JSON file of stand-in endpoint profiles (in-process stand-in only)')
+        parser.add_argument(
+            '--set',
+            action='append',
+            default=[],
+            dest='overrides',
+            metavar='ENDPOINT.KEY=VALUE',
+            help='Override one stand-in profile value (repeatable)'
+        )
+        parser.add_argument('--seed',type=int,help='Seed for the in-process stand-in')
+
+    def handle(self,*args,**options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+
+        server = None
+        url = options['standin']
+        if not url:
+            try:
+                profiles = load_profiles(options['profiles'],options['overrides'])
+            except (OSError,ValueError) as e:
+                raise CommandError(str(e))
+            server = ProviderStandinServer(('127.0.0.1',0),profiles,seed=options['seed'])
+            server.start()
+            url = server.url
+
+        batching = dict(getattr(settings,'VISION_BATCHING',{}),ENABLED=options['batching'])
+        # Every outbound call goes to the stand-in; providers are switched on
+        # with dummy keys, and the ones it doesn't serve are switched off.
+        overrides = override_settings(
+            VISION_HTTP_HOST_OVERRIDES={'*':url},
+            IMAGGA_API_KEY='standin',
+            IMAGGA_API_SECRET='standin',
+            GOOGLE_VISION_API_KEY='standin',
+            CLARIFAI_API_KEY='standin',
+            GEMINI_API_KEY='',
+            OPENA1_API_KEY='',
+            VISION_DETECTION_MODE=options['mode'] or getattr(settings,'VISION_DETECTION_MODE','sequential'),
+            VISION_BATCHING=batching,
+            VISION_CATEGORY_ENRICHMENT=options['enrich']
+        )
+
+        try:
+            with overrides,tempfile.TemporaryDirectory() as directory:
+                from ...services.vision_service import VisionService
+
+                service = VisionService()
+                self.stdout.write(
+                    f"Stand-in {url}, mode {service.detection_mode}, batching {'on' if options['batching'] else 'off'}, "
+                    f"concurrency {options['concurrency']}"
+                )
+                if options['target'] in ('detect','both'):
+                    images = self._images(directory,options['warmup'] + options['requests'])
+                    self._run('detect_objects',service.detect_objects,images,options)
+                if options['target'] in ('product','both'):
+                    names = [f"{VOCABULARY[index % len(VOCABULARY)][0]} {index}" for index in range(options['warmup'] + options['requests'])]
+                    self._run('get_product_details',service.get_product_details,names,options)
+        finally:
+            if server is not None:
+                server.stop()
+                for name,counts in server.counts.items():
+                    self.stdout.write(f"  stand-in {name:<14} {counts}")
+
+    def _images(self,directory,count):
+        # Distinct random images, so every call misses the detection cache.
+        paths = []
+        for index in range(count):
+            path = os.path.join(directory,f"bench-{index}.jpg")
+            Image.frombytes('RGB',(96,96),os.urandom(96 * 96 * 3)).save(path,'JPEG')
+            paths.append(path)
+        return paths
+
+    def _run(self,label,call,inputs,options):
+        warmup,timed = inputs[:options['warmup']],inputs[options['warmup']:]
+
+        def timed_call(value):
+            started = time.perf_counter()
+            result = call(value)
+            return time.perf_counter() - started,result.get('api_used','?')
+
+        with ThreadPoolExecutor(max_workers=options['concurrency'],thread_name_prefix='bench') as executor:
+            list(executor.map(timed_call,warmup))
+            started = time.perf_counter()
+            results = list(executor.map(timed_call,timed))
+            wall = time.perf_counter() - started
+
+        latencies = sorted(elapsed for elapsed,_ in results)
+        sources = Counter(source for _,source in results)
+
+        self.stdout.write(f"{label}: {len(timed)} calls in {wall:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"  throughput {len(timed) / wall:.1f} calls/s"))
+        self.stdout.write(
+            f"  latency ms  p50 {percentile(latencies,50) * 1000:.0f}  p95 {percentile(latencies,95) * 1000:.0f}  "
+            f"p99 {percentile(latencies,99) * 1000:.0f}  max {latencies[-1] * 1000:.0f}"
+        )
+        self.stdout.write(f"  answered by {dict(sources.most_common())}")
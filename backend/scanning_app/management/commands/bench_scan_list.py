@@ -0,0 +1,85 @@
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from ...models import ScannedItem, ProductInfo
+from ...renderers import ORJSONRenderer
+from ...serializers import ScannedItemSerializer, ScannedItemListSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare scan list serialization throughput: ModelSerializer + JSONRenderer vs the values() fast path + orjson'
+
+    def add_arguments(self,parser):
+        parser.add_argument('--rows',type=int,default=10000,help='Scans in the throwaway fixture')
+        parser.add_argument('--repeat',type=int,default=5,help='Timed runs per variant; the best one is reported')
+
+    def handle(self,*args,**options):
+        # The fixture lives inside a transaction that is always rolled back.
+        try:
+            with transaction.atomic():
+                self._run(options['rows'],options['repeat'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _fixture(self,rows):
+        user = User.objects.create(username=f"bench-{uuid.uuid4().hex[:12]}")
+        products = ProductInfo.objects.bulk_create([ProductInfo(name=f"Product {index}",brand='Bench') for index in range(50)])
+        now = timezone.now()
+        ScannedItem.objects.bulk_create([
+            ScannedItem(
+                user=user,
+                scan_data=f"bench scan {index}",
+                scan_type='image',
+                timestamp=now - timezone.timedelta(seconds=index),
+                status='processed',
+                metadata={'detection':{'source':'bench','confidence':90}},
+                image=f"scans/bench-{index}.jpg",
+                product_info=products[index % len(products)],
+                is_object_detected=True,
+                object_labels=['bottle','cup','table']
+            )
+            for index in range(rows)
+        ],batch_size=1000)
+        return user
+
+    def _best(self,fn,repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            size = fn()
+            timings.append(time.perf_counter() - started)
+        return min(timings),size
+
+    def _run(self,rows,repeat):
+        user = self._fixture(rows)
+        scans = ScannedItem.objects.filter(user=user).order_by('-timestamp','-id')
+
+        def before():
+            data = ScannedItemSerializer(scans.all(),many=True).data
+            return len(JSONRenderer().render(data))
+
+        def after():
+            data = ScannedItemListSerializer(scans.values(*ScannedItemListSerializer.COLUMNS),many=True).data
+            return len(ORJSONRenderer().render(data))
+
+        first = ScannedItemSerializer(scans[:1],many=True).data
+        fast = ScannedItemListSerializer(scans.values(*ScannedItemListSerializer.COLUMNS)[:1],many=True).data
+        if [dict(item) for item in first] != fast:
+            self.stderr.write(self.style.ERROR('Fast serializer output differs from ScannedItemSerializer'))
+
+        before_time,before_size = self._best(before,repeat)
+        after_time,after_size = self._best(after,repeat)
+
+        self.stdout.write(f"{rows} rows, best of {repeat} (query + serialize + render)")
+        self.stdout.write(f"  ModelSerializer + JSONRenderer:   {before_time:.3f}s  {rows / before_time:,.0f} rows/s  {before_size:,} bytes")
+        self.stdout.write(f"  values() fast path + ORJSON:      {after_time:.3f}s  {rows / after_time:,.0f} rows/s  {after_size:,} bytes")
+        self.stdout.write(self.style.SUCCESS(f"  speedup: {before_time / after_time:.1f}x"))
@@ -0,0 +1,34 @@
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from ...services.subscription_service import SubscriptionService
+
+
+class Command(BaseCommand):
+    help = 'Deactivate lapsed subscriptions and drop premium from their users, in bulk'
+
+    def add_arguments(self,parser):
+        parser.add_argument('--chunk-size',type=int,default=1000,help='Subscriptions expired per transaction')
+        parser.add_argument('--loop',action='store_true',help='Keep running, sweeping every --interval seconds')
+        parser.add_argument('--interval',type=float,default=60.0,help='Seconds between sweeps in --loop mode')
+
+    def handle(self,*args,**options):
+        stopping = []
+        signal.signal(signal.SIGTERM,lambda *args: stopping.append(True))
+
+        while True:
+            close_old_connections()
+            started = time.monotonic()
+            expired = SubscriptionService.expire_subscriptions(chunk_size=options['chunk_size'])
+            if expired or not options['loop']:
+                self.stdout.write(f"Expired {expired} subscriptions in {(time.monotonic() - started) * 1000:.1f}ms")
+
+            if not options['loop'] or stopping:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
+            if stopping:
+                break
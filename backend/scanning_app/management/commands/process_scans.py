@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from ...services.recognition_queue import RecognitionQueue
+
+
+def run_worker(worker_id,options):
+    import django
+    django.setup()
+
+    stopping = []
+    signal.signal(signal.SIGTERM,lambda *args: stopping.append(True))
+
+    queue = RecognitionQueue(
+        worker_id,
+        lease_seconds=options['lease_seconds'],
+        max_attempts=options['max_attempts'],
+        batch_size=options['batch_size'],
+        retry_delay=options['retry_delay']
+    )
+
+    while not stopping:
+        close_old_connections()
+        queue.expire_exhausted()
+        items = queue.claim()
+
+        if not items:
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+            continue
+
+        queue.process_batch(items)
+
+
+class Command(BaseCommand):
+    help = 'Run recognition workers that claim pending scans and fill in detection results'
+
+    def add_arguments(self,parser):
+        parser.add_argument('--workers',type=int,default=2,help='Number of worker processes')
+        parser.add_argument('--batch-size',type=int,default=1,help='Scans claimed per poll; their detections run concurrently')
+        parser.add_argument('--lease-seconds',type=int,default=120,help='Visibility timeout for a claimed scan')
+        parser.add_argument('--max-attempts',type=int,default=3,help='Attempts before a scan is marked failed')
+        parser.add_argument('--retry-delay',type=int,default=30,help='Seconds before a failed scan is retried')
+        parser.add_argument('--poll-interval',type=float,default=2.0,help='Sleep between empty polls')
+        parser.add_argument('--once',action='store_true',help='Exit when the queue is empty')
+
+    def handle(self,*args,**options):
+        prefix = f"{socket.gethostname()}-{os.getpid()}"
+
+        if options['workers'] <= 1:
+            run_worker(f"{prefix}-0",options)
+            return
+
+        # Children must open their own database connections.
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=run_worker,args=(f"{prefix}-{index}",options),daemon=True)
+            for index in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} recognition workers")
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+            for worker in workers:
+                worker.join()
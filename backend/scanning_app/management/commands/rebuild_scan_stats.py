@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from ...services.stats_service import StatsService
+
+
+class Command(BaseCommand):
+    help = 'Recompute the ScanDailyStats rollup from ScannedItem (backfill or repair)'
+
+    def add_arguments(self,parser):
+        parser.add_argument('--chunk-size',type=int,default=1000,help='Rollup rows inserted per batch')
+
+    def handle(self,*args,**options):
+        created = StatsService.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt scan stats: {created} rollup rows"))
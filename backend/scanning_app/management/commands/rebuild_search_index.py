@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from ...services.search_service import SearchService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text scan search index from ScannedItem and ProductInfo'
+
+    def add_arguments(self,parser):
+        parser.add_argument('--chunk-size',type=int,default=2000,help='Scans indexed per batch')
+
+    def handle(self,*args,**options):
+        if not SearchService.enabled():
+            self.stdout.write(self.style.WARNING('Full-text search is not supported on this database backend'))
+            return
+        written = SearchService.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} scans"))
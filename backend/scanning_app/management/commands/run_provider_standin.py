@@ -0,0 +1,43 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from ...services.provider_standin import ProviderStandinServer, load_profiles
+
+
+class Command(BaseCommand):
+    help = 'Serve stand-in Imagga, Google Vision, Clarifai, Datamuse, Wikipedia and Open Food Facts endpoints for benchmarks'
+
+    def add_arguments(self,parser):
+        parser.add_argument('--host',default='127.0.0.1',help='Address to bind')
+        parser.add_argument('--port',type=int,default=8765,help='Port to bind')
+        parser.add_argument('--profiles',help='JSON file of per-endpoint latency/error profiles')
+        parser.add_argument(
+            '--set',
+            action='append',
+            default=[],
+            dest='overrides',
+            metavar='ENDPOINT.KEY=VALUE',
+            help='Override one profile value, e.g. imagga.error_rate=0.2 (repeatable)'
+        )
+        parser.add_argument('--seed',type=int,help='Seed for latency and error sampling')
+
+    def handle(self,*args,**options):
+        try:
+            profiles = load_profiles(options['profiles'],options['overrides'])
+        except (OSError,ValueError) as e:
+            raise CommandError(str(e))
+
+        server = ProviderStandinServer((options['host'],options['port']),profiles,seed=options['seed'])
+        for name,profile in server.profiles.items():
+            self.stdout.write(f"  {name:<14} {json.dumps(profile)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Provider stand-in on {server.url}; set VISION_HTTP_HOST_OVERRIDES = {{'*': '{server.url}'}}"
+        ))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            for name,counts in server.counts.items():
+                self.stdout.write(f"  {name:<14} {counts}")
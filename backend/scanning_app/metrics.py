@@ -0,0 +1,159 @@
+import hmac
+import ipaddress
+import os
+from django.conf import settings
+from django.http import HttpResponse
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+except ImportError:
+    prometheus_client = None
+
+# Under gunicorn, export PROMETHEUS_MULTIPROC_DIR (an empty directory) before
+# the workers start: each process then writes its samples to its own mmap
+# files there and /metrics aggregates all of them. Without it the metrics are
+# per process. Without prometheus_client every call below is a no-op.
+
+LATENCY_BUCKETS = (0.025,0.05,0.1,0.25,0.5,1.0,2.0,5.0,10.0,20.0,30.0)
+QUERY_BUCKETS = (1,2,3,5,8,13,21,34,55,89)
+DB_TIME_BUCKETS = (0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1.0,2.5)
+# Any other verb a client sends is reported as 'other', so it can't add series.
+HTTP_METHODS = frozenset(('GET','HEAD','POST','PUT','PATCH','DELETE','OPTIONS','TRACE','CONNECT'))
+
+
+class _NoopMetric:
+
+    def labels(self,*args,**kwargs):
+        return self
+
+    def observe(self,value):
+        pass
+
+    def inc(self,amount=1):
+        pass
+
+
+if prometheus_client is not None:
+    PROVIDER_LATENCY = Histogram(
+        'scanning_provider_latency_seconds',
+        'Latency of calls to vision and product providers',
+        ['provider','kind','outcome'],
+        buckets=LATENCY_BUCKETS
+    )
+    PROVIDER_SKIPS = Counter(
+        'scanning_provider_skipped_total',
+        'Provider calls skipped because the circuit breaker was open',
+        ['provider']
+    )
+    CACHE_LOOKUPS = Counter(
+        'scanning_cache_lookups_total',
+        'Detection and product cache lookups',
+        ['cache','result']
+    )
+    QUOTA_REJECTIONS = Counter(
+        'scanning_quota_rejections_total',
+        'Scans refused because the user is out of quota',
+        ['source']
+    )
+    REQUEST_DURATION = Histogram(
+        'scanning_request_duration_seconds',
+        'Request duration per view',
+        ['view','method','status'],
+        buckets=LATENCY_BUCKETS
+    )
+    REQUEST_QUERIES = Histogram(
+        'scanning_request_db_queries',
+        'SQL statements run per request',
+        ['view','method'],
+        buckets=QUERY_BUCKETS
+    )
+    REQUEST_DB_TIME = Histogram(
+        'scanning_request_db_seconds',
+        'Time spent in SQL per request',
+        ['view','method'],
+        buckets=DB_TIME_BUCKETS
+    )
+    QUERY_BUDGET_EXCEEDED = Counter(
+        'scanning_query_budget_exceeded_total',
+        'Requests that ran more queries than their view declares',
+        ['view','method']
+    )
+else:
+    PROVIDER_LATENCY = PROVIDER_SKIPS = CACHE_LOOKUPS = QUOTA_REJECTIONS = REQUEST_DURATION = _NoopMetric()
+    REQUEST_QUERIES = REQUEST_DB_TIME = QUERY_BUDGET_EXCEEDED = _NoopMetric()
+
+
+def observe_provider(provider,kind,outcome,seconds):
+    # kind is 'detection' or 'product'; outcome is 'success', 'failure',
+    # 'error' or 'deadline' (cut short by the scan's own deadline).
+    PROVIDER_LATENCY.labels(provider,kind,outcome).observe(seconds)
+
+
+def provider_skipped(provider):
+    PROVIDER_SKIPS.labels(provider).inc()
+
+
+def cache_lookup(cache,hit):
+    CACHE_LOOKUPS.labels(cache,'hit' if hit else 'miss').inc()
+
+
+def quota_rejected(source):
+    QUOTA_REJECTIONS.labels(source).inc()
+
+
+def method_label(method):
+    return method if method in HTTP_METHODS else 'other'
+
+
+def observe_request(view,method,status,seconds):
+    REQUEST_DURATION.labels(view,method_label(method),str(status)).observe(seconds)
+
+
+def observe_queries(view,method,count,seconds):
+    REQUEST_QUERIES.labels(view,method_label(method)).observe(count)
+    REQUEST_DB_TIME.labels(view,method_label(method)).observe(seconds)
+
+
+def query_budget_exceeded(view,method):
+    QUERY_BUDGET_EXCEEDED.labels(view,method_label(method)).inc()
+
+
+def _registry():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def _allowed(request):
+    # Either a scraper presenting METRICS['TOKEN'] as a bearer token, or a
+    # client address inside one of METRICS['ALLOWED_IPS'] (addresses or networks).
+    config = getattr(settings,'METRICS',{})
+    token = config.get('TOKEN','')
+    if token:
+        scheme,_,presented = request.META.get('HTTP_AUTHORIZATION','').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(presented.encode(),token.encode()):
+            return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR',''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network,strict=False) for network in config.get('ALLOWED_IPS',()))
+
+
+def metrics_view(request):
+    if not _allowed(request):
+        return HttpResponse('Forbidden\n',status=403,content_type='text/plain')
+    if prometheus_client is None:
+        return HttpResponse('prometheus_client is not installed\n',status=503,content_type='text/plain')
+    return HttpResponse(generate_latest(_registry()),content_type=CONTENT_TYPE_LATEST)
+
+
+def child_exit(server,worker):
+    # gunicorn hook (child_exit = scanning_app.metrics.child_exit in its
+    # config) so a dead worker's live samples stop being reported.
+    if prometheus_client is not None and os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,19 @@
+import time
+from .. import metrics
+
+
+class MetricsMiddleware:
+    # Times every request end to end and records it under the resolved view
+    # name, so the label set stays bounded whatever the URL parameters are.
+
+    def __init__(self,get_response):
+        self.get_response = get_response
+
+    def __call__(self,request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+
+        match = getattr(request,'resolver_match',None)
+        view = match.view_name if match is not None else 'unresolved'
+        metrics.observe_request(view,request.method,response.status_code,time.perf_counter() - started)
+        return response
@@ -0,0 +1,190 @@
+import atexit
+import cProfile
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+import logging
+
+logger = logging.getLogger(__name__)
+
+# PROFILING = {
+#     'ENABLED': False,          # off: the middleware is removed from the chain
+#     'SAMPLE_RATE': 0.0,        # fraction of requests profiled at random
+#     'HEADER': 'X-Profile',     # staff (or TOKEN holders) can force a profile
+#     'TOKEN': '',
+#     'MODE': 'sampling',        # 'sampling' (stack sampler) or 'cprofile'
+#     'INTERVAL': 0.005,         # seconds between stack samples
+#     'FLUSH_INTERVAL': 60,      # seconds between rewrites of collapsed-<pid>.txt
+#     'DIRECTORY': BASE_DIR / 'profiles',
+# }
+
+DEFAULTS = {
+    'ENABLED':False,
+    'SAMPLE_RATE':0.0,
+    'HEADER':'X-Profile',
+    'TOKEN':'',
+    'MODE':'sampling',
+    'INTERVAL':0.005,
+    'FLUSH_INTERVAL':60,
+    'DIRECTORY':'profiles',
+}
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    # Samples one thread's Python stack every interval seconds from a side
+    # thread and counts identical stacks, root first, in collapsed form
+    # ("a;b;c count") as flamegraph.pl and speedscope read it.
+
+    def __init__(self,thread_id,interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run,name='profile-sampler',daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+
+class ProfilingMiddleware:
+    # Opt-in production profiling. A random SAMPLE_RATE share of requests,
+    # plus any request that sends HEADER from a staff user (or with TOKEN as
+    # its value), is profiled and written to DIRECTORY. Each process also
+    # keeps a running collapsed-stack total, written to collapsed-<pid>.txt
+    # at most every FLUSH_INTERVAL seconds. Only
+    # requests that asked for a profile are told its file name. When
+    # ENABLED is false Django drops the middleware, so it costs nothing.
+
+    def __init__(self,get_response):
+        config = dict(DEFAULTS,**getattr(settings,'PROFILING',{}))
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.sample_rate = config['SAMPLE_RATE']
+        self.header = 'HTTP_' + config['HEADER'].upper().replace('-','_')
+        self.token = config['TOKEN']
+        self.mode = config['MODE']
+        self.interval = config['INTERVAL']
+        self.directory = str(config['DIRECTORY'])
+        self.flush_interval = config['FLUSH_INTERVAL']
+        self.totals = Counter()
+        self.totals_lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        # What accumulated since the last flush is written on a clean exit.
+        atexit.register(self.flush)
+        # Concurrent cProfile sessions in one process corrupt each other's
+        # timings (and raise on 3.12+), so one runs at a time and overlapping
+        # requests are sampled instead.
+        self.cprofile_lock = threading.Lock()
+        os.makedirs(self.directory,exist_ok=True)
+
+    def _requested(self,request):
+        value = request.META.get(self.header)
+        if not value:
+            return False
+        if self.token and secrets.compare_digest(value,self.token):
+            return True
+        user = getattr(request,'user',None)
+        return bool(user is not None and user.is_authenticated and user.is_staff)
+
+    def __call__(self,request):
+        requested = self._requested(request)
+        if not requested and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        if self.mode == 'cprofile' and self.cprofile_lock.acquire(blocking=False):
+            try:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            finally:
+                self.cprofile_lock.release()
+            name = self._write_cprofile(request,profiler,time.perf_counter() - started)
+        else:
+            sampler = StackSampler(threading.get_ident(),self.interval)
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                stacks = sampler.stop()
+            name = self._write_collapsed(request,stacks,time.perf_counter() - started)
+
+        logger.info(f"Profiled {request.method} {request.path} into {name}")
+        if requested:
+            response['X-Profile-File'] = name
+        return response
+
+    def _base_name(self,request,elapsed):
+        match = getattr(request,'resolver_match',None)
+        view = match.view_name if match is not None else 'unresolved'
+        view = re.sub(r'[^A-Za-z0-9_.-]+','_',view)
+        # Milliseconds and a random suffix keep concurrent profiles of the same
+        # view in one process from overwriting each other.
+        now = time.time()
+        stamp = time.strftime('%Y%m%dT%H%M%S',time.localtime(now)) + f".{int(now * 1000) % 1000:03d}"
+        return f"{stamp}-{os.getpid()}-{request.method}-{view}-{elapsed * 1000:.0f}ms-{secrets.token_hex(3)}"
+
+    def _write_cprofile(self,request,profiler,elapsed):
+        name = self._base_name(request,elapsed) + '.prof'
+        profiler.dump_stats(os.path.join(self.directory,name))
+        return name
+
+    def _write_collapsed(self,request,stacks,elapsed):
+        name = self._base_name(request,elapsed) + '.collapsed'
+        with open(os.path.join(self.directory,name),'w',encoding='utf-8') as handle:
+            handle.writelines(f"{stack} {count}\n" for stack,count in stacks.most_common())
+
+        with self.totals_lock:
+            self.totals.update(stacks)
+            if time.monotonic() - self.flushed_at < self.flush_interval:
+                return name
+            self.flushed_at = time.monotonic()
+            totals = list(self.totals.most_common())
+
+        self.flush(totals)
+        return name
+
+    def flush(self,totals=None):
+        # Rewritten in full and swapped in, so readers never see half a file.
+        # Written outside totals_lock so profiled requests don't queue on it.
+        if totals is None:
+            with self.totals_lock:
+                totals = list(self.totals.most_common())
+        aggregate = os.path.join(self.directory,f"collapsed-{os.getpid()}.txt")
+        temporary = f"{aggregate}.{threading.get_ident()}.tmp"
+        with open(temporary,'w',encoding='utf-8') as handle:
+            handle.writelines(f"{stack} {count}\n" for stack,count in totals)
+        os.replace(temporary,aggregate)
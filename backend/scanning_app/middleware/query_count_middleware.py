@@ -0,0 +1,40 @@
+from django.conf import settings
+import logging
+from .. import metrics
+from ..querycount import count_queries, budget_for
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCountMiddleware:
+    # Counts the SQL each request runs and how long it spends in it. The
+    # numbers go to the per-view metrics always, and to X-DB-Query-Count /
+    # X-DB-Query-Time-Ms headers when QUERY_COUNT_HEADERS is on (DEBUG by
+    # default). A request over its view's query_budget is logged with its SQL.
+    # Streaming responses run their queries after this returns; those aren't
+    # counted.
+
+    def __init__(self,get_response):
+        self.get_response = get_response
+        self.headers = getattr(settings,'QUERY_COUNT_HEADERS',settings.DEBUG)
+
+    def __call__(self,request):
+        with count_queries() as counter:
+            response = self.get_response(request)
+
+        match = getattr(request,'resolver_match',None)
+        view = match.view_name if match is not None else 'unresolved'
+        metrics.observe_queries(view,request.method,counter.count,counter.duration)
+
+        budget = budget_for(match.func,request.method) if match is not None else None
+        if budget is not None and counter.count > budget:
+            metrics.query_budget_exceeded(view,request.method)
+            logger.warning(
+                f"{request.method} {request.path} ran {counter.count} queries, budget {budget}:\n"
+                + '\n'.join(counter.statements)
+            )
+
+        if self.headers:
+            response['X-DB-Query-Count'] = str(counter.count)
+            response['X-DB-Query-Time-Ms'] = f"{counter.duration * 1000:.1f}"
+        return response
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabelCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=255, unique=True)),
+                ('category', models.CharField(max_length=100)),
+                ('source', models.CharField(choices=[('keyword', 'Keyword'), ('datamuse', 'Datamuse'), ('manual', 'Manual')], default='keyword', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductInfo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('category', models.CharField(blank=True, max_length=100, null=True)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('brand', models.CharField(blank=True, null=True)),
+                ('confidence_score', models.FloatField(default=0.0)),
+                ('image_url', models.URLField(blank=True, null=True)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='scanneditem',
+            name='is_object_detected',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='scanneditem',
+            name='object_labels',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AlterField(
+            model_name='scanneditem',
+            name='scan_type',
+            field=models.CharField(choices=[('barcode', 'Barcode'), ('qr', 'QR Code'), ('text', 'Text'), ('image', 'Image'), ('document', 'Document'), ('object', 'Object Recognition')], help_text='Type of the scanned content', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='scanneditem',
+            name='product_info',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='scanning_app.productinfo'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning_app', '0002_labelcategory_productinfo_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanneditem',
+            name='attempts',
+            field=models.IntegerField(default=0, help_text='Recognition attempts so far'),
+        ),
+        migrations.AddField(
+            model_name='scanneditem',
+            name='last_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='scanneditem',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='scanneditem',
+            name='locked_by',
+            field=models.CharField(blank=True, default='', help_text='Worker holding the recognition lease', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='scanneditem',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('failed', 'Failed'), ('archived', 'Archived')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='scanneditem',
+            index=models.Index(fields=['status', 'lease_expires_at'], name='scanning_ap_status_e9ef0b_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning_app', '0003_scanneditem_attempts_scanneditem_last_error_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('scan_type', models.CharField(choices=[('barcode', 'Barcode'), ('qr', 'QR Code'), ('text', 'Text'), ('image', 'Image'), ('document', 'Document'), ('object', 'Object Recognition')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('failed', 'Failed'), ('archived', 'Archived')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'day'], name='scanning_ap_user_id_4a60db_idx')],
+                'unique_together': {('day', 'user', 'scan_type', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning_app', '0004_scandailystats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='scanneditem',
+            name='scanning_ap_user_id_c579a8_idx',
+        ),
+        migrations.AddIndex(
+            model_name='scanneditem',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='scan_user_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+# The search index is vendor specific, so it is created with raw SQL rather
+# than as a model: an FTS5 virtual table on SQLite, a tsvector column with a
+# GIN index on Postgres. Other backends get no table and search falls back to
+# a LIKE filter. Existing scans are indexed with `manage.py rebuild_search_index`.
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS scanning_app_scansearch USING fts5("
+            "owner, scan_data, labels, product, "
+            "tokenize = 'porter unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS scanning_app_scansearch ("
+            "scan_id bigint PRIMARY KEY REFERENCES scanning_app_scanneditem (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "user_id integer NOT NULL, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS scanning_app_scansearch_document_idx "
+            "ON scanning_app_scansearch USING GIN (document)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS scanning_app_scansearch_user_idx "
+            "ON scanning_app_scansearch (user_id)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS scanning_app_scansearch")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning_app', '0005_scanneditem_user_recent_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scanning_app', '0006_scan_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=255)),
+                ('category', models.CharField(blank=True, default='', max_length=100)),
+                ('confidence', models.FloatField(blank=True, null=True)),
+                ('scanned_at', models.DateTimeField()),
+                ('scan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='labels', to='scanning_app.scanneditem')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['label', 'scan'], name='scanning_ap_label_1c7073_idx'), models.Index(fields=['user', 'label', 'scan'], name='scanning_ap_user_id_5e8dfb_idx'), models.Index(fields=['user', 'scanned_at', 'label'], name='scanning_ap_user_id_94bb38_idx')],
+            },
+        ),
+    ]
@@ -17,6 +17,7 @@ class ScannedItem(models.Model):
     STATUS_CHOICES = [
         ('pending','Pending'),
         ('processed','Processed'),
+        ('failed','Failed'),
         ('archived','Archived')
     ]
 
@@ -30,6 +31,10 @@ class ScannedItem(models.Model):
     product_info = models.ForeignKey('ProductInfo',on_delete=models.SET_NULL,null=True,blank=True)
     is_object_detected = models.BooleanField(default=False)
     object_labels = models.JSONField(default=list,blank=True)
+    attempts = models.IntegerField(default=0,help_text="Recognition attempts so far")
+    locked_by = models.CharField(max_length=100,blank=True,default='',help_text="Worker holding the recognition lease")
+    lease_expires_at = models.DateTimeField(null=True,blank=True)
+    last_error = models.TextField(blank=True,default='')
     
 
     class Meta:
@@ -38,7 +43,8 @@ class ScannedItem(models.Model):
             models.Index(fields=['scan_type']),
             models.Index(fields=['status']),
             models.Index(fields=['timestamp']),
-            models.Index(fields=['user'])
+            models.Index(fields=['status','lease_expires_at']),
+            models.Index(fields=['user','-timestamp','-id'],name='scan_user_recent_idx')
         ]
     
 
@@ -58,7 +64,7 @@ class UserProfile(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def can_scan(self):
-        if self.is_premium and self.premium_expiry and self.premium_expiry > timezone.noew():
+        if self.is_premium and self.premium_expiry and self.premium_expiry > timezone.now():
             return True
         return self.free_scans_used < self.max_free_scans
 
@@ -117,7 +123,7 @@ class Payment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
-        return f"{self.user.user} - {self.subscription_plan.name}"
+        return f"{self.user.username} - {self.subscription_plan.name}"
     
 
 class UserSubscription(models.Model):
@@ -128,8 +134,13 @@ class UserSubscription(models.Model):
     end_date = models.DateTimeField()
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active','end_date'])
+        ]
+
     def __str__(self):
-        return f"{self.user.name} - {self.subscription_plan.name}"
+        return f"{self.user.username} - {self.subscription_plan.name}"
     
 
 class ProductInfo(models.Model):
@@ -145,3 +156,84 @@ class ProductInfo(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.confidence_score}%)"
+
+
+class LabelCategory(models.Model):
+
+    SOURCE_CHOICES = [
+        ('keyword','Keyword'),
+        ('datamuse','Datamuse'),
+        ('manual','Manual'),
+    ]
+
+    label = models.CharField(max_length=255,unique=True)
+    category = models.CharField(max_length=100)
+    source = models.CharField(max_length=20,choices=SOURCE_CHOICES,default='keyword')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.label} -> {self.category}"
+
+
+class ScanDailyStats(models.Model):
+    # Rollup of ScannedItem counts per day, user, scan type and status, kept
+    # current as scans are created, change status or are deleted.
+
+    day = models.DateField()
+    user = models.ForeignKey(User,on_delete=models.CASCADE)
+    scan_type = models.CharField(max_length=20,choices=ScannedItem.SCAN_TYPE)
+    status = models.CharField(max_length=20,choices=ScannedItem.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['day','user','scan_type','status']
+        indexes = [
+            models.Index(fields=['user','day'])
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.user_id} {self.scan_type}/{self.status}: {self.count}"
+
+
+class ScanLabel(models.Model):
+    # One row per distinct label detected on a scan, so "scans with label X"
+    # and label frequency queries are index range scans rather than a scan of
+    # every object_labels JSON list. user and scanned_at are copied from the scan.
+
+    scan = models.ForeignKey(ScannedItem,on_delete=models.CASCADE,related_name='labels')
+    user = models.ForeignKey(User,on_delete=models.CASCADE,db_index=False)
+    label = models.CharField(max_length=255)
+    category = models.CharField(max_length=100,blank=True,default='')
+    confidence = models.FloatField(null=True,blank=True)
+    scanned_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['label','scan']),
+            models.Index(fields=['user','label','scan']),
+            models.Index(fields=['user','scanned_at','label'])
+        ]
+
+    def __str__(self):
+        return f"{self.label} ({self.category})"
+
+
+class ArchivedScan(models.Model):
+    # Cold storage for scans past the retention window. Only what history
+    # reads filter and sort on stays in columns; the rest of the row is a
+    # zlib-compressed JSON payload. id is the original ScannedItem id.
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User,on_delete=models.CASCADE,db_index=False)
+    timestamp = models.DateTimeField()
+    scan_type = models.CharField(max_length=20,choices=ScannedItem.SCAN_TYPE)
+    payload = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user','-timestamp','-id'],name='archived_user_recent_idx')
+        ]
+
+    def __str__(self):
+        return f"{self.scan_type} - archived {self.archived_at:%Y-%m-%d}"
@@ -0,0 +1,78 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, Cursor
+
+
+class ScanCursorPagination(CursorPagination):
+    # Keyset pagination over the (user, -timestamp, -id) index: every page is
+    # an index range scan from the cursor, with no OFFSET and no COUNT(*).
+    # The cursor holds both timestamp and id, so scans sharing a timestamp
+    # page the same way forwards and backwards (DRF's own cursor keeps only
+    # the first ordering field and falls back to offsets on ties).
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-timestamp','-id')
+
+    def paginate_queryset(self,queryset,request,view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        if self.cursor is not None:
+            timestamp,scan_id = self._decode_position(self.cursor.position)
+            if reverse:
+                queryset = queryset.filter(Q(timestamp__gt=timestamp) | Q(timestamp=timestamp,id__gt=scan_id))
+            else:
+                queryset = queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp,id__lt=scan_id))
+
+        results = list(queryset.order_by(*(('timestamp','id') if reverse else self.ordering))[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        more = len(results) > self.page_size
+
+        if reverse:
+            # Read backwards from the cursor, then put back in display order.
+            self.page.reverse()
+            self.has_previous,self.has_next = more,True
+        else:
+            self.has_previous,self.has_next = self.cursor is not None,more
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0,reverse=False,position=self._get_position_from_instance(self.page[-1],self.ordering)))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0,reverse=True,position=self._get_position_from_instance(self.page[0],self.ordering)))
+
+    def _get_position_from_instance(self,instance,ordering):
+        if isinstance(instance,dict):
+            return f"{instance['timestamp'].isoformat()}|{instance['id']}"
+        return f"{instance.timestamp.isoformat()}|{instance.id}"
+
+    def _decode_position(self,position):
+        try:
+            timestamp,scan_id = (position or '').split('|')
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError(position)
+            return timestamp,int(scan_id)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+
+class RecentScansPagination(ScanCursorPagination):
+    page_size = 5
+    page_size_query_param = 'limit'
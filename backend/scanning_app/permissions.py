@@ -0,0 +1,36 @@
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import BasePermission
+from .services.entitlement_service import EntitlementService
+from . import metrics
+
+
+class ScanQuotaExceeded(APIException):
+    status_code = 402
+    default_code = 'scan_limit_reached'
+
+    def __init__(self,remaining_scans):
+        # Set directly so remaining_scans keeps its type ('unlimited' or an int).
+        self.detail = {
+            'error':'Scan limit reached. Please upgrade to premium.',
+            'remaining_scans':remaining_scans
+        }
+
+
+class HasScanQuota(BasePermission):
+    # Refuses scan-creating POSTs from users who are out of quota. It runs
+    # after DRF authentication (session, basic or token alike) and before the
+    # view, so no scan is created or queued. With basic or token auth the body
+    # is not parsed first; session auth's CSRF check reads request.POST, so
+    # there a multipart upload has already been read. The conditional UPDATE
+    # in ScanService.consume_scan stays the authoritative check.
+
+    def has_permission(self,request,view):
+        if request.method != 'POST' or not request.user or not request.user.is_authenticated:
+            return True
+
+        snapshot = EntitlementService.get_snapshot(request.user)
+        if snapshot is None or EntitlementService.can_scan(snapshot):
+            return True
+
+        metrics.quota_rejected('permission')
+        raise ScanQuotaExceeded(EntitlementService.remaining_scans(snapshot))
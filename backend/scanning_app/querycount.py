@@ -0,0 +1,52 @@
+import time
+from contextlib import ExitStack, contextmanager
+from django.db import connections
+
+
+class QueryCounter:
+    # execute_wrapper hook: counts statements and the time spent in them.
+    # executemany counts once, as it is one round trip from Django's side.
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def __call__(self,execute,sql,params,many,context):
+        started = time.perf_counter()
+        try:
+            return execute(sql,params,many,context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+            self.statements.append(sql)
+
+
+@contextmanager
+def count_queries():
+    # Counts on every configured database for the current thread. Connections
+    # are thread local, so concurrent requests don't see each other's queries.
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+
+def query_budget(budget):
+    # Declares the most queries a view may run per request. On function views
+    # put it above @api_view; on class-based views a dict keyed by HTTP method
+    # (e.g. {'GET': 4, 'POST': 8}) sets a budget per method.
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+
+def budget_for(view,method):
+    budget = getattr(view,'query_budget',None)
+    if budget is None:
+        budget = getattr(getattr(view,'view_class',None),'query_budget',None)
+    if isinstance(budget,dict):
+        budget = budget.get(method.upper())
+    return budget
@@ -0,0 +1,30 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    # Renders with orjson when it is installed; otherwise, and whenever the
+    # client asks for indented output, this is DRF's JSONRenderer unchanged.
+
+    encoder = JSONEncoder()
+
+    def render(self,data,accepted_media_type=None,renderer_context=None):
+        if orjson is None:
+            return super().render(data,accepted_media_type,renderer_context)
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type or '',renderer_context or {}):
+            return super().render(data,accepted_media_type,renderer_context)
+
+        # Dates go through DRF's encoder too so their format doesn't change,
+        # along with everything orjson can't encode (Decimal, lazy strings, ...).
+        return orjson.dumps(
+            data,
+            default=self.encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
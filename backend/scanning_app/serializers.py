@@ -1,19 +1,94 @@
+from operator import itemgetter
+from django.core.files.storage import default_storage
+from django.utils import timezone
 from rest_framework import serializers
-from .models import ScannedItem
+from .models import ScannedItem, SubscriptionPlan, Payment
+
+# Recognition queue bookkeeping; never shown to or writable by clients.
+LEASE_FIELDS = ['attempts','locked_by','lease_expires_at','last_error']
+
 
 class ScannedItemSerializer(serializers.ModelSerializer):
     class Meta:
-        models = ScannedItem
-        field = '__all__'
-        read_only_fields = ['id','timestamp','image']
+        model = ScannedItem
+        exclude = LEASE_FIELDS
+        # status belongs to the recognition workers and user to the request.
+        read_only_fields = ['id','timestamp','image','status','user']
     
+def _datetime(value):
+    # Same output as DRF's DateTimeField: current time zone, 'Z' for UTC.
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+class ScannedItemListSerializer:
+    # Read-only fast path for list endpoints. Rows are values() dicts, so no
+    # model instances are built and there is no per-field introspection; the
+    # output matches ScannedItemSerializer field for field.
+
+    # (output key, values() column, converter or None)
+    FIELDS = (
+        ('id','id',None),
+        ('scan_data','scan_data',None),
+        ('scan_type','scan_type',None),
+        ('timestamp','timestamp',_datetime),
+        ('status','status',None),
+        ('metadata','metadata',None),
+        ('image','image','image'),
+        ('is_object_detected','is_object_detected',None),
+        ('object_labels','object_labels',None),
+        ('user','user_id',None),
+        ('product_info','product_info_id',None),
+    )
+    COLUMNS = tuple(dict.fromkeys(column for _,column,_ in FIELDS))
+
+    def __init__(self,instance=None,many=False,context=None):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.accessors = self._compile()
+
+    def _image_url(self,name):
+        if not name:
+            return None
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def _compile(self):
+        accessors = []
+        for key,column,converter in self.FIELDS:
+            if converter == 'image':
+                converter = self._image_url
+            getter = itemgetter(column)
+            if converter is None:
+                accessors.append((key,getter))
+            else:
+                accessors.append((key,lambda row,getter=getter,converter=converter: converter(getter(row))))
+        return accessors
+
+    def to_representation(self,row):
+        return {key:accessor(row) for key,accessor in self.accessors}
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(row) for row in self.instance]
+        return self.to_representation(self.instance)
+
+
 class ScannedCreateSerializer(serializers.Serializer):
 
     scan_data = serializers.CharField(max_length=1000)
     scan_type = serializers.ChoiceField(choices=ScannedItem.SCAN_TYPE)
-    status = serializers.ChoiceField(choices=ScannedItem.STATUS_CHOICES,default='pending')
+    # New scans always start 'pending'; only recognition moves them on.
+    status = serializers.CharField(read_only=True)
     metadata = serializers.JSONField(required=False)
-    image = serializers.ImageField()
+    image = serializers.ImageField(required=False)
 
 class ScanStatsSerializer(serializers.Serializer):
     total_scans = serializers.IntegerField()
@@ -21,3 +96,15 @@ class ScanStatsSerializer(serializers.Serializer):
     scan_type_breakdown = serializers.DictField()
     status_breakdown = serializers.DictField()
 
+
+class SubscriptionPlanSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SubscriptionPlan
+        fields = ['id','name','plan_type','price','description','features']
+
+
+class PaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ['id','subscription_plan','razorpay_order_id','amount','status','created_at']
+        read_only_fields = fields
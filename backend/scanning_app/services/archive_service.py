@@ -0,0 +1,165 @@
+import base64
+import heapq
+import json
+import zlib
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import logging
+from ..models import ScannedItem, ScanLabel, ArchivedScan
+from .stats_service import StatsService
+from .search_service import SearchService
+
+logger = logging.getLogger(__name__)
+
+# Everything except the columns ArchivedScan keeps (id, user, timestamp, scan_type).
+PAYLOAD_FIELDS = ('scan_data','status','metadata','image','is_object_detected','object_labels','attempts','last_error','product_info_id')
+
+# Hot rows still waiting for (or in) recognition are never archived.
+ARCHIVABLE_STATUSES = ('processed','failed','archived')
+
+
+class ArchiveService:
+    # Moves old scans out of the hot ScannedItem table in chunks and reads
+    # them back merged with hot rows for history views that ask for it.
+
+    @staticmethod
+    def retention_days():
+        return getattr(settings,'SCAN_ARCHIVE_RETENTION_DAYS',180)
+
+    @staticmethod
+    def compress(row):
+        data = json.dumps({field:row[field] for field in PAYLOAD_FIELDS},cls=DjangoJSONEncoder,separators=(',',':'))
+        return zlib.compress(data.encode('utf-8'),getattr(settings,'SCAN_ARCHIVE_COMPRESSION_LEVEL',6))
+
+    @staticmethod
+    def decompress(payload):
+        return json.loads(zlib.decompress(bytes(payload)).decode('utf-8'))
+
+    @staticmethod
+    def archivable(cutoff):
+        return ScannedItem.objects.filter(timestamp__lt=cutoff,status__in=ARCHIVABLE_STATUSES)
+
+    @staticmethod
+    def archive(days=None,chunk_size=1000,limit=None):
+        from ..signal import scan_signals_muted
+
+        days = ArchiveService.retention_days() if days is None else days
+        cutoff = timezone.now() - timedelta(days=days)
+        columns = ('id','user_id','timestamp','scan_type') + PAYLOAD_FIELDS
+        archived = 0
+
+        while limit is None or archived < limit:
+            size = chunk_size if limit is None else min(chunk_size,limit - archived)
+            with transaction.atomic():
+                rows = list(ArchiveService.archivable(cutoff).order_by('timestamp','id').values(*columns)[:size])
+                if not rows:
+                    break
+
+                ArchivedScan.objects.bulk_create([
+                    ArchivedScan(
+                        id=row['id'],
+                        user_id=row['user_id'],
+                        timestamp=row['timestamp'],
+                        scan_type=row['scan_type'],
+                        payload=ArchiveService.compress(row)
+                    )
+                    for row in rows
+                ])
+
+                ids = [row['id'] for row in rows]
+                # The rollup and search index are adjusted once per chunk below
+                # rather than once per row from the delete signals. Labels go
+                # first in one DELETE, so the cascade has nothing left to collect.
+                with scan_signals_muted():
+                    ScanLabel.objects.filter(scan_id__in=ids).delete()
+                    ScannedItem.objects.filter(id__in=ids).delete()
+                StatsService.record_archived(rows)
+                SearchService.remove(ids)
+
+            archived += len(rows)
+            logger.info(f"Archived {archived} scans older than {cutoff:%Y-%m-%d}")
+            if len(rows) < size:
+                break
+
+        return archived
+
+    @staticmethod
+    def to_row(archived):
+        # Same keys as a hot ScannedItem values() row, reported as 'archived'.
+        row = ArchiveService.decompress(archived.payload)
+        row.update({
+            'id':archived.id,
+            'user_id':archived.user_id,
+            'timestamp':archived.timestamp,
+            'scan_type':archived.scan_type,
+            'status':'archived',
+            'locked_by':'',
+            'lease_expires_at':None
+        })
+        return row
+
+    @staticmethod
+    def encode_cursor(row):
+        return base64.urlsafe_b64encode(f"{row['timestamp'].isoformat()}|{row['id']}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            timestamp,scan_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError(cursor)
+            return timestamp,int(scan_id)
+        except (ValueError,UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    @staticmethod
+    def _before(queryset,position):
+        if position is None:
+            return queryset
+        timestamp,scan_id = position
+        return queryset.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp,id__lt=scan_id))
+
+    @staticmethod
+    def history_page(user,columns,limit=20,cursor=None,scan_type=None):
+        # Keyset page over hot and archived scans: page+1 rows are read from
+        # each table's (user, -timestamp, -id) index and merged, so deep pages
+        # cost the same as the first one.
+        position = ArchiveService.decode_cursor(cursor) if cursor else None
+
+        hot = ScannedItem.objects.filter(user=user)
+        cold = ArchivedScan.objects.filter(user=user)
+        if scan_type:
+            hot = hot.filter(scan_type=scan_type)
+            cold = cold.filter(scan_type=scan_type)
+
+        hot_rows = list(ArchiveService._before(hot,position).order_by('-timestamp','-id').values(*columns)[:limit + 1])
+        cold_rows = [
+            ArchiveService.to_row(archived)
+            for archived in ArchiveService._before(cold,position).order_by('-timestamp','-id')[:limit + 1]
+        ]
+
+        rows = list(heapq.merge(hot_rows,cold_rows,key=lambda row: (row['timestamp'],row['id']),reverse=True))
+        page = [{column:row.get(column) for column in columns} for row in rows[:limit]]
+        next_cursor = ArchiveService.encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return page,next_cursor
+
+    @staticmethod
+    def iter_archived(user,fields,start=None,end=None,scan_type=None,chunk_size=2000):
+        # Archived rows as tuples of `fields`, newest first, for exports.
+        scans = ArchivedScan.objects.filter(user=user)
+        if start:
+            scans = scans.filter(timestamp__gte=start)
+        if end:
+            scans = scans.filter(timestamp__lt=end)
+        if scan_type:
+            scans = scans.filter(scan_type=scan_type)
+
+        for archived in scans.order_by('-timestamp','-id').iterator(chunk_size=chunk_size):
+            row = ArchiveService.to_row(archived)
+            yield tuple(row.get(field) for field in fields)
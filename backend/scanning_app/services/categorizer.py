@@ -0,0 +1,227 @@
+import threading
+import time
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+import logging
+from . import http_pool
+
+logger = logging.getLogger(__name__)
+
+# Checked in order; the first category with any keyword inside the label wins.
+LABEL_CATEGORIES = [
+    ('food', ['apple','banana','pizza','burger','food','fruit']),
+    ('electronics', ['phone','laptop','computer','camera','tv','electronics']),
+    ('clothing', ['shirt','pants','dress','clothing','shoe']),
+    ('furniture', ['chair','table','sofa','bed','furniture']),
+    ('vehicle', ['car','bike','bus','vehicle','truck']),
+    ('sports', ['ball','racket','sports','game']),
+    ('animal', ['dog','cat','bird','animal','fish']),
+    ('tool', ['hammer','screwdriver','tool','wrench']),
+    ('nature', ['tree','flower','plant','nature','grass']),
+]
+
+# Matched against dictionary definitions fetched from Datamuse.
+DEFINITION_CATEGORIES = [
+    ('food', ['food', 'fruit', 'vegetable', 'nutrient', 'edible']),
+    ('animal', ['animal', 'mammal', 'bird', 'insect', 'species']),
+    ('tool', ['tool', 'instrument', 'device', 'implement']),
+    ('vehicle', ['vehicle', 'car', 'transport', 'machine']),
+    ('clothing', ['clothing', 'garment', 'wear', 'apparel']),
+    ('furniture', ['furniture', 'furnishing', 'seat', 'table']),
+    ('electronics', ['electronic', 'device', 'computer', 'digital']),
+    ('nature', ['plant', 'tree', 'flower', 'landscape', 'natural']),
+]
+
+
+class KeywordMatcher:
+    # Aho-Corasick automaton: one pass over the text finds every keyword it contains.
+
+    def __init__(self,vocabulary):
+        self.categories = [category for category,_ in vocabulary]
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [None]
+
+        for rank,(_,keywords) in enumerate(vocabulary):
+            for keyword in keywords:
+                self._add(keyword.lower(),rank)
+        self._build_links()
+
+    def _add(self,keyword,rank):
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(None)
+            state = next_state
+        if self.output[state] is None or rank < self.output[state]:
+            self.output[state] = rank
+
+    def _build_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char,next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char,0)
+                self.fail[next_state] = target if target != next_state else 0
+                # Fold the best rank reachable through the failure chain into each state.
+                inherited = self.output[self.fail[next_state]]
+                if inherited is not None and (self.output[next_state] is None or inherited < self.output[next_state]):
+                    self.output[next_state] = inherited
+
+    def match(self,text):
+        best = None
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char,0)
+            rank = self.output[state]
+            if rank is not None and (best is None or rank < best):
+                best = rank
+                if best == 0:
+                    break
+        return self.categories[best] if best is not None else None
+
+
+label_matcher = KeywordMatcher(LABEL_CATEGORIES + DEFINITION_CATEGORIES)
+definition_matcher = KeywordMatcher(DEFINITION_CATEGORIES)
+
+
+def category_from_definition(definition):
+    return definition_matcher.match(definition.lower()) or 'other'
+
+
+class LabelCategorizer:
+    # Labels resolve from memory, then the keyword automaton, then the
+    # LabelCategory memo table. Anything still unknown is answered with
+    # 'other' and looked up on Datamuse in the background for next time.
+    # Misses are remembered for miss_ttl seconds so an unknown label doesn't
+    # hit the table on every scan.
+
+    def __init__(self,memo_size=10000,enrich=True,miss_ttl=300):
+        self.memo = OrderedDict()
+        self.memo_size = memo_size
+        self.enrich = enrich
+        self.misses = OrderedDict()
+        self.miss_ttl = miss_ttl
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2,thread_name_prefix='label-enrich')
+
+    def categorize(self,label):
+        key = label.lower().strip()
+
+        with self.lock:
+            category = self.memo.get(key)
+            if category is not None:
+                self.memo.move_to_end(key)
+                return category
+            expires_at = self.misses.get(key)
+            if expires_at is not None:
+                if expires_at > time.monotonic():
+                    return 'other'
+                del self.misses[key]
+
+        category = label_matcher.match(key)
+        if category is None:
+            category = self._lookup_memo_table(key)
+        if category is None:
+            self._remember_miss(key)
+            self._schedule_enrichment(key)
+            return 'other'
+
+        self._remember(key,category)
+        return category
+
+    def _remember_miss(self,key):
+        with self.lock:
+            self.misses[key] = time.monotonic() + self.miss_ttl
+            self.misses.move_to_end(key)
+            while len(self.misses) > self.memo_size:
+                self.misses.popitem(last=False)
+
+    def _remember(self,key,category):
+        with self.lock:
+            self.misses.pop(key,None)
+            self.memo[key] = category
+            self.memo.move_to_end(key)
+            while len(self.memo) > self.memo_size:
+                self.memo.popitem(last=False)
+
+    def _lookup_memo_table(self,key):
+        from ..models import LabelCategory
+
+        try:
+            return LabelCategory.objects.filter(label=key).values_list('category',flat=True).first()
+        except Exception as e:
+            logger.warning(f"Label memo lookup failed for {key}: {e}")
+            return None
+
+    def _schedule_enrichment(self,key):
+        if not self.enrich:
+            return
+        with self.lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+        self.executor.submit(self._enrich,key)
+
+    def _enrich(self,key):
+        from ..models import LabelCategory
+
+        try:
+            category = self._fetch_category(key) or 'other'
+            LabelCategory.objects.update_or_create(
+                label=key[:255],
+                defaults={'category':category,'source':'datamuse'}
+            )
+            self._remember(key,category)
+        except Exception as e:
+            logger.error(f"Error fetching category from API: {e}")
+            # Don't retry on every scan while the upstream is failing.
+            self._remember(key,'other')
+        finally:
+            with self.lock:
+                self.pending.discard(key)
+            close_old_connections()
+
+    def _fetch_category(self,key):
+        response = http_pool.get(
+            'https://api.datamuse.com/words',
+            params={'sp':key,'md':'d','max':1},
+            timeout=5
+        )
+        if response.status_code == 200:
+            data = response.json()
+            if data and 'defs' in data[0]:
+                return category_from_definition(data[0]['defs'][0])
+        return None
+
+
+_label_categorizer = None
+_label_categorizer_lock = threading.Lock()
+
+
+def get_label_categorizer():
+
+    global _label_categorizer
+    if _label_categorizer is None:
+        with _label_categorizer_lock:
+            if _label_categorizer is None:
+                _label_categorizer = LabelCategorizer(
+                    memo_size=getattr(settings,'VISION_CATEGORY_MEMO_SIZE',10000),
+                    enrich=getattr(settings,'VISION_CATEGORY_ENRICHMENT',True),
+                    miss_ttl=getattr(settings,'VISION_CATEGORY_MISS_TTL',300)
+                )
+    return _label_categorizer
@@ -0,0 +1,32 @@
+import time
+from django.conf import settings
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    # A fixed point in time shared by every step of one scan. Each outbound
+    # call asks for its timeout here, so the steps together can never run
+    # longer than the original budget.
+
+    def __init__(self,budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    @classmethod
+    def for_scan(cls):
+        return cls(getattr(settings,'VISION_SCAN_DEADLINE',20))
+
+    def remaining(self):
+        return max(0.0,self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self,cap):
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Scan budget of {self.budget}s spent")
+        return min(cap,remaining)
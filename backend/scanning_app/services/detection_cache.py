@@ -0,0 +1,250 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCacheStore:
+
+    def __init__(self,max_entries,max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self,key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at,payload = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+
+            self.entries.move_to_end(key)
+            return payload
+
+    def set(self,key,payload,ttl):
+        evicted = 0
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+            self.entries[key] = (time.time()+ttl,payload)
+            self.total_bytes += len(payload)
+
+            while self.entries and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                evicted += 1
+        return evicted
+
+    def stats(self):
+        with self.lock:
+            return {'entries':len(self.entries),'bytes':self.total_bytes}
+
+    def _remove(self,key):
+        _,payload = self.entries.pop(key)
+        self.total_bytes -= len(payload)
+
+
+class SQLiteCacheStore:
+    # One shared file, so every worker process on the host sees the same entries.
+
+    def __init__(self,path,max_entries,max_bytes):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS detection_cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+            'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._connection().execute(
+            'CREATE INDEX IF NOT EXISTS detection_cache_accessed ON detection_cache (accessed_at)'
+        )
+
+    def _connection(self):
+        connection = getattr(self.local,'connection',None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory,exist_ok=True)
+            connection = sqlite3.connect(self.path,timeout=5,isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def get(self,key):
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT value, expires_at FROM detection_cache WHERE key = ?',(key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        if row[1] <= now:
+            connection.execute('DELETE FROM detection_cache WHERE key = ?',(key,))
+            return None
+
+        connection.execute('UPDATE detection_cache SET accessed_at = ? WHERE key = ?',(now,key))
+        return bytes(row[0])
+
+    def set(self,key,payload,ttl):
+        connection = self._connection()
+        now = time.time()
+        evicted = 0
+
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'INSERT OR REPLACE INTO detection_cache (key, value, size, expires_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key,payload,len(payload),now+ttl,now)
+            )
+            evicted += connection.execute(
+                'DELETE FROM detection_cache WHERE expires_at <= ?',(now,)
+            ).rowcount
+
+            count,total_bytes = connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM detection_cache'
+            ).fetchone()
+            while count > self.max_entries or total_bytes > self.max_bytes:
+                oldest = connection.execute(
+                    'SELECT key, size FROM detection_cache ORDER BY accessed_at LIMIT 1'
+                ).fetchone()
+                if oldest is None:
+                    break
+                connection.execute('DELETE FROM detection_cache WHERE key = ?',(oldest[0],))
+                count -= 1
+                total_bytes -= oldest[1]
+                evicted += 1
+
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        return evicted
+
+    def stats(self):
+        count,total_bytes = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM detection_cache'
+        ).fetchone()
+        return {'entries':count,'bytes':total_bytes}
+
+
+class DjangoCacheStore:
+    # Eviction and entry limits are left to the configured cache backend.
+
+    def __init__(self,alias,max_bytes,key_prefix='vision'):
+        self.cache = caches[alias]
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+
+    def get(self,key):
+        return self.cache.get(f"{self.key_prefix}:{key}")
+
+    def set(self,key,payload,ttl):
+        self.cache.set(f"{self.key_prefix}:{key}",payload,timeout=ttl)
+        return 0
+
+    def stats(self):
+        return {}
+
+
+class DetectionCache:
+
+    def __init__(self,store,ttl):
+        self.store = store
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self,key):
+        try:
+            payload = self.store.get(key)
+        except Exception as e:
+            logger.warning(f"Detection cache read failed: {e}")
+            payload = None
+
+        with self.lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return json.loads(payload)
+
+    def set(self,key,value):
+        payload = json.dumps(value,default=str).encode()
+        if len(payload) > self.store.max_bytes:
+            return
+
+        try:
+            evicted = self.store.set(key,payload,self.ttl)
+        except Exception as e:
+            logger.warning(f"Detection cache write failed: {e}")
+            return
+
+        if evicted:
+            with self.lock:
+                self.evictions += evicted
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                'backend':type(self.store).__name__,
+                'hits':self.hits,
+                'misses':self.misses,
+                'evictions':self.evictions
+            }
+        stats.update(self.store.stats())
+        return stats
+
+
+_detection_cache = None
+_detection_cache_lock = threading.Lock()
+
+
+def build_store(config):
+
+    backend = config.get('BACKEND','lru')
+    max_entries = config.get('MAX_ENTRIES',1024)
+    max_bytes = config.get('MAX_BYTES',64*1024*1024)
+
+    if backend == 'sqlite':
+        return SQLiteCacheStore(
+            config.get('PATH',os.path.join(settings.BASE_DIR,'vision_cache.sqlite3')),
+            max_entries,
+            max_bytes
+        )
+    if backend == 'django':
+        return DjangoCacheStore(config.get('CACHE_ALIAS','default'),max_bytes)
+    return LRUCacheStore(max_entries,max_bytes)
+
+
+def get_detection_cache():
+
+    global _detection_cache
+    if _detection_cache is None:
+        with _detection_cache_lock:
+            if _detection_cache is None:
+                config = getattr(settings,'VISION_CACHE',{})
+                _detection_cache = DetectionCache(build_store(config),config.get('TTL',3600))
+    return _detection_cache
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from ..models import UserProfile
+
+
+class EntitlementService:
+    # A small per-user snapshot of what the user may do, kept in the shared
+    # cache. Profile saves write the new snapshot through; subscription
+    # changes and bulk updates drop it so the next read rebuilds it.
+
+    PROFILE_FIELDS = ('is_premium','premium_expiry','free_scans_used','max_free_scans')
+
+    @staticmethod
+    def cache_key(user_id):
+        return f"entitlement:{user_id}"
+
+    @staticmethod
+    def _ttl():
+        return getattr(settings,'SCAN_ENTITLEMENT_TTL',30)
+
+    @staticmethod
+    def build_snapshot(values):
+        return {
+            'is_premium': values['is_premium'],
+            'premium_expiry': values['premium_expiry'],
+            'free_scans_remaining': max(0,values['max_free_scans'] - values['free_scans_used'])
+        }
+
+    @staticmethod
+    def get_snapshot(user):
+        key = EntitlementService.cache_key(user.id)
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+
+        values = UserProfile.objects.filter(user=user).values(*EntitlementService.PROFILE_FIELDS).first()
+        if values is None:
+            return None
+        return EntitlementService.store(user.id,values)
+
+    @staticmethod
+    def store(user_id,values):
+        snapshot = EntitlementService.build_snapshot(values)
+        cache.set(EntitlementService.cache_key(user_id),snapshot,EntitlementService._ttl())
+        return snapshot
+
+    @staticmethod
+    def store_profile(profile):
+        return EntitlementService.store(
+            profile.user_id,
+            {field:getattr(profile,field) for field in EntitlementService.PROFILE_FIELDS}
+        )
+
+    @staticmethod
+    def invalidate(user_id):
+        cache.delete(EntitlementService.cache_key(user_id))
+
+    @staticmethod
+    def invalidate_many(user_ids):
+        cache.delete_many([EntitlementService.cache_key(user_id) for user_id in user_ids])
+
+    @staticmethod
+    def premium_active(snapshot):
+        return bool(snapshot['is_premium'] and snapshot['premium_expiry'] and snapshot['premium_expiry'] > timezone.now())
+
+    @staticmethod
+    def can_scan(snapshot):
+        return EntitlementService.premium_active(snapshot) or snapshot['free_scans_remaining'] > 0
+
+    @staticmethod
+    def remaining_scans(snapshot):
+        if EntitlementService.premium_active(snapshot):
+            return 'unlimited'
+        return snapshot['free_scans_remaining']
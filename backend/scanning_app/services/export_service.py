@@ -0,0 +1,197 @@
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from ..models import ScannedItem
+from .archive_service import ArchiveService
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_FIELDS = ('id','timestamp','scan_type','status','scan_data','is_object_detected','object_labels','metadata')
+
+# Text formats are buffered up to this many bytes before a chunk is sent.
+FLUSH_BYTES = 64 * 1024
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file that hands its bytes back on drain(), so the Parquet
+    # writer can be streamed without keeping the whole file in memory.
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self,data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ExportService:
+    # Streams a user's scan history without materialising it: rows come from
+    # values_list() iterators and are encoded and compressed chunk by chunk.
+
+    FORMATS = {
+        'csv': ('text/csv','csv'),
+        'ndjson': ('application/x-ndjson','ndjson'),
+        'parquet': ('application/vnd.apache.parquet','parquet'),
+    }
+
+    @staticmethod
+    def format_timestamp(value):
+        # CSV and NDJSON both write UTC with microseconds and a 'Z', the
+        # precision Parquet's timestamp('us', UTC) column keeps.
+        return value.astimezone(dt_timezone.utc).isoformat(timespec='microseconds').replace('+00:00','Z')
+
+    @staticmethod
+    def available_formats():
+        return [name for name in ExportService.FORMATS if name != 'parquet' or pyarrow is not None]
+
+    @staticmethod
+    def _chunk_size():
+        return getattr(settings,'SCAN_EXPORT_CHUNK_SIZE',2000)
+
+    @staticmethod
+    def rows(user,start=None,end=None,scan_type=None,include_archived=False):
+        # Whole-day bounds as timestamp ranges, so the (user, -timestamp) index is used.
+        start = timezone.make_aware(datetime.combine(start,time.min)) if start else None
+        end = timezone.make_aware(datetime.combine(end + timedelta(days=1),time.min)) if end else None
+
+        scans = ScannedItem.objects.filter(user=user)
+        if start:
+            scans = scans.filter(timestamp__gte=start)
+        if end:
+            scans = scans.filter(timestamp__lt=end)
+        if scan_type:
+            scans = scans.filter(scan_type=scan_type)
+        hot = scans.order_by('-timestamp','-id').values_list(*EXPORT_FIELDS).iterator(chunk_size=ExportService._chunk_size())
+        if not include_archived:
+            return hot
+
+        # Both sides are already newest-first, so merging them keeps memory flat.
+        cold = ArchiveService.iter_archived(user,EXPORT_FIELDS,start=start,end=end,scan_type=scan_type,chunk_size=ExportService._chunk_size())
+        return heapq.merge(hot,cold,key=lambda row: (row[1],row[0]),reverse=True)
+
+    @staticmethod
+    def _csv_chunks(rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+
+        for row in rows:
+            row = list(row)
+            row[1] = ExportService.format_timestamp(row[1])
+            row[6] = json.dumps(row[6])
+            row[7] = json.dumps(row[7])
+            writer.writerow(row)
+            if buffer.tell() >= FLUSH_BYTES:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _ndjson_chunks(rows):
+        lines = []
+        size = 0
+
+        for row in rows:
+            row = dict(zip(EXPORT_FIELDS,row))
+            row['timestamp'] = ExportService.format_timestamp(row['timestamp'])
+            line = json.dumps(row,cls=DjangoJSONEncoder) + '\n'
+            lines.append(line)
+            size += len(line)
+            if size >= FLUSH_BYTES:
+                yield ''.join(lines).encode('utf-8')
+                lines = []
+                size = 0
+
+        if lines:
+            yield ''.join(lines).encode('utf-8')
+
+    @staticmethod
+    def _parquet_schema():
+        return pyarrow.schema([
+            ('id',pyarrow.int64()),
+            ('timestamp',pyarrow.timestamp('us',tz='UTC')),
+            ('scan_type',pyarrow.string()),
+            ('status',pyarrow.string()),
+            ('scan_data',pyarrow.string()),
+            ('is_object_detected',pyarrow.bool_()),
+            ('object_labels',pyarrow.list_(pyarrow.string())),
+            ('metadata',pyarrow.string()),
+        ])
+
+    @staticmethod
+    def _parquet_chunks(rows):
+        # One row group per chunk; each is flushed to the client as soon as it is written.
+        schema = ExportService._parquet_schema()
+        sink = _ChunkSink()
+        writer = parquet.ParquetWriter(sink,schema,compression='snappy')
+        chunk_size = ExportService._chunk_size()
+        columns = [[] for _ in EXPORT_FIELDS]
+
+        def write_row_group():
+            data = list(columns)
+            data[7] = [json.dumps(value) for value in data[7]]
+            writer.write_table(pyarrow.Table.from_arrays([pyarrow.array(values,type=field.type) for values,field in zip(data,schema)],schema=schema))
+            for values in columns:
+                values.clear()
+            return sink.drain()
+
+        for row in rows:
+            for values,value in zip(columns,row):
+                values.append(value)
+            if len(columns[0]) >= chunk_size:
+                yield write_row_group()
+
+        if columns[0]:
+            yield write_row_group()
+        writer.close()
+        yield sink.drain()
+
+    @staticmethod
+    def _gzip(chunks):
+        compressor = zlib.compressobj(6,zlib.DEFLATED,zlib.MAX_WBITS | 16)
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    @staticmethod
+    def stream(rows,export_format,compress=False):
+        chunks = getattr(ExportService,f"_{export_format}_chunks")(rows)
+        # Parquet pages are already compressed; gzip on top only costs CPU.
+        if compress and export_format != 'parquet':
+            chunks = ExportService._gzip(chunks)
+        return chunks
+
+    @staticmethod
+    def filename(user,export_format,compress=False):
+        extension = ExportService.FORMATS[export_format][1]
+        if compress and export_format != 'parquet':
+            extension += '.gz'
+        return f"scans-{user.username}-{timezone.localdate().isoformat()}.{extension}"
@@ -0,0 +1,103 @@
+import os
+import threading
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from .. import tracing
+
+# One keep-alive session per upstream host, so repeated calls to the same
+# provider reuse pooled TCP/TLS connections instead of handshaking each time.
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+
+
+def _build_session():
+
+    pool_size = getattr(settings,'VISION_HTTP_POOL_SIZE',10)
+    connect_retries = getattr(settings,'VISION_HTTP_CONNECT_RETRIES',2)
+
+    # Only connection failures are retried: the request never reached the
+    # upstream, so it is safe for POSTs too. Read errors and bad statuses
+    # go straight back to the caller's fallback logic.
+    retry = Retry(
+        total=connect_retries,
+        connect=connect_retries,
+        read=0,
+        status=0,
+        other=0,
+        allowed_methods=None,
+        backoff_factor=0.1,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1,pool_maxsize=pool_size,max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://',adapter)
+    session.mount('https://',adapter)
+    return session
+
+
+def get_session(url):
+
+    global _sessions_pid
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+
+    with _sessions_lock:
+        # Sockets must not be shared with a forked parent (gunicorn --preload).
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+
+        session = _sessions.get(key)
+        if session is None:
+            session = _build_session()
+            _sessions[key] = session
+    return session
+
+
+def resolve_url(url):
+    # VISION_HTTP_HOST_OVERRIDES maps an upstream host (or '*' for every
+    # host) to a base URL, e.g. {'*': 'http://127.0.0.1:8765'} to send all
+    # provider traffic to the run_provider_standin server. Path and query
+    # are kept, so the stand-in can tell the providers apart.
+    overrides = getattr(settings,'VISION_HTTP_HOST_OVERRIDES',None)
+    if not overrides:
+        return url
+    parts = urlsplit(url)
+    target = overrides.get(parts.netloc) or overrides.get('*')
+    if not target:
+        return url
+    base = urlsplit(target)
+    return urlunsplit((base.scheme,base.netloc,base.path.rstrip('/') + parts.path,parts.query,parts.fragment))
+
+
+def request(method,url,**kwargs):
+    url = resolve_url(url)
+    parts = urlsplit(url)
+    with tracing.span('http.request',**{'http.method':method,'http.host':parts.netloc}) as current:
+        traceparent = current.traceparent()
+        if traceparent and tracing.propagates_to(parts.hostname):
+            kwargs['headers'] = dict(kwargs.get('headers') or {},traceparent=traceparent)
+        response = get_session(url).request(method,url,**kwargs)
+        current.set_attribute('http.status_code',response.status_code)
+        return response
+
+
+def get(url,**kwargs):
+    return request('GET',url,**kwargs)
+
+
+def post(url,**kwargs):
+    return request('POST',url,**kwargs)
+
+
+def close_all():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
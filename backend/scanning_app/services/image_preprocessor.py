@@ -0,0 +1,98 @@
+import base64
+import hashlib
+import io
+import threading
+from django.conf import settings
+from PIL import Image, ImageOps
+import logging
+
+logger = logging.getLogger(__name__)
+
+ORIENTATION_TAG = 0x0112
+
+MIME_TYPES = {
+    'JPEG':'image/jpeg',
+    'WEBP':'image/webp',
+    'PNG':'image/png',
+}
+
+
+class PreparedImage:
+    # The upload is read from disk exactly once. The provider payload
+    # (oriented, downscaled, re-encoded) and its base64 form are built on first
+    # use and shared by every provider attempt, hedged or sequential.
+
+    def __init__(self,raw,max_edge,image_format,quality):
+        self.raw = raw
+        self.sha256 = hashlib.sha256(raw).hexdigest()
+        self.max_edge = max_edge
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self._data = None
+        self._mime_type = None
+        self._b64 = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_path(cls,image_path):
+        with open(image_path,'rb') as image_file:
+            raw = image_file.read()
+        return cls(
+            raw,
+            getattr(settings,'VISION_IMAGE_MAX_EDGE',1600),
+            getattr(settings,'VISION_IMAGE_FORMAT','JPEG'),
+            getattr(settings,'VISION_IMAGE_QUALITY',85)
+        )
+
+    @property
+    def data(self):
+        self._ensure_encoded()
+        return self._data
+
+    @property
+    def mime_type(self):
+        self._ensure_encoded()
+        return self._mime_type
+
+    @property
+    def b64(self):
+        if self._b64 is None:
+            data = self.data
+            with self._lock:
+                if self._b64 is None:
+                    self._b64 = base64.b64encode(data).decode()
+        return self._b64
+
+    def _ensure_encoded(self):
+        if self._data is not None:
+            return
+        with self._lock:
+            if self._data is None:
+                self._data,self._mime_type = self._encode()
+
+    def _encode(self):
+        try:
+            image = Image.open(io.BytesIO(self.raw))
+            original_format = image.format
+            transformed = image.getexif().get(ORIENTATION_TAG,1) != 1
+            oriented = ImageOps.exif_transpose(image) if transformed else image
+
+            if max(oriented.size) > self.max_edge:
+                oriented.thumbnail((self.max_edge,self.max_edge),Image.LANCZOS)
+                transformed = True
+
+            if self.image_format == 'JPEG' and oriented.mode not in ('RGB','L'):
+                oriented = oriented.convert('RGB')
+
+            buffer = io.BytesIO()
+            oriented.save(buffer,format=self.image_format,quality=self.quality)
+            encoded = buffer.getvalue()
+        except Exception as e:
+            logger.warning(f"Image preprocessing failed, sending original bytes: {e}")
+            return self.raw,'application/octet-stream'
+
+        # Small, upright images may already be tighter than a re-encode.
+        if not transformed and len(encoded) >= len(self.raw):
+            return self.raw,MIME_TYPES.get(original_format,'application/octet-stream')
+
+        return encoded,MIME_TYPES.get(self.image_format,'application/octet-stream')
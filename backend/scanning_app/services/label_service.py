@@ -0,0 +1,100 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+import logging
+from ..models import ScannedItem, ScanLabel
+from .categorizer import label_matcher
+
+logger = logging.getLogger(__name__)
+
+
+class LabelService:
+    # Writes detected labels to the ScanLabel table and answers label
+    # queries from it. Labels are stored lower-cased and stripped, the same
+    # key LabelCategory uses.
+
+    @staticmethod
+    def normalize(label):
+        return str(label).lower().strip()[:255]
+
+    @staticmethod
+    def _labels(objects,labels=()):
+        # Keeps one entry per label with its highest confidence. Bare names
+        # (older scans only have object_labels) are categorized locally.
+        found = {}
+        for obj in objects:
+            key = LabelService.normalize(obj.get('name',''))
+            if not key:
+                continue
+            confidence = obj.get('confidence')
+            current = found.get(key)
+            if current is None or (confidence or 0) > (current[1] or 0):
+                found[key] = (obj.get('category') or '',confidence)
+        for label in labels:
+            key = LabelService.normalize(label)
+            if key and key not in found:
+                found[key] = ('',None)
+        return {key:(category or label_matcher.match(key) or 'other',confidence) for key,(category,confidence) in found.items()}
+
+    @staticmethod
+    def _rows(scan_id,user_id,scanned_at,labels):
+        return [
+            ScanLabel(scan_id=scan_id,user_id=user_id,label=label,category=category[:100],confidence=confidence,scanned_at=scanned_at)
+            for label,(category,confidence) in labels.items()
+        ]
+
+    @staticmethod
+    def record(scan,objects):
+        rows = LabelService._rows(scan.id,scan.user_id,scan.timestamp,LabelService._labels(objects))
+        with transaction.atomic():
+            ScanLabel.objects.filter(scan_id=scan.id).delete()
+            ScanLabel.objects.bulk_create(rows)
+        return len(rows)
+
+    @staticmethod
+    def backfill(chunk_size=1000):
+        scans = ScannedItem.objects.order_by().values('id','user_id','timestamp','object_labels','metadata')
+        written = 0
+        chunk = []
+
+        def flush(chunk):
+            rows = []
+            for scan in chunk:
+                detection = (scan['metadata'] or {}).get('detection') or {}
+                labels = LabelService._labels(detection.get('objects') or [],scan['object_labels'] or [])
+                rows.extend(LabelService._rows(scan['id'],scan['user_id'],scan['timestamp'],labels))
+            with transaction.atomic():
+                ScanLabel.objects.filter(scan_id__in=[scan['id'] for scan in chunk]).delete()
+                ScanLabel.objects.bulk_create(rows,batch_size=chunk_size)
+            return len(rows)
+
+        for scan in scans.iterator(chunk_size=chunk_size):
+            if not scan['object_labels'] and not (scan['metadata'] or {}).get('detection'):
+                continue
+            chunk.append(scan)
+            if len(chunk) >= chunk_size:
+                written += flush(chunk)
+                chunk = []
+        if chunk:
+            written += flush(chunk)
+
+        logger.info(f"Backfilled {written} scan labels")
+        return written
+
+    @staticmethod
+    def scans_with_label(user,label):
+        return ScannedItem.objects.filter(
+            user=user,
+            id__in=ScanLabel.objects.filter(user=user,label=LabelService.normalize(label)).values('scan_id')
+        )
+
+    @staticmethod
+    def top_labels(user,days=7,limit=10):
+        since = timezone.now() - timedelta(days=days)
+        return list(
+            ScanLabel.objects.filter(user=user,scanned_at__gte=since)
+            .values('label')
+            .annotate(count=Count('label'))
+            .order_by('-count','label')[:limit]
+        )
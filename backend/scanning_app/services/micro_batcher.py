@@ -0,0 +1,80 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    # Collects items submitted from many threads for up to max_wait seconds
+    # (or until max_batch_size is reached), hands them to send_batch as one
+    # list, and resolves each caller's Future with its own entry of the result.
+    # Each caller also gives the seconds it can wait; send_batch gets the
+    # smallest of those still left as its timeout, so a batch never outlives
+    # the tightest budget in it.
+
+    def __init__(self,name,send_batch,max_batch_size,max_wait,max_concurrent_batches=4):
+        self.name = name
+        self.send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrent_batches = max_concurrent_batches
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def _start(self):
+        # Threads don't survive a fork, so each process starts its own collector.
+        self.pid = os.getpid()
+        self.pending = queue.Queue()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent_batches,
+            thread_name_prefix=f"{self.name}-batch"
+        )
+        threading.Thread(target=self._collect,name=f"{self.name}-collector",daemon=True).start()
+
+    def submit(self,item,timeout):
+        with self.lock:
+            if self.pid != os.getpid():
+                self._start()
+        future = Future()
+        self.pending.put((item,future,time.monotonic() + timeout))
+        return future
+
+    def _collect(self):
+        while True:
+            batch = [self.pending.get()]
+            window_ends = time.monotonic() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                remaining = window_ends - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self.executor.submit(self._dispatch,batch)
+
+    def _dispatch(self,batch):
+        items = [item for item,_,_ in batch]
+        futures = [future for _,future,_ in batch]
+        timeout = min(expires_at for _,_,expires_at in batch) - time.monotonic()
+
+        try:
+            if timeout <= 0:
+                raise TimeoutError(f"{self.name} batch budget spent while collecting")
+            results = self.send_batch(items,timeout=timeout)
+            if len(results) != len(items):
+                raise ValueError(f"{self.name} returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            logger.warning(f"{self.name} batch of {len(items)} failed: {e}")
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        for future,result in zip(futures,results):
+            future.set_result(result)
@@ -62,7 +62,7 @@ class PaymentService:
 
             self.client.utility.verify_payment_signature(params_dict)
 
-            payment = Payment.objects.get(razorpay_order_id= razorpay_order_id)
+            payment = Payment.objects.select_related('user','subscription_plan').get(razorpay_order_id= razorpay_order_id)
             payment.razorpay_payment_id = razorpay_payment_id
             payment.status = 'success'
             payment.save()
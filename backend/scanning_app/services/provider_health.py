@@ -0,0 +1,168 @@
+import random
+import threading
+import time
+from django.conf import settings
+
+# Providers with no samples yet are assumed to answer in this many seconds.
+DEFAULT_LATENCY = 1.0
+# A failed attempt is assumed to cost this many seconds before the next provider answers.
+FAILURE_PENALTY = 1.0
+# Each step of static priority is worth this many seconds when ranking, so the
+# configured order still breaks ties between equally healthy providers.
+PRIORITY_WEIGHT = 0.1
+
+
+class ProviderHealth:
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self,name,alpha,failure_threshold,cooldown,decay_half_life=60):
+        self.name = name
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.decay_half_life = decay_half_life
+
+        self.state = self.CLOSED
+        self.ewma_latency = None
+        self.success_rate = 1.0
+        self.calls = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self.last_sample_at = None
+
+    def is_available(self,now):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return now - self.opened_at >= self.cooldown
+        return self.probe_started_at is None or now - self.probe_started_at >= self.cooldown
+
+    def allow_request(self,now):
+        if not self.is_available(now):
+            return False
+        if self.state != self.CLOSED:
+            # Let exactly one probe through; its outcome closes or re-opens the breaker.
+            self.state = self.HALF_OPEN
+            self.probe_started_at = now
+        return True
+
+    def record(self,success,latency,now):
+        self.calls += 1
+        self.last_sample_at = now
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency = self.alpha*latency + (1-self.alpha)*self.ewma_latency
+        self.success_rate = self.alpha*(1.0 if success else 0.0) + (1-self.alpha)*self.success_rate
+
+        if success:
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self.opened_at = None
+            self.probe_started_at = None
+            return
+
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = now
+            self.probe_started_at = None
+
+    def record_cancelled(self):
+        # The scan's own deadline ran out; says nothing about the provider.
+        # A probe cut short this way frees the slot for the next one.
+        self.cancelled += 1
+        if self.state == self.HALF_OPEN:
+            self.probe_started_at = None
+
+    def _weight(self,now):
+        # How much the measured stats still count. A provider that stops
+        # getting traffic after a blip drifts back to the untried prior
+        # instead of staying demoted on stale numbers.
+        if self.last_sample_at is None:
+            return 0.0
+        if not self.decay_half_life:
+            return 1.0
+        return 0.5 ** (max(0.0,now - self.last_sample_at)/self.decay_half_life)
+
+    def score(self,priority,now):
+        weight = self._weight(now)
+        latency = weight*(self.ewma_latency or 0.0) + (1-weight)*DEFAULT_LATENCY
+        success_rate = weight*self.success_rate + (1-weight)*1.0
+        return (
+            latency/max(success_rate,0.05)
+            + (1-success_rate)*FAILURE_PENALTY
+            + priority*PRIORITY_WEIGHT
+        )
+
+    def snapshot(self):
+        return {
+            'state':self.state,
+            'ewma_latency_ms':round(self.ewma_latency*1000,1) if self.ewma_latency is not None else None,
+            'success_rate':round(self.success_rate,3),
+            'calls':self.calls,
+            'failures':self.failures,
+            'cancelled':self.cancelled,
+            'consecutive_failures':self.consecutive_failures
+        }
+
+
+class ProviderHealthRegistry:
+    # Health is tracked per process; each gunicorn worker learns independently.
+    # EXPLORE_RATE of rankings move a random lower-ranked provider to the
+    # front, so demoted providers keep getting fresh samples.
+
+    def __init__(self,rand=random.random):
+        self.providers = {}
+        self.lock = threading.Lock()
+        self.random = rand
+
+    def _get(self,name):
+        health = self.providers.get(name)
+        if health is None:
+            config = getattr(settings,'VISION_CIRCUIT_BREAKER',{})
+            health = ProviderHealth(
+                name,
+                config.get('EWMA_ALPHA',0.2),
+                config.get('FAILURE_THRESHOLD',5),
+                config.get('COOLDOWN',30),
+                config.get('DECAY_HALF_LIFE',60)
+            )
+            self.providers[name] = health
+        return health
+
+    def rank(self,apis):
+        now = time.monotonic()
+        with self.lock:
+            available = [api for api in apis if self._get(api['name']).is_available(now)]
+            ranked = sorted(available,key=lambda api:self._get(api['name']).score(api['priority'],now))
+            explore_rate = getattr(settings,'VISION_CIRCUIT_BREAKER',{}).get('EXPLORE_RATE',0.02)
+            if len(ranked) > 1 and self.random() < explore_rate:
+                ranked.insert(0,ranked.pop(1 + int(self.random()*(len(ranked) - 1))))
+            return ranked
+
+    def allow_request(self,name):
+        with self.lock:
+            return self._get(name).allow_request(time.monotonic())
+
+    def record(self,name,success,latency):
+        with self.lock:
+            self._get(name).record(success,latency,time.monotonic())
+
+    def record_cancelled(self,name):
+        with self.lock:
+            self._get(name).record_cancelled()
+
+    def snapshot(self):
+        with self.lock:
+            return {name:health.snapshot() for name,health in self.providers.items()}
+
+
+provider_health = ProviderHealthRegistry()
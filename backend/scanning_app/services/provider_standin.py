@@ -0,0 +1,302 @@
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A local HTTP server answering the paths VisionService calls with bodies in
+# the shapes its parsers read, so detection and product lookups can be
+# benchmarked without the paid upstreams. Point http_pool at it with
+# VISION_HTTP_HOST_OVERRIDES = {'*': 'http://127.0.0.1:<port>'}.
+#
+# Each endpoint has its own profile:
+#   median, sigma   lognormal latency (seconds, and the spread of its log)
+#   error_rate      share of requests answered with error_status
+#   timeout_rate    share of requests held for `hang` seconds before answering,
+#                   longer than any client timeout
+# Responses are derived from a hash of the request, so the same image or name
+# always gets the same labels.
+
+DEFAULT_PROFILES = {
+    'imagga':{'median':0.35,'sigma':0.35,'error_rate':0.02,'timeout_rate':0.005},
+    'google_vision':{'median':0.25,'sigma':0.3,'error_rate':0.01,'timeout_rate':0.002},
+    'clarifai':{'median':0.3,'sigma':0.4,'error_rate':0.02,'timeout_rate':0.005},
+    'datamuse':{'median':0.06,'sigma':0.3,'error_rate':0.005,'timeout_rate':0.0},
+    'wikipedia':{'median':0.12,'sigma':0.35,'error_rate':0.01,'timeout_rate':0.001},
+    'openfoodfacts':{'median':0.3,'sigma':0.5,'error_rate':0.03,'timeout_rate':0.005},
+}
+PROFILE_DEFAULTS = {'median':0.1,'sigma':0.3,'error_rate':0.0,'timeout_rate':0.0,'error_status':503,'hang':30.0}
+
+ROUTES = [
+    ('imagga','POST',re.compile(r'^/v2/tags$')),
+    ('google_vision','POST',re.compile(r'^/v1/images:annotate$')),
+    ('clarifai','POST',re.compile(r'^/v2/models/[^/]+/outputs$')),
+    ('datamuse','GET',re.compile(r'^/words$')),
+    ('wikipedia','GET',re.compile(r'^/api/rest_v1/page/summary/(?P<title>[^/]+)$')),
+    ('openfoodfacts','GET',re.compile(r'^/api/v0/product/(?P<code>[^/]+)\.json$')),
+]
+
+# label, Datamuse-style definition (matched by the categorizer's keywords)
+VOCABULARY = [
+    ('bottle','n\ta glass or plastic container for holding a drink'),
+    ('cup','n\ta small open container used for drinking'),
+    ('apple','n\tfruit with red or yellow or green skin, eaten as food'),
+    ('banana','n\telongated crescent-shaped yellow fruit, eaten as food'),
+    ('bread','n\tfood made from dough of flour and baked'),
+    ('laptop','n\ta portable computer, an electronic device'),
+    ('phone','n\tan electronic device used to make calls'),
+    ('keyboard','n\tdevice consisting of keys for typing into a computer'),
+    ('chair','n\ta seat for one person, a piece of furniture'),
+    ('table','n\ta piece of furniture with a flat top and legs'),
+    ('sofa','n\tan upholstered seat, furniture for more than one person'),
+    ('shirt','n\ta garment of clothing for the upper body'),
+    ('shoe','n\tfootwear, clothing for the foot'),
+    ('car','n\ta motor vehicle with four wheels'),
+    ('bicycle','n\ta two-wheeled vehicle propelled by pedals'),
+    ('book','n\ta written work or composition that has been published'),
+    ('plant','n\ta living organism lacking the power of locomotion'),
+    ('lamp','n\tan artificial source of visible illumination'),
+]
+
+
+def _digest(*parts):
+    return hashlib.sha256('|'.join(str(part) for part in parts).encode()).digest()
+
+
+def _pick(seed,count):
+    # `count` distinct vocabulary entries with descending scores in (0.5, 1).
+    rng = random.Random(seed)
+    entries = rng.sample(VOCABULARY,count)
+    scores = sorted((rng.uniform(0.5,0.99) for _ in entries),reverse=True)
+    return list(zip(entries,scores))
+
+
+def imagga_body(seed):
+    return {
+        'result':{
+            'tags':[
+                {'confidence':round(score * 100,4),'tag':{'en':label}}
+                for (label,_),score in _pick(seed,6)
+            ]
+        },
+        'status':{'text':'','type':'success'}
+    }
+
+
+def google_vision_body(seeds):
+    return {
+        'responses':[
+            {
+                'labelAnnotations':[
+                    {'mid':f"/m/{label}",'description':label.title(),'score':round(score,6),'topicality':round(score,6)}
+                    for (label,_),score in _pick(seed,6)
+                ]
+            }
+            for seed in seeds
+        ]
+    }
+
+
+def clarifai_body(seeds):
+    # Clarifai reports a concept's confidence as `value`; _parse_clarifai_response
+    # reads `score`, so both are sent.
+    return {
+        'status':{'code':10000,'description':'Ok'},
+        'outputs':[
+            {
+                'status':{'code':10000,'description':'Ok'},
+                'data':{
+                    'concepts':[
+                        {'id':f"ai_{label}",'name':label,'value':round(score,6),'score':round(score,6),'app_id':'main'}
+                        for (label,_),score in _pick(seed,6)
+                    ]
+                }
+            }
+            for seed in seeds
+        ]
+    }
+
+
+def datamuse_body(query):
+    definitions = dict(VOCABULARY)
+    spelled = query.get('sp',[''])[0]
+    if spelled:
+        definition = definitions.get(spelled.lower(),'n\tan object or thing')
+        return [{'word':spelled,'score':1000,'defs':[definition]}]
+    related = query.get('rel_jja',[''])[0]
+    rng = random.Random(_digest('datamuse',related))
+    size = int(query.get('max',['3'])[0])
+    return [{'word':word,'score':rng.randint(100,2000)} for word in rng.sample(['small','large','new','old','red','plastic','wooden','fresh'],size)]
+
+
+def wikipedia_body(title):
+    title = unquote(title).replace('_',' ')
+    slug = title.replace(' ','_')
+    return {
+        'type':'standard',
+        'title':title,
+        'extract':f"{title.capitalize()} is a common object. " * 12,
+        'thumbnail':{'source':f"https://upload.wikimedia.org/standin/{slug}.jpg",'width':320,'height':240},
+        'content_urls':{'desktop':{'page':f"https://en.wikipedia.org/wiki/{slug}"}}
+    }
+
+
+def openfoodfacts_body(code):
+    code = unquote(code)
+    return {
+        'status':1,
+        'code':code,
+        'product':{
+            'generic_name':f"Stand-in {code}",
+            'brands':'Stand-in Foods',
+            'ingredients_text':'water, sugar, salt',
+            'nutriments':{'energy-kcal_100g':120,'fat_100g':3.5,'sugars_100g':9.1,'proteins_100g':2.2},
+            'url':f"https://world.openfoodfacts.org/product/{code}",
+            'allergens':''
+        }
+    }
+
+
+class ProviderStandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self,address,profiles=None,seed=None):
+        super().__init__(address,StandinHandler)
+        self.profiles = {}
+        for name,profile in DEFAULT_PROFILES.items():
+            self.profiles[name] = dict(PROFILE_DEFAULTS)
+            self.profiles[name].update(profile)
+            self.profiles[name].update((profiles or {}).get(name,{}))
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.counts = {name:{'ok':0,'error':0,'timeout':0} for name in DEFAULT_PROFILES}
+        self.stopping = threading.Event()
+
+    @property
+    def url(self):
+        host,port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def plan(self,endpoint):
+        # -> ('ok' | 'error' | 'timeout', delay in seconds)
+        profile = self.profiles[endpoint]
+        with self.rng_lock:
+            roll = self.rng.random()
+            latency = self.rng.lognormvariate(math.log(profile['median']),profile['sigma'])
+        if roll < profile['timeout_rate']:
+            return 'timeout',profile['hang']
+        if roll < profile['timeout_rate'] + profile['error_rate']:
+            return 'error',latency
+        return 'ok',latency
+
+    def record(self,endpoint,outcome):
+        with self.rng_lock:
+            self.counts[endpoint][outcome] += 1
+
+    def handle_error(self,request,client_address):
+        # Clients that gave up on a held request close the socket under us.
+        if isinstance(sys.exc_info()[1],(BrokenPipeError,ConnectionResetError)):
+            return
+        super().handle_error(request,client_address)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever,name='provider-standin',daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stopping.set()
+        self.shutdown()
+        self.server_close()
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so http_pool's keep-alive sessions are exercised as in production.
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def log_message(self,format,*args):
+        logger.debug(format % args)
+
+    def _handle(self,method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        parts = urlsplit(self.path)
+
+        for endpoint,route_method,pattern in ROUTES:
+            match = pattern.match(parts.path)
+            if match and route_method == method:
+                break
+        else:
+            self._send(404,{'error':f"No stand-in for {method} {parts.path}"})
+            return
+
+        outcome,delay = self.server.plan(endpoint)
+        # A held request wakes early on shutdown so the server can stop.
+        self.server.stopping.wait(delay)
+        self.server.record(endpoint,outcome)
+        if outcome != 'ok':
+            self._send(self.server.profiles[endpoint]['error_status'],{'error':f"stand-in {outcome}"})
+            return
+
+        try:
+            payload = self._payload(endpoint,match,parts,body)
+        except (ValueError,KeyError,TypeError) as e:
+            self._send(400,{'error':f"Bad stand-in request: {e}"})
+            return
+        self._send(200,payload)
+
+    def _payload(self,endpoint,match,parts,body):
+        if endpoint == 'imagga':
+            return imagga_body(_digest('imagga',body))
+        if endpoint == 'google_vision':
+            items = json.loads(body)['requests']
+            return google_vision_body([_digest('google',item['image']['content']) for item in items])
+        if endpoint == 'clarifai':
+            inputs = json.loads(body)['inputs']
+            return clarifai_body([_digest('clarifai',item['data']['image']['base64']) for item in inputs])
+        if endpoint == 'datamuse':
+            return datamuse_body(parse_qs(parts.query))
+        if endpoint == 'wikipedia':
+            return wikipedia_body(match.group('title'))
+        return openfoodfacts_body(match.group('code'))
+
+    def _send(self,status,payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def load_profiles(path=None,overrides=()):
+    # path: JSON {"imagga": {"median": 0.5, "error_rate": 0.1}, ...}
+    # overrides: "endpoint.key=value" strings, applied after the file.
+    profiles = {}
+    if path:
+        with open(path,encoding='utf-8') as handle:
+            profiles = json.load(handle)
+    for override in overrides:
+        key,_,value = override.partition('=')
+        endpoint,_,field = key.partition('.')
+        if endpoint not in DEFAULT_PROFILES or field not in PROFILE_DEFAULTS or not value:
+            raise ValueError(f"Invalid profile override: {override}")
+        endpoints = profiles.setdefault(endpoint,{})
+        endpoints[field] = int(value) if field == 'error_status' else float(value)
+    unknown = set(profiles) - set(DEFAULT_PROFILES)
+    if unknown:
+        raise ValueError(f"Unknown stand-in endpoints: {', '.join(sorted(unknown))}")
+    return profiles
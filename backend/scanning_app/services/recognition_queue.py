@@ -0,0 +1,173 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+import logging
+from ..models import ScannedItem
+from .vision_service import VisionService
+from .deadline import Deadline
+from .stats_service import StatsService
+from .search_service import SearchService
+from .label_service import LabelService
+from .. import tracing
+
+logger = logging.getLogger(__name__)
+
+
+class RecognitionQueue:
+    # Pending ScannedItems with an image are the queue. A worker claims rows
+    # by writing a lease (locked_by + lease_expires_at); a lease that runs out
+    # makes the row visible again, so a crashed worker's items are retried.
+
+    def __init__(self,worker_id,lease_seconds=120,max_attempts=3,batch_size=1,retry_delay=30):
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.vision_service = VisionService()
+        self.executor = None
+
+    def _claimable(self,now):
+        return ScannedItem.objects.filter(
+            status='pending',
+            attempts__lt=self.max_attempts
+        ).exclude(
+            image=''
+        ).exclude(
+            image__isnull=True
+        ).filter(
+            Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+        ).order_by('timestamp')
+
+    def claim(self):
+        now = timezone.now()
+        lease = {
+            'locked_by':self.worker_id,
+            'lease_expires_at':now + timedelta(seconds=self.lease_seconds),
+            'attempts':F('attempts') + 1
+        }
+
+        if connection.features.has_select_for_update_skip_locked:
+            # Postgres: rows locked by another worker's claim are skipped, not waited on.
+            with transaction.atomic():
+                ids = list(
+                    self._claimable(now).select_for_update(skip_locked=True).values_list('id',flat=True)[:self.batch_size]
+                )
+                if ids:
+                    ScannedItem.objects.filter(id__in=ids).update(**lease)
+        else:
+            # SQLite: the conditional UPDATE is the claim; losing a race just means rowcount 0.
+            ids = []
+            for candidate in self._claimable(now).values_list('id',flat=True)[:self.batch_size*4]:
+                claimed = self._claimable(now).filter(id=candidate).update(**lease)
+                if claimed:
+                    ids.append(candidate)
+                    if len(ids) >= self.batch_size:
+                        break
+
+        return list(ScannedItem.objects.filter(id__in=ids))
+
+    def expire_exhausted(self):
+        # Row by row, so the rollup is adjusted for exactly the rows this
+        # worker moved even when several workers expire at once.
+        exhausted = ScannedItem.objects.filter(
+            status='pending',
+            attempts__gte=self.max_attempts,
+            lease_expires_at__lt=timezone.now()
+        )
+        expired = []
+        for item in exhausted.only('id','user_id','scan_type','timestamp'):
+            with transaction.atomic():
+                if exhausted.filter(id=item.id).update(status='failed',locked_by='',lease_expires_at=None):
+                    StatsService.record_status_change(item,'pending','failed')
+                    expired.append(item.id)
+        return len(expired)
+
+    def process(self,item):
+        return self.process_batch([item])[0]
+
+    def process_batch(self,items):
+        # Every detection of a claimed batch runs at once, so with
+        # VISION_BATCHING on the micro-batcher sees them in the same window and
+        # sends them upstream together; with it off they still overlap. The
+        # results are written back here, on the worker's own connection.
+        if len(items) > 1:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.batch_size,thread_name_prefix='recognition')
+            detections = list(self.executor.map(self._detect_in_thread,items))
+        else:
+            detections = [self._detect(item) for item in items]
+
+        return [self._finish(item,result,error) for item,(result,error) in zip(items,detections)]
+
+    def _detect(self,item):
+        traceparent = (item.metadata or {}).get('traceparent')
+        with tracing.span('RecognitionQueue.process',traceparent=traceparent,scan_id=item.id,attempt=item.attempts) as current:
+            try:
+                result = self.vision_service.detect_objects(item.image.path,deadline=Deadline.for_scan())
+            except Exception as e:
+                logger.exception(f"Recognition failed for scan {item.id}")
+                current.record_error(e)
+                return None,e
+            current.set_attribute('outcome','success' if result.get('success',False) else 'failure')
+            return result,None
+
+    def _detect_in_thread(self,item):
+        try:
+            return self._detect(item)
+        finally:
+            # Label lookups may have opened a connection in this thread.
+            connection.close()
+
+    def _finish(self,item,result,error):
+        if error is not None:
+            self.fail(item,str(error))
+            return False
+        if not result.get('success',False):
+            self.fail(item,'No vision provider returned a result')
+            return False
+        self.complete(item,result)
+        return True
+
+    def complete(self,item,result):
+        objects = result.get('objects',[])
+        metadata = dict(item.metadata or {})
+        metadata['detection'] = {
+            'source':result.get('source'),
+            'confidence':result.get('confidence'),
+            'objects':objects
+        }
+
+        with transaction.atomic():
+            updated = ScannedItem.objects.filter(id=item.id,locked_by=self.worker_id).update(
+                status='processed',
+                is_object_detected=bool(objects),
+                object_labels=[obj['name'] for obj in objects],
+                metadata=metadata,
+                locked_by='',
+                lease_expires_at=None,
+                last_error=''
+            )
+            if updated:
+                StatsService.record_status_change(item,item.status,'processed')
+                SearchService.reindex([item.id])
+                LabelService.record(item,objects)
+        return updated
+
+    def fail(self,item,error):
+        # attempts was bumped at claim time; keep the row pending until the
+        # retry delay passes, or give up once attempts are used up.
+        exhausted = item.attempts >= self.max_attempts
+        new_status = 'failed' if exhausted else 'pending'
+        with transaction.atomic():
+            updated = ScannedItem.objects.filter(id=item.id,locked_by=self.worker_id).update(
+                status=new_status,
+                locked_by='',
+                lease_expires_at=None if exhausted else timezone.now() + timedelta(seconds=self.retry_delay),
+                last_error=error[:2000]
+            )
+            if updated:
+                StatsService.record_status_change(item,item.status,new_status)
+        return updated
@@ -1,61 +1,119 @@
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, F, Q, When
 from ..models import UserProfile,ScannedItem
+from .entitlement_service import EntitlementService
+from .stats_service import StatsService
+from .search_service import SearchService
+from .. import metrics, tracing
 from django.utils import timezone
 
 class ScanService:
 
     @staticmethod
     def can_user_scan(user):
-        try:
-            profile = UserProfile.objects.get(user = user)
-            return profile.can_scan()
-        except UserProfile.DoesNotExist:
+        snapshot = EntitlementService.get_snapshot(user)
+        if snapshot is None:
             return False
+        return EntitlementService.can_scan(snapshot)
         
     @staticmethod
     def get_remaining_scans(user):
-        try:
-            profile = UserProfile.objects.get(user=user)
-            return profile.get_remaining_scans()
-        except UserProfile.DoesNotExist:
+        snapshot = EntitlementService.get_snapshot(user)
+        if snapshot is None:
             return 0
+        return EntitlementService.remaining_scans(snapshot)
         
     @staticmethod
-    def create_scan(user, scan_data, scan_type, metadata = None):
-        try:
-            profile = UserProfile.objects.get(user=user)
+    def _premium_active(now):
+        return Q(is_premium=True, premium_expiry__gt=now)
 
-            if not profile.can_scan():
-                return {
-                    'success': False,
-                    'error': 'Scan limit reached. Please upgrade to premium.',
-                    'remaining_scans': profile.get_remaining_scans()
-                }
-            
-            scan = ScannedItem.objects.create(user=user,scan_data=scan_data,scan_type=scan_type,metadata=metadata or {})
+    @staticmethod
+    def consume_scan(user,count=1):
+        # One conditional UPDATE both checks and spends the quota, so concurrent
+        # scans from the same user can't read the same count and overrun it.
+        # All `count` scans fit or none are spent.
+        now = timezone.now()
+        premium_active = ScanService._premium_active(now)
 
-            profile.increment_scan_count()
+        return UserProfile.objects.filter(user=user).filter(
+            premium_active | Q(free_scans_used__lte=F('max_free_scans') - count)
+        ).update(
+            scan_count = F('scan_count') + count,
+            free_scans_used = Case(
+                When(premium_active, then=F('free_scans_used')),
+                default = F('free_scans_used') + count
+            ),
+            updated_at = now
+        ) == 1
 
-            return{
-                'success':True,
-                'scan':scan,
-                'remaining_scan':profile.get_remaining_scans()
-            }
-        
-        except UserProfile.DoesNotExist:
+    @staticmethod
+    @tracing.traced('ScanService.create_scan')
+    def create_scan(user, scan_data, scan_type, metadata = None, image = None):
+        metadata = metadata or {}
+        traceparent = tracing.current_traceparent()
+        if image and traceparent and isinstance(metadata,dict):
+            # Lets the recognition worker continue this trace.
+            metadata = dict(metadata,traceparent=traceparent)
+
+        with transaction.atomic():
+            consumed = ScanService.consume_scan(user)
+            if consumed:
+                scan = ScannedItem.objects.create(user=user,scan_data=scan_data,scan_type=scan_type,metadata=metadata,image=image)
+
+        return ScanService._result(user,consumed,scan=scan if consumed else None)
+
+    @staticmethod
+    @tracing.traced('ScanService.create_scans')
+    def create_scans(user, items):
+        # items are validated ScannedCreateSerializer dicts. The whole batch
+        # is charged in one UPDATE and refused if it doesn't fit the quota.
+        # bulk_create skips the model signals, so the rollup and the search
+        # index are updated here.
+        with transaction.atomic():
+            consumed = ScanService.consume_scan(user,len(items))
+            if consumed:
+                scans = ScannedItem.objects.bulk_create([ScannedItem(user=user,**data) for data in items])
+                StatsService.record_created(scans)
+                SearchService.reindex([scan.id for scan in scans])
+
+        return ScanService._result(user,consumed,scans=scans if consumed else [])
+
+    @staticmethod
+    def _result(user,consumed,**created):
+        # Read after commit so no lock is held for it; it also refreshes the
+        # cached entitlement snapshot that the UPDATE above made stale.
+        values = UserProfile.objects.filter(user=user).values(*EntitlementService.PROFILE_FIELDS).first()
+
+        if values is None:
             return{
                 'success': False,
                 'error': 'User profile not found'
             }
+
+        remaining_scans = EntitlementService.remaining_scans(EntitlementService.store(user.id,values))
+
+        if not consumed:
+            metrics.quota_rejected('service')
+            return {
+                'success': False,
+                'error': 'Scan limit reached. Please upgrade to premium.',
+                'remaining_scans': remaining_scans
+            }
+
+        return dict(created,success=True,remaining_scans=remaining_scans)
     
     @staticmethod
-    def get_user_static(user):
+    def get_user_stats(user):
         try:
             profile = UserProfile.objects.get(user=user)
-            total_scans = ScannedItem.objects.filter(user=user).count()
+            stats = StatsService.user_stats(user)
 
             return{
-                'total_scans': total_scans,
+                'total_scans': stats['total_scans'],
+                'today_scans': stats['today_scans'],
+                'scan_type_breakdown': stats['scan_type_breakdown'],
+                'status_breakdown': stats['status_breakdown'],
                 'free_scans_used': profile.free_scans_used,
                 'max_free_scans': profile.max_free_scans,
                 'remaining_scans': profile.get_remaining_scans(),
@@ -0,0 +1,164 @@
+import re
+from django.db import connection
+from django.db.models import Q
+import logging
+from ..models import ScannedItem
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'scanning_app_scansearch'
+TOKEN_PATTERN = re.compile(r'\w+',re.UNICODE)
+MAX_QUERY_TOKENS = 8
+
+DOCUMENT_FIELDS = ('id','user_id','scan_data','object_labels','product_info__name','product_info__brand')
+
+# Column weights: the owner column only scopes a query to one user, so it
+# must not move the score. Order is owner, scan_data, labels, product.
+FTS5_RANK = 'bm25(scanning_app_scansearch, 0.0, 1.0, 0.8, 0.5)'
+
+# scan_data, labels and product text are weighted A, B and C.
+POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('english', %s), 'A') || "
+    "setweight(to_tsvector('english', %s), 'B') || "
+    "setweight(to_tsvector('english', %s), 'C')"
+)
+
+
+class SearchService:
+    # Full-text index over a scan's text, its detected labels and the linked
+    # product's name and brand. The table is created per backend by migration
+    # 0006; every write path that changes those fields calls reindex().
+
+    @staticmethod
+    def enabled():
+        return connection.vendor in ('sqlite','postgresql')
+
+    @staticmethod
+    def tokens(query):
+        return TOKEN_PATTERN.findall((query or '').lower())[:MAX_QUERY_TOKENS]
+
+    @staticmethod
+    def _owner(user_id):
+        return f"u{user_id}"
+
+    @staticmethod
+    def _document(row):
+        return (
+            row['id'],
+            row['user_id'],
+            row['scan_data'] or '',
+            ' '.join(str(label) for label in (row['object_labels'] or [])),
+            ' '.join(value for value in (row['product_info__name'],row['product_info__brand']) if value)
+        )
+
+    @staticmethod
+    def _write(documents):
+        if connection.vendor == 'sqlite':
+            sql = f"INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, owner, scan_data, labels, product) VALUES (%s, %s, %s, %s, %s)"
+            params = [(scan_id,SearchService._owner(user_id),scan_data,labels,product) for scan_id,user_id,scan_data,labels,product in documents]
+        else:
+            sql = (
+                f"INSERT INTO {SEARCH_TABLE} (scan_id, user_id, document) VALUES (%s, %s, {POSTGRES_DOCUMENT}) "
+                "ON CONFLICT (scan_id) DO UPDATE SET user_id = EXCLUDED.user_id, document = EXCLUDED.document"
+            )
+            params = list(documents)
+
+        with connection.cursor() as cursor:
+            cursor.executemany(sql,params)
+
+    @staticmethod
+    def reindex(scan_ids,chunk_size=500):
+        if not SearchService.enabled():
+            return 0
+
+        scan_ids = list(scan_ids)
+        written = 0
+        for start in range(0,len(scan_ids),chunk_size):
+            rows = ScannedItem.objects.filter(id__in=scan_ids[start:start + chunk_size]).order_by().values(*DOCUMENT_FIELDS)
+            documents = [SearchService._document(row) for row in rows]
+            if documents:
+                SearchService._write(documents)
+                written += len(documents)
+        return written
+
+    @staticmethod
+    def remove(scan_ids):
+        scan_ids = list(scan_ids)
+        if not SearchService.enabled() or not scan_ids:
+            return
+        column = 'rowid' if connection.vendor == 'sqlite' else 'scan_id'
+        placeholders = ', '.join(['%s'] * len(scan_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {column} IN ({placeholders})",scan_ids)
+
+    @staticmethod
+    def rebuild(chunk_size=2000):
+        if not SearchService.enabled():
+            return 0
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+        written = 0
+        documents = []
+        for row in ScannedItem.objects.order_by().values(*DOCUMENT_FIELDS).iterator(chunk_size=chunk_size):
+            documents.append(SearchService._document(row))
+            if len(documents) >= chunk_size:
+                SearchService._write(documents)
+                written += len(documents)
+                documents = []
+        if documents:
+            SearchService._write(documents)
+            written += len(documents)
+
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+
+        logger.info(f"Rebuilt search index: {written} scans")
+        return written
+
+    @staticmethod
+    def _ranked_ids(user,tokens,limit,offset):
+        if connection.vendor == 'sqlite':
+            # The owner term makes the user filter part of the index lookup itself.
+            match = f'owner:{SearchService._owner(user.id)} AND ' + ' AND '.join(f'"{token}"*' for token in tokens)
+            sql = (
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                f"ORDER BY {FTS5_RANK}, rowid DESC LIMIT %s OFFSET %s"
+            )
+            params = [match,limit,offset]
+        else:
+            sql = (
+                f"SELECT scan_id FROM {SEARCH_TABLE} "
+                "WHERE user_id = %s AND document @@ to_tsquery('english', %s) "
+                "ORDER BY ts_rank_cd(document, to_tsquery('english', %s)) DESC, scan_id DESC LIMIT %s OFFSET %s"
+            )
+            tsquery = ' & '.join(f"{token}:*" for token in tokens)
+            params = [user.id,tsquery,tsquery,limit,offset]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql,params)
+            return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def search(user,query,columns,limit=20,offset=0):
+        # Returns one page of the user's scans as values(*columns) rows, best
+        # match first, and whether another page follows; one extra id is
+        # fetched instead of a COUNT.
+        tokens = SearchService.tokens(query)
+        if not tokens:
+            return [],False
+
+        if SearchService.enabled():
+            ids = SearchService._ranked_ids(user,tokens,limit + 1,offset)
+            has_more = len(ids) > limit
+            ids = ids[:limit]
+            scans = {row['id']:row for row in ScannedItem.objects.filter(user=user,id__in=ids).order_by().values(*columns)}
+            return [scans[scan_id] for scan_id in ids if scan_id in scans],has_more
+
+        condition = Q()
+        for token in tokens:
+            condition &= Q(scan_data__icontains=token)
+        scans = list(ScannedItem.objects.filter(user=user).filter(condition).order_by('-timestamp','-id').values(*columns)[offset:offset + limit + 1])
+        return scans[:limit],len(scans) > limit
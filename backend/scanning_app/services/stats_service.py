@@ -0,0 +1,179 @@
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Count, F, Sum, Value
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import logging
+from ..models import ScannedItem, ScanDailyStats, ArchivedScan
+
+logger = logging.getLogger(__name__)
+
+
+class StatsService:
+    # Scan counts are answered from the ScanDailyStats rollup rather than by
+    # counting ScannedItem. Every path that creates, re-statuses or deletes
+    # scans reports the change here; rebuild() recomputes it from scratch.
+
+    GLOBAL_CACHE_KEY = 'scan_stats:global'
+
+    @staticmethod
+    def bucket(timestamp,user_id,scan_type,status):
+        return (timezone.localdate(timestamp),user_id,scan_type,status)
+
+    @staticmethod
+    def _key(item,status=None):
+        return StatsService.bucket(item.timestamp,item.user_id,item.scan_type,status or item.status)
+
+    @staticmethod
+    def _apply(changes):
+        for (day,user_id,scan_type,scan_status),delta in changes.items():
+            if not delta:
+                continue
+            rows = ScanDailyStats.objects.filter(day=day,user_id=user_id,scan_type=scan_type,status=scan_status)
+            if rows.update(count=F('count') + delta):
+                continue
+            if delta < 0:
+                # Nothing to take away from; the bucket is already gone (e.g. a
+                # cascade delete of the user) or predates the rollup.
+                continue
+            try:
+                with transaction.atomic():
+                    ScanDailyStats.objects.create(day=day,user_id=user_id,scan_type=scan_type,status=scan_status,count=delta)
+            except IntegrityError:
+                # Another writer inserted the bucket between our UPDATE and INSERT.
+                rows.update(count=F('count') + delta)
+
+    @staticmethod
+    def record_created(items):
+        StatsService._apply(Counter(StatsService._key(item) for item in items))
+
+    @staticmethod
+    def record_status_change(item,old_status,new_status):
+        if old_status == new_status:
+            return
+        changes = Counter()
+        changes[StatsService._key(item,old_status)] -= 1
+        changes[StatsService._key(item,new_status)] += 1
+        StatsService._apply(changes)
+
+    @staticmethod
+    def record_moved(old_bucket,item):
+        # Any change to the bucket key (day, user, scan type or status)
+        # moves the scan from one rollup row to another.
+        new_bucket = StatsService._key(item)
+        if old_bucket == new_bucket:
+            return
+        StatsService._apply(Counter({old_bucket:-1,new_bucket:1}))
+
+    @staticmethod
+    def record_archived(rows):
+        # rows are values() dicts of scans moved out of the hot table; they
+        # stay counted, under the 'archived' status.
+        changes = Counter()
+        for row in rows:
+            if row['status'] == 'archived':
+                continue
+            day = timezone.localdate(row['timestamp'])
+            changes[(day,row['user_id'],row['scan_type'],row['status'])] -= 1
+            changes[(day,row['user_id'],row['scan_type'],'archived')] += 1
+        StatsService._apply(changes)
+
+    @staticmethod
+    def record_deleted(item):
+        StatsService._apply(Counter({StatsService._key(item):-1}))
+
+    @staticmethod
+    def rebuild(chunk_size=1000):
+        # Writes racing a rebuild can be lost, so run it when scans are quiet.
+        hot = ScannedItem.objects.order_by().annotate(
+            day=TruncDate('timestamp')
+        ).values('day','user_id','scan_type','status').annotate(total=Count('id'))
+        archived = ArchivedScan.objects.order_by().annotate(
+            day=TruncDate('timestamp'),
+            status=Value('archived',output_field=CharField())
+        ).values('day','user_id','scan_type','status').annotate(total=Count('id'))
+
+        with transaction.atomic():
+            ScanDailyStats.objects.all().delete()
+            batch = []
+            created = 0
+            for row in StatsService._rebuild_rows(hot,archived,chunk_size):
+                batch.append(ScanDailyStats(
+                    day=row['day'],
+                    user_id=row['user_id'],
+                    scan_type=row['scan_type'],
+                    status=row['status'],
+                    count=row['total']
+                ))
+                if len(batch) >= chunk_size:
+                    ScanDailyStats.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                ScanDailyStats.objects.bulk_create(batch)
+                created += len(batch)
+
+        cache.delete(StatsService.GLOBAL_CACHE_KEY)
+        logger.info(f"Rebuilt scan stats: {created} rows")
+        return created
+
+    @staticmethod
+    def _rebuild_rows(hot,archived,chunk_size):
+        # Hot rows still marked 'archived' share buckets with the archive
+        # table, so their counts are folded into its rows.
+        leftover = Counter()
+        for row in hot.iterator(chunk_size=chunk_size):
+            if row['status'] == 'archived':
+                leftover[(row['day'],row['user_id'],row['scan_type'])] += row['total']
+                continue
+            yield row
+        for row in archived.iterator(chunk_size=chunk_size):
+            row['total'] += leftover.pop((row['day'],row['user_id'],row['scan_type']),0)
+            yield row
+        for (day,user_id,scan_type),total in leftover.items():
+            yield {'day':day,'user_id':user_id,'scan_type':scan_type,'status':'archived','total':total}
+
+    @staticmethod
+    def _summarize(rows):
+        today = timezone.localdate()
+        total_scans = 0
+        today_scans = 0
+        scan_type_breakdown = Counter()
+        status_breakdown = Counter()
+
+        for row in rows:
+            total_scans += row['total']
+            if row['day'] == today:
+                today_scans += row['total']
+            scan_type_breakdown[row['scan_type']] += row['total']
+            status_breakdown[row['status']] += row['total']
+
+        return {
+            'total_scans': total_scans,
+            'today_scans': today_scans,
+            'scan_type_breakdown': dict(scan_type_breakdown.most_common()),
+            'status_breakdown': dict(status_breakdown.most_common())
+        }
+
+    @staticmethod
+    def global_stats():
+        # Summed across users, so it is cached briefly rather than recomputed per request.
+        stats = cache.get(StatsService.GLOBAL_CACHE_KEY)
+        if stats is not None:
+            return stats
+
+        today = timezone.localdate()
+        totals = ScanDailyStats.objects.order_by().values('scan_type','status').annotate(total=Sum('count'))
+        todays = ScanDailyStats.objects.filter(day=today).aggregate(total=Sum('count'))['total'] or 0
+        stats = StatsService._summarize([dict(row,day=None) for row in totals])
+        stats['today_scans'] = todays
+
+        cache.set(StatsService.GLOBAL_CACHE_KEY,stats,getattr(settings,'SCAN_STATS_CACHE_TTL',60))
+        return stats
+
+    @staticmethod
+    def user_stats(user):
+        rows = ScanDailyStats.objects.filter(user=user).order_by().values('day','scan_type','status').annotate(total=Sum('count'))
+        return StatsService._summarize(rows)
@@ -1,7 +1,12 @@
+from django.db import transaction
 from django.utils import timezone
+import logging
 from ..models import UserProfile, UserSubscription , SubscriptionPlan
+from .entitlement_service import EntitlementService
 
-class SubscriptoinService:
+logger = logging.getLogger(__name__)
+
+class SubscriptionService:
     @staticmethod
     def get_active_plan():
         return SubscriptionPlan.object.filter(is_active=True)
@@ -10,7 +15,7 @@ class SubscriptoinService:
     def get_user_subscription(user): 
             if(user):
                  
-                subscription = UserSubscription.objects.filter(
+                subscription = UserSubscription.objects.select_related('subscription_plan').filter(
                     user=user, 
                     is_active=True,
                     end_date__gt=timezone.now()
@@ -21,19 +26,50 @@ class SubscriptoinService:
     
     @staticmethod
     def check_subscription_expiry():
-        expired_subscription = UserSubscription.objects.filter(
-            is_active = True,
-            end_date__lte = timezone.now()
-        )
-
-        for subscription in expired_subscription:
-            subscription.is_active = False
-            subscription.save()
-
-            profile = UserProfile.objects.get(user= subscription.user)
-            profile.is_premium = False
-            profile.premium_expiry = None
-            profile.save()
+        return SubscriptionService.expire_subscriptions()
+
+    @staticmethod
+    def expire_subscriptions(now = None, chunk_size = 1000):
+        # Each chunk is one range read on the (is_active, end_date) index and
+        # two UPDATEs in a transaction, however many subscriptions lapse at once.
+        now = now or timezone.now()
+        expired = 0
+
+        while True:
+            with transaction.atomic():
+                rows = list(UserSubscription.objects.filter(
+                    is_active = True,
+                    end_date__lte = now
+                ).order_by('end_date').values_list('id','user_id')[:chunk_size])
+                if not rows:
+                    break
+
+                subscription_ids = [subscription_id for subscription_id,_ in rows]
+                user_ids = {user_id for _,user_id in rows}
+
+                expired += UserSubscription.objects.filter(id__in=subscription_ids,is_active=True).update(is_active=False)
+
+                # Users who already renewed keep premium.
+                still_active = UserSubscription.objects.filter(
+                    user_id__in = user_ids,
+                    is_active = True,
+                    end_date__gt = now
+                ).values('user_id')
+                UserProfile.objects.filter(user_id__in=user_ids).exclude(user_id__in=still_active).update(
+                    is_premium = False,
+                    premium_expiry = None,
+                    updated_at = now
+                )
+
+                # update() skips the write-through signal, so drop the cached snapshots.
+                transaction.on_commit(lambda user_ids=list(user_ids): EntitlementService.invalidate_many(user_ids))
+
+            if len(rows) < chunk_size:
+                break
+
+        if expired:
+            logger.info(f"Expired {expired} subscriptions")
+        return expired
 
     @staticmethod
     def get_premium_features():
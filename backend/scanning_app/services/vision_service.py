@@ -1,20 +1,84 @@
-import requests
 import base64
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from django.conf import settings
-from datetime import datetime,timedelta
 import logging
+from . import http_pool
+from .detection_cache import get_detection_cache
+from .image_preprocessor import PreparedImage
+from .provider_health import provider_health
+from .categorizer import get_label_categorizer
+from .singleflight import SingleFlight
+from .micro_batcher import MicroBatcher
+from .deadline import Deadline
+from .. import metrics, tracing
 
 logger = logging.getLogger(__name__)
 
+# Shared by every VisionService in the process so concurrent requests for the
+# same image hash or product name run the provider waterfall only once.
+_in_flight = SingleFlight()
+
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+
+
+# Largest batch each provider accepts in one call.
+PROVIDER_BATCH_LIMITS = {
+    'GoogleVision':16,
+    'Clarifai':128,
+}
+BATCH_RESULT_TIMEOUT = 15
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def _batching_config():
+    return getattr(settings,'VISION_BATCHING',{})
+
+
+def _get_batcher(provider):
+    with _batchers_lock:
+        batcher = _batchers.get(provider)
+        if batcher is None:
+            config = _batching_config()
+            send_batch = {
+                'GoogleVision':VisionService._annotate_with_google_vision,
+                'Clarifai':VisionService._predict_with_clarifai,
+            }[provider]
+            batcher = MicroBatcher(
+                provider,
+                send_batch,
+                max_batch_size=min(config.get('MAX_BATCH_SIZE',16),PROVIDER_BATCH_LIMITS[provider]),
+                max_wait=config.get('MAX_WAIT',0.05)
+            )
+            _batchers[provider] = batcher
+    return batcher
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings,'VISION_HEDGE_MAX_WORKERS',8),
+                    thread_name_prefix='vision-hedge'
+                )
+    return _hedge_executor
+
 
 class VisionService:
 
     def __init__(self):
         
         self.apis = self._initialize_apis()
-        self.cache = {}
-        self.cache_timeout = timedelta(hours=1)
+        self.cache = get_detection_cache()
+        self.detection_mode = getattr(settings,'VISION_DETECTION_MODE','sequential')
+        self.hedge_delay = getattr(settings,'VISION_HEDGE_DELAY',1.5)
 
 
         
@@ -39,12 +103,6 @@ class VisionService:
                 'priority':3,
                 'enabled':bool(getattr(settings,'CLARIFAI_API_KEY',''))
             },
-            {
-                'name':'Fallback',
-                'function':self._fallback_detection,
-                'priority':99,
-                'enabled':True
-            },
             {
                 'name':'Gemini',
                 'function':self._detect_with_gemini,
@@ -61,244 +119,398 @@ class VisionService:
     
 
     
-    def detect_objects(self,image_path):
+    @tracing.traced('VisionService.detect_objects')
+    def detect_objects(self,image_path,deadline=None):
         
-        cache_key = f"detect_{hash(image_path)}"
+        try:
+            image = PreparedImage.from_path(image_path)
+        except OSError as e:
+            logger.error(f"Could not read image {image_path}: {e}")
+            return self._get_fallback_result()
+
+        cache_key = f"detect_{image.sha256}"
         cached_result = self._get_cached(cache_key)
+        metrics.cache_lookup('detection',bool(cached_result))
+        tracing.current_span().set_attribute('cache.hit',bool(cached_result))
         if cached_result:
             return cached_result
-        
-        enabled_apis = sorted(
-            [api for api in self.apis if api['enabled']],
-            key = lambda x:x['priority']
+
+        deadline = deadline or Deadline.for_scan()
+        try:
+            return _in_flight.do(cache_key,self._detect_uncached,cache_key,image,deadline,timeout=deadline.remaining())
+        except TimeoutError:
+            logger.warning("Scan deadline reached while waiting on an identical detection")
+            return self._get_fallback_result()
+
+
+    def _detect_uncached(self,cache_key,image,deadline):
+        # Only real providers are ranked and health-tracked; the fallback
+        # result always comes last, once every provider has failed.
+
+        enabled_apis = provider_health.rank(
+            [api for api in self.apis if api['enabled']]
         )
 
+        if self.detection_mode == 'hedged':
+            result = self._detect_hedged(enabled_apis,image,deadline)
+        else:
+            result = self._detect_sequential(enabled_apis,image,deadline)
+
+        if result:
+            self._set_cached(cache_key,result)
+            return result
+
+        return self._get_fallback_result()
+
+
+    def _detect_sequential(self,enabled_apis,image,deadline):
+
         for api in enabled_apis:
+            if deadline.expired():
+                logger.warning(f"Scan deadline reached, skipping {api['name']}API and the rest")
+                break
             try:
                 logger.info(f"Trying {api['name']}API....")
-                result = api['function'](image_path)
+                result = self._call_provider(api,image,deadline)
                 if result and result.get('success',False):
-                    self._set_cached(cache_key,result)
                     return result
             except Exception as e:
                 logger.warning(f"API {api['name']} API failed: {str(e)}")
                 continue
-        
-        return self._get_fallback_result()
-    
 
-    
-    def _detect_with_imagga(self,image_path):
+        return None
+
+
+    def _detect_hedged(self,enabled_apis,image,deadline):
+        # Start the top provider, then add the next one whenever the hedge
+        # delay passes without an answer or a running provider fails.
+        # The first successful result wins and everything else is dropped.
+
+        executor = _get_hedge_executor()
+        waiting = list(enabled_apis)
+        in_flight = {}
+
+        def launch_next():
+            api = waiting.pop(0)
+            logger.info(f"Trying {api['name']}API (hedged)....")
+            in_flight[executor.submit(tracing.bind(self._call_provider),api,image,deadline)] = api
+
+        try:
+            if waiting:
+                launch_next()
+
+            while in_flight:
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    logger.warning("Scan deadline reached with providers still running")
+                    break
+
+                done,_ = wait(
+                    in_flight,
+                    timeout = min(self.hedge_delay,remaining) if waiting else remaining,
+                    return_when = FIRST_COMPLETED
+                )
+
+                if not done:
+                    if waiting and not deadline.expired():
+                        launch_next()
+                    continue
+
+                for future in done:
+                    api = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.warning(f"API {api['name']} API failed: {str(e)}")
+                        result = None
+
+                    if result and result.get('success',False):
+                        return result
+
+                    if waiting and not deadline.expired():
+                        launch_next()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+        return None
+
+
+    def _call_provider(self,api,image,deadline):
+        # Open breakers are skipped without spending the provider's timeout.
+
+        if not provider_health.allow_request(api['name']):
+            logger.info(f"Skipping {api['name']}API, circuit open")
+            metrics.provider_skipped(api['name'])
+            return None
+
+        with tracing.span('vision.provider',provider=api['name']) as current:
+            started = time.monotonic()
+            try:
+                result = api['function'](image,deadline)
+            except Exception:
+                elapsed = time.monotonic()-started
+                self._record_provider(api['name'],False,elapsed,deadline,failure='error')
+                raise
+
+            elapsed = time.monotonic()-started
+            success = bool(result and result.get('success',False))
+            current.set_attribute('outcome',self._record_provider(api['name'],success,elapsed,deadline))
+            return result
+
+    def _record_provider(self,name,success,elapsed,deadline,failure='failure'):
+        # Every provider timeout is capped by the scan deadline, so a call
+        # that fails once the deadline has run out was cut short by us, not
+        # by the provider; it must not push the breaker towards open.
+        if success:
+            outcome = 'success'
+            provider_health.record(name,True,elapsed)
+        elif deadline.expired():
+            outcome = 'deadline'
+            provider_health.record_cancelled(name)
+        else:
+            outcome = failure
+            provider_health.record(name,False,elapsed)
+        metrics.observe_provider(name,'detection',outcome,elapsed)
+        return outcome
+
+
+    def _get_fallback_result(self):
+
+        return {
+            'success':False,
+            'objects':[],
+            'source':'Fallback',
+            'api_used':'Fallback',
+            'confidence':0
+        }
+
+
+    def _detect_with_imagga(self,image,deadline):
         # Implementation for Imagga API
         
         try:
-            with open(image_path,'rb') as image_file:
-                image_datas = base64.b64encode(image_file.read()).decode()
+            image_datas = image.b64
 
-                headers = {
-                    'Authorization':f'Basic{base64.b64encode(f"{settings.IMAGGA_API_KEY}:{settings.IMAGGA_API_SECRET}").encode().decode()}'   
-                }
+            credentials = base64.b64encode(f"{settings.IMAGGA_API_KEY}:{settings.IMAGGA_API_SECRET}".encode()).decode()
+            headers = {
+                'Authorization':f'Basic {credentials}'
+            }
 
 
-                response = request.post(
-                    'https://api.imagga.com/v2/tags',
-                    headers= headers,
-                    data = {'image_base64':image_datas},
-                    timeout = 10
-                )
+            response = http_pool.post(
+                'https://api.imagga.com/v2/tags',
+                headers= headers,
+                data = {'image_base64':image_datas},
+                timeout = deadline.timeout(10)
+            )
 
 
-                if response.status_code == 200:
-                    data = response.json()
-                    objects = self._parse_imagga_response(data)
-                    return {
-                        'success':True,
-                        'objects':objects,
-                        'source':'Imagga',
-                        'api_used':'Imagga',
-                        'confidence': self._calculate_overall_confidence(objects)
-                    }
+            if response.status_code == 200:
+                data = response.json()
+                objects = self._parse_imagga_response(data)
+                return {
+                    'success':True,
+                    'objects':objects,
+                    'source':'Imagga',
+                    'api_used':'Imagga',
+                    'confidence': self._calculate_overall_confidence(objects)
+                }
 
         except Exception as e:
-            logger.erro(f"Imagga API error:{e}")
+            logger.error(f"Imagga API error: {e}")
 
         return {'success':False}
     
-    def _detect_with_google_vision(self,image_path):
+    def _detect_with_google_vision(self,image,deadline):
 
         try:
-            with open(image_path,'rb') as image_file:
-                image_content = base64.b64encode(image_file.read()).decode()
+            if _batching_config().get('ENABLED',False):
+                annotation = _get_batcher('GoogleVision').submit(image,deadline.timeout(10)).result(timeout=deadline.timeout(BATCH_RESULT_TIMEOUT))
+            else:
+                annotation = self._annotate_with_google_vision([image],timeout=deadline.timeout(10))[0]
 
-                payload = {
-                    'requests':[
-                        {
-                            'image':{
-                                'content':image_content
-                            },
-                            'features':[
-                                {
-                                    'type':'LABEL_DETECTION',
-                                    'maxResults':10
-                                }
-                            ]
-                        }
-                    ]
+            if 'error' not in annotation:
+                objects= self._parse_google_vision_response({'responses':[annotation]})
+                return {
+                    'success':True,
+                    'objects':objects,
+                    'source':'Google Vision',
+                    'api_used':'Google Vision',
+                    'confidence': self._calculate_overall_confidence(objects)
                 }
-
-
-                response = requests.post(
-                    f'https://vision.googleapis.com/v1/images:annotate?key={settings.GOOGLE_VISION_API_KEY}',
-                    json = payload,
-                    timeout=10
-                )
-
-                if response.status_code == 200:
-                    data = response.json()
-                    objects= self._parse_google_vision_response(data)
-                    return {
-                        'success':True,
-                        'objects':objects,
-                        'source':'Google Vision',
-                        'api_used':'Google Vision',
-                        'confidence': self._calculate_overall_confidence(objects)
-                    }
+            logger.error(f"Google Vision API error: {annotation['error']}")
         except Exception as e:
             logger.error(f"Google Vision API error: {e}")
         
         return {'success': False}
-    
 
-    def _detect_with_clarifai(self,image_path):
 
-        try:
-            with open(image_path,'rb') as image_file:
-                image_content = base64.b64encode(image_file.read()).decode()
-
-                headers = {
-                    'Authorization':f'Key {setting.CLARIFAI_API_KEY}',
-                    'Content-Type':'application/json'
-                }
+    @staticmethod
+    def _annotate_with_google_vision(images,timeout=10):
+        # images:annotate takes one request per image and answers in the same order.
 
-                data = {
-                    'inputs':[
+        payload = {
+            'requests':[
+                {
+                    'image':{
+                        'content':image.b64
+                    },
+                    'features':[
                         {
-                            'data':{
-                                'image':{
-                                    'base64':image_content
-                                }
-                            }
+                            'type':'LABEL_DETECTION',
+                            'maxResults':10
                         }
                     ]
                 }
+                for image in images
+            ]
+        }
 
-                response = request.post(
-                    'https://api.clarifai.com/v2/models/general-image-recognition/outputs',
-                    headers = headers,
-                    json = data,
-                    timeout = 10
-                )
+        response = http_pool.post(
+            f'https://vision.googleapis.com/v1/images:annotate?key={settings.GOOGLE_VISION_API_KEY}',
+            json = payload,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json().get('responses',[])
+    
 
+    def _detect_with_clarifai(self,image,deadline):
 
+        try:
+            if _batching_config().get('ENABLED',False):
+                output = _get_batcher('Clarifai').submit(image,deadline.timeout(10)).result(timeout=deadline.timeout(BATCH_RESULT_TIMEOUT))
+            else:
+                output = self._predict_with_clarifai([image],timeout=deadline.timeout(10))[0]
 
-                if response.status_code == 200:
-                    data = response.json()
-                    objects = self._parse_clarifai_response(data)
-                    return {
-                        'success':True,
-                        'objects':objects,
-                        'source':'Clarifai',
-                        'api_used':'Clarifai',
-                        'confidence': self._calculate_overall_confidence(objects)
-                    }
-                
+            if output.get('data'):
+                objects = self._parse_clarifai_response({'outputs':[output]})
+                return {
+                    'success':True,
+                    'objects':objects,
+                    'source':'Clarifai',
+                    'api_used':'Clarifai',
+                    'confidence': self._calculate_overall_confidence(objects)
+                }
+            
         except Exception as e:
             logger.error(f"Clarifai API error: {e}")
         
         return {'success': False}
 
 
-    def _detect_with_gemini(self,image_path):
+    @staticmethod
+    def _predict_with_clarifai(images,timeout=10):
+        # One output per input, in input order.
 
-        try:
-            with open(image_path,'rb+') as image_file:
-                image_content = base64.b64encode(image_file.read()).decode()
-
-                headers = {
-                    'Authorization':f'Bearer {settings.GEMINI_API_KEY}',
-                    'Content-Type':'application/json'
-                }  
+        headers = {
+            'Authorization':f'Key {settings.CLARIFAI_API_KEY}',
+            'Content-Type':'application/json'
+        }
 
-                data = {
-                    'model':settings.GEMINI_MODEL_NAME,
-                    'inputs':{
+        data = {
+            'inputs':[
+                {
+                    'data':{
                         'image':{
-                            'base64':image_content
+                            'base64':image.b64
                         }
                     }
                 }
+                for image in images
+            ]
+        }
 
-                response = request.post(
-                    'https://api.gemini.com/v1/models/detect',
-                    headers = headers,
-                    json = data,
-                    timeout = 10
-                )
+        response = http_pool.post(
+            'https://api.clarifai.com/v2/models/general-image-recognition/outputs',
+            headers = headers,
+            json = data,
+            timeout = timeout
+        )
+        response.raise_for_status()
+        return response.json().get('outputs',[])
 
-                if response.status_code == 200:
-                    data = response.json()
-                    objects = self._parse_gemini_response(data)
-                    return {
-                        'success':True,
-                        'objects':objects,
-                        'source':'Gemini',
-                        'api_used':'Gemini',
-                        'confidence': self._calculate_overall_confidence(objects)
+
+    def _detect_with_gemini(self,image,deadline):
+
+        try:
+            image_content = image.b64
+
+            headers = {
+                'Authorization':f'Bearer {settings.GEMINI_API_KEY}',
+                'Content-Type':'application/json'
+            }  
+
+            data = {
+                'model':settings.GEMINI_MODEL_NAME,
+                'inputs':{
+                    'image':{
+                        'base64':image_content
                     }
-                
+                }
+            }
+
+            response = http_pool.post(
+                'https://api.gemini.com/v1/models/detect',
+                headers = headers,
+                json = data,
+                timeout = deadline.timeout(10)
+            )
+
+            if response.status_code == 200:
+                data = response.json()
+                objects = self._parse_gemini_response(data)
+                return {
+                    'success':True,
+                    'objects':objects,
+                    'source':'Gemini',
+                    'api_used':'Gemini',
+                    'confidence': self._calculate_overall_confidence(objects)
+                }
+            
         except Exception as e:
             logger.error(f"Gemini API error: {e}")
         
         return {'success': False}
 
 
-    def _detect_with_openai(self,image_path):
+    def _detect_with_openai(self,image,deadline):
 
         try:
-            with open(image_path,'rb') as image_file:
-                image_content = base64.b64encode(image_file.read()).decode()
+            image_content = image.b64
 
-                headers = {
-                    'Authorization': f'Bearer {settings.OPENA1_API_KEY}',
-                    'Content-Type':'application/json'
-                }
+            headers = {
+                'Authorization': f'Bearer {settings.OPENA1_API_KEY}',
+                'Content-Type':'application/json'
+            }
 
-                data = {
-                    'inputs':{
-                        'image':{
-                            'base64':image_content
-                        }
+            data = {
+                'inputs':{
+                    'image':{
+                        'base64':image_content
                     }
                 }
+            }
 
-                response = requests.post(
-                    'https://api.openai.com/v1/models/detect',
-                    headers = headers,
-                    json = data,
-                    timeout = 10
-                )
+            response = http_pool.post(
+                'https://api.openai.com/v1/models/detect',
+                headers = headers,
+                json = data,
+                timeout = deadline.timeout(10)
+            )
 
-                if response.status_code == 200:
-                    data = response.json()
-                    objects = self._parse_openai_response(data)
-                    return {
-                        'success':True,
-                        'objects':objects,
-                        'source':'OpenAI',
-                        'api_used':'OpenAI',
-                        'confidence':self._calculate_overall_confidence(objects)
-                    }
-                
+            if response.status_code == 200:
+                data = response.json()
+                objects = self._parse_openai_response(data)
+                return {
+                    'success':True,
+                    'objects':objects,
+                    'source':'OpenAI',
+                    'api_used':'OpenAI',
+                    'confidence':self._calculate_overall_confidence(objects)
+                }
+            
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
 
@@ -376,112 +588,70 @@ class VisionService:
         return objects[:8]
 
 
+    @tracing.traced('VisionService._dynamic_categorize')
     def _dynamic_categorize(self,label):
 
-        api_category = self._get_category_from_api(label)
-        if api_category:
-            return api_category
-    
-        return self._local_categorization(label)
-    
-    
-    def _get_category_from_api(self,label):
-
-        try:
-            response = requests.get(
-                f"https://api.datamuse.com/words?sp={label}&md=d&max=1",
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data and 'defs' in data[0]:
-                    definition = data[0]['defs'][0]
-                    return self._extract_category_from_definition(definition)
-        except Exception as e:
-            logger.error(f"Error fetching category from API: {e}")
-        return None
-    
-
-
-    def _extract_category_from_definition(self,definition):
-
-        definition = definition.lower()
-        category_keywords = {
-            'food': ['food', 'fruit', 'vegetable', 'nutrient', 'edible'],
-            'animal': ['animal', 'mammal', 'bird', 'insect', 'species'],
-            'tool': ['tool', 'instrument', 'device', 'implement'],
-            'vehicle': ['vehicle', 'car', 'transport', 'machine'],
-            'clothing': ['clothing', 'garment', 'wear', 'apparel'],
-            'furniture': ['furniture', 'furnishing', 'seat', 'table'],
-            'electronics': ['electronic', 'device', 'computer', 'digital'],
-            'nature': ['plant', 'tree', 'flower', 'landscape', 'natural']
-        }
-
-        for category,keywords in category_keywords.items():
-            if any(keywords in definition for keyword in keywords):
-                return category
-        return 'other'
-    
-
-    def _local_categorization(self,label):
-
-        object_name = object_name.lower()
-        categories = {
-            'food': ['apple','banana','pizza','burger','food','fruit'],
-            'electronics':['phone','laptop','computer','camera','tv','electronics'],
-            'clothing':['shirt','pants','dress','clothing','shoe'],
-            'furniture':['chair','table','sofa','bed','furniture'],
-            'clothing':['car','bike','bus','vehicle','truck'],
-            'sports':['ball','racket','sports','game'],
-            'animal':['dog','cat','bird','animal','fish'],
-            'tool':['hammer','screwdriver','tool','wrench'],
-            'nature':['tree','flower','plant','nature','grass']
-        }
-
-
-        for category,keywords in categories.items():
-            if any(keyword in object_name for keyword in keywords):
-                return category
-        return 'other'
+        return get_label_categorizer().categorize(label)
     
 
-    def get_product_details(self,object_name):
+    @tracing.traced('VisionService.get_product_details')
+    def get_product_details(self,object_name,deadline=None):
 
         cache_key = f"product_{object_name.lower()}"
         cached_result = self._get_cached(cache_key)
+        metrics.cache_lookup('product',bool(cached_result))
+        tracing.current_span().set_attribute('cache.hit',bool(cached_result))
 
         if cached_result:
             return cached_result
-        
+
+        deadline = deadline or Deadline.for_scan()
+        try:
+            return _in_flight.do(cache_key,self._get_product_details_uncached,cache_key,object_name,deadline,timeout=deadline.remaining())
+        except TimeoutError:
+            logger.warning("Scan deadline reached while waiting on an identical product lookup")
+            return self._generate_dynamic_fallback(object_name,deadline)
+
+
+    def _get_product_details_uncached(self,cache_key,object_name,deadline):
+
         apis_to_try = [
-            self._get_from_wikipedia,
-            self._get_from_open_food_facts,
-            self._get_from_walmart_api,
-            self._get_from_amazon_api,
-            self._generate_dynamic_fallback
+            ('Wikipedia',self._get_from_wikipedia),
+            ('OpenFoodFacts',self._get_from_open_food_facts),
+            ('Walmart',self._get_from_walmart_api),
+            ('DynamicFallback',self._generate_dynamic_fallback)
         ]
 
 
-        for api_func in apis_to_try:
+        for name,api_func in apis_to_try:
+            if deadline.expired():
+                # Out of budget: answer from local data instead of the remaining upstreams.
+                logger.warning(f"Scan deadline reached, skipping {name} and the rest")
+                break
+            started = time.monotonic()
             try:
-                result = api_func(object_name)
-                if result and result.get('success',False):
+                with tracing.span('product.provider',provider=name) as current:
+                    result = api_func(object_name,deadline)
+                    success = bool(result and result.get('success',False))
+                    current.set_attribute('outcome','success' if success else 'failure')
+                metrics.observe_provider(name,'product','success' if success else 'failure',time.monotonic()-started)
+                if success:
                     self._set_cached(cache_key,result)
                     return result
             except Exception as e:
-                logger.warning(f"Product detail API {api_func.__name__} failed: {str(e)}")
+                metrics.observe_provider(name,'product','error',time.monotonic()-started)
+                logger.warning(f"Product detail API {name} failed: {str(e)}")
                 continue
     
-        return self._generate_dynamic_fallback(object_name)
+        return self._generate_dynamic_fallback(object_name,deadline)
     
 
-    def _get_from_wikipedia(self,object_name):
+    def _get_from_wikipedia(self,object_name,deadline):
 
         try:
-            response = requests.get(
+            response = http_pool.get(
                 f"https://en.wikipedia.org/api/rest_v1/page/summary/{object_name.replace(' ','_')}",
-                timeout=10
+                timeout=deadline.timeout(10)
             )
 
             if response.status_code == 200:
@@ -501,15 +671,15 @@ class VisionService:
         
         return {'success':False}
      
-    def _get_from_open_food_facts(self,object_name):
+    def _get_from_open_food_facts(self,object_name,deadline):
 
         if self._dynamic_categorize(object_name) != 'food':
             return {'success':False}
         
         try:
-            response = requests.get(
+            response = http_pool.get(
                 f"https://world.openfoodfacts.org/api/v0/product/{object_name}.json",
-                timeout=10
+                timeout=deadline.timeout(10)
             )
 
             if response.status_code == 200:
@@ -531,12 +701,12 @@ class VisionService:
     
 
 
-    def _get_from_walmart_api(self,object_name):
+    def _get_from_walmart_api(self,object_name,deadline):
         try:
-            if hasattr(setting,'WALMART_API_KEY'):
-                response = requests.get(
+            if hasattr(settings,'WALMART_API_KEY'):
+                response = http_pool.get(
                     f"http://api.walmartlabs.com/v1/search?query={object_name}&format=json&apiKey={settings.WALMART_API_KEY}",
-                    timeout=8
+                    timeout=deadline.timeout(8)
                 )
 
                 if response.status_code == 200:
@@ -579,11 +749,14 @@ class VisionService:
            'allergens': product_data.get('allergens', '')
         }
     
-    def _generate_dynamic_fallback(self,object_name):
+    def _generate_dynamic_fallback(self,object_name,deadline=None):
 
         category = self._dynamic_categorize(object_name)
 
-        context = self._get_object_context(object_name,category)
+        if deadline is not None and deadline.expired():
+            context = {}
+        else:
+            context = self._get_object_context(object_name,category,deadline)
 
         return {
             'success':True,
@@ -598,12 +771,12 @@ class VisionService:
         }
 
 
-    def _get_object_context(self,object_name,category):
+    def _get_object_context(self,object_name,category,deadline=None):
 
         try:
-            response = requests.get(
+            response = http_pool.get(
                 f"https://api.datamuse.com/words?rel_jja={object_name}&max=3",
-                timeout=5
+                timeout=deadline.timeout(5) if deadline else 5
             )
 
 
@@ -667,7 +840,7 @@ class VisionService:
     def _get_dynamic_uses(self,object_name):
 
         try:
-            response = requests.get(
+            response = http_pool.get(
                  f"http://numbersapi.com/random/trivia?json",
                  timeout=5
             )
@@ -692,14 +865,7 @@ class VisionService:
 
     def _get_cached(self,key):
 
-        if key in self.cache:
-            cached_time,result = self.cache[key]
-            if datetime.now() - cached_time < self.cache_timeout:
-                return result
-            else:
-                del self.cache[key]
-
-        return None
+        return self.cache.get(key)
     
-    def _set_cached(set,key,result):
-        self.cache[key] = (datetime.now(),result)
+    def _set_cached(self,key,result):
+        self.cache.set(key,result)
@@ -1,7 +1,12 @@
-from django.db.models.signals import post_save
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, UserSubscription, ScannedItem, ProductInfo
+from .services.entitlement_service import EntitlementService
+from .services.stats_service import StatsService
+from .services.search_service import SearchService
 
 
 @receiver(post_save, sender=User)
@@ -11,4 +16,88 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.userprofile.save()
\ No newline at end of file
+    # Only make sure a profile exists. Re-saving the whole profile on every
+    # user save (e.g. last_login) would overwrite concurrent quota updates.
+    if not hasattr(instance, 'userprofile'):
+        UserProfile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=UserProfile)
+def write_through_entitlement(sender, instance, **kwargs):
+    EntitlementService.store_profile(instance)
+
+
+@receiver(post_save, sender=UserSubscription)
+@receiver(post_delete, sender=UserSubscription)
+def invalidate_entitlement(sender, instance, **kwargs):
+    EntitlementService.invalidate(instance.user_id)
+
+
+_scan_signals_muted = ContextVar('scan_signals_muted', default=False)
+
+
+@contextmanager
+def scan_signals_muted():
+    # For bulk paths (archiving) that update the stats rollup and the search
+    # index once per chunk themselves instead of once per deleted row.
+    token = _scan_signals_muted.set(True)
+    try:
+        yield
+    finally:
+        _scan_signals_muted.reset(token)
+
+
+@receiver(pre_save, sender=ScannedItem)
+def remember_scan_bucket(sender, instance, **kwargs):
+    # Note the rollup bucket (day, user, scan type, status) the row was in
+    # before this save, so any change to it can be moved across.
+    instance._stats_bucket = None
+    if not instance._state.adding:
+        row = sender.objects.filter(pk=instance.pk).values_list('timestamp', 'user_id', 'scan_type', 'status').first()
+        if row is not None:
+            instance._stats_bucket = StatsService.bucket(*row)
+
+
+@receiver(post_save, sender=ScannedItem)
+def update_scan_stats(sender, instance, created, **kwargs):
+    old_bucket = getattr(instance, '_stats_bucket', None)
+    if created or old_bucket is None:
+        StatsService.record_created([instance])
+    else:
+        StatsService.record_moved(old_bucket, instance)
+
+
+@receiver(post_delete, sender=ScannedItem)
+def remove_scan_stats(sender, instance, **kwargs):
+    if _scan_signals_muted.get():
+        return
+    StatsService.record_deleted(instance)
+
+
+@receiver(post_save, sender=ScannedItem)
+def index_scan(sender, instance, **kwargs):
+    SearchService.reindex([instance.id])
+
+
+@receiver(post_delete, sender=ScannedItem)
+def unindex_scan(sender, instance, **kwargs):
+    if _scan_signals_muted.get():
+        return
+    SearchService.remove([instance.id])
+
+
+@receiver(post_save, sender=ProductInfo)
+def reindex_product_scans(sender, instance, created, **kwargs):
+    if not created:
+        SearchService.reindex(ScannedItem.objects.filter(product_info=instance).values_list('id', flat=True))
+
+
+@receiver(pre_delete, sender=ProductInfo)
+def remember_product_scans(sender, instance, **kwargs):
+    # SET_NULL clears the links before post_delete, so collect them now.
+    instance._linked_scan_ids = list(ScannedItem.objects.filter(product_info=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=ProductInfo)
+def reindex_unlinked_scans(sender, instance, **kwargs):
+    SearchService.reindex(getattr(instance, '_linked_scan_ids', []))
@@ -0,0 +1,9 @@
+from django.urls import path
+from scanning_project import urls as project_urls
+from . import views
+
+# The project urls plus the subscription views it doesn't route yet, so their
+# query budgets can be checked through the full middleware chain.
+urlpatterns = project_urls.urlpatterns + [
+    path('api/subscription/status/',views.user_subscription_status),
+]
@@ -0,0 +1,32 @@
+from django.test import Client
+from django.urls import resolve
+from .querycount import count_queries, budget_for
+
+
+class QueryBudgetMixin:
+    # For TestCase subclasses: assertQueryBudget() requests a URL with
+    # self.client (or a fresh Client) and fails if it runs more queries than
+    # the view declares with query_budget, or than an explicit budget.
+    #
+    #     class ScanListTests(QueryBudgetMixin,TestCase):
+    #         def test_list(self):
+    #             self.client.force_login(self.user)
+    #             self.assertQueryBudget('get','/api/scans/')
+
+    def assertQueryBudget(self,method,path,budget=None,**kwargs):
+        if budget is None:
+            budget = budget_for(resolve(path.split('?')[0]).func,method)
+            if budget is None:
+                self.fail(f"{path} declares no query_budget; pass budget= explicitly")
+
+        client = getattr(self,'client',None) or Client()
+        with count_queries() as counter:
+            response = getattr(client,method.lower())(path,**kwargs)
+            # Streaming bodies query as they are consumed.
+            if getattr(response,'streaming',False):
+                b''.join(response.streaming_content)
+
+        if counter.count > budget:
+            statements = '\n'.join(f"  {index}. {sql}" for index,sql in enumerate(counter.statements,1))
+            self.fail(f"{method.upper()} {path} ran {counter.count} queries, budget {budget}:\n{statements}")
+        return response
@@ -1,3 +1,889 @@
-from django.test import TestCase
+import atexit
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from PIL import Image
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.utils import timezone
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework.test import APIClient, APIRequestFactory
+from .models import LabelCategory, ScannedItem, ScanLabel, ArchivedScan, UserProfile, ProductInfo, SubscriptionPlan, Payment, UserSubscription, ScanDailyStats
+from . import tracing
+from .services import http_pool
+from .services.archive_service import ArchiveService
+from .services.export_service import ExportService
+from .serializers import ScannedItemSerializer, ScannedItemListSerializer
+from .services import categorizer, vision_service
+from .services.categorizer import LabelCategorizer
+from .services.micro_batcher import MicroBatcher
+from .services.recognition_queue import RecognitionQueue
+from .services.label_service import LabelService
+from .services.scan_service import ScanService
+from .services.search_service import SearchService
+from .services.subscription_service import SubscriptionService
+from .services.stats_service import StatsService
+from .services.vision_service import VisionService
+from .services.deadline import Deadline
+from .services import detection_cache
+from .services.detection_cache import DetectionCache, LRUCacheStore, SQLiteCacheStore
+from .services.provider_health import ProviderHealth, ProviderHealthRegistry
+from .testing import QueryBudgetMixin
+from .middleware.profiling_middleware import ProfilingMiddleware
+
+
+# Tests never touch the project's file cache under BASE_DIR/cache.
+LOCAL_CACHE = override_settings(CACHES={'default':{'BACKEND':'django.core.cache.backends.locmem.LocMemCache'}})
+
+
+class ProviderHealthTests(SimpleTestCase):
+
+    def test_demoted_provider_recovers_without_traffic(self):
+        # One timeout among a few fast answers ranks Imagga below an untried
+        # provider; after the stats decay it is back at the prior.
+        imagga = ProviderHealth('Imagga',0.2,5,30,decay_half_life=60)
+        untried = ProviderHealth('GoogleVision',0.2,5,30,decay_half_life=60)
+        for _ in range(3):
+            imagga.record(True,0.3,now=0)
+        imagga.record(False,10.0,now=0)
+
+        self.assertGreater(imagga.score(1,now=0),untried.score(2,now=0))
+        self.assertLess(imagga.score(1,now=600),untried.score(2,now=600))
+
+    def test_fresh_stats_are_not_decayed(self):
+        health = ProviderHealth('Imagga',0.2,5,30,decay_half_life=60)
+        health.record(True,0.2,now=100)
+        self.assertAlmostEqual(health.score(0,now=100),0.2)
+
+    @override_settings(VISION_CIRCUIT_BREAKER={'EXPLORE_RATE':0.1})
+    def test_exploration_moves_a_lower_ranked_provider_first(self):
+        apis = [{'name':'A','priority':1},{'name':'B','priority':2},{'name':'C','priority':3}]
+
+        rolls = iter([0.05,0.9])
+        registry = ProviderHealthRegistry(rand=lambda: next(rolls))
+        self.assertEqual([api['name'] for api in registry.rank(apis)],['C','A','B'])
+
+        registry = ProviderHealthRegistry(rand=lambda: 0.5)
+        self.assertEqual([api['name'] for api in registry.rank(apis)],['A','B','C'])
+
+    def test_deadline_cancellations_do_not_open_the_breaker(self):
+        registry = ProviderHealthRegistry()
+        service = VisionService.__new__(VisionService)
+        expired = Deadline(0)
+
+        def slow_provider(image,deadline):
+            return {'success':False}
+
+        api = {'name':'Clarifai','function':slow_provider}
+        with mock.patch.object(vision_service,'provider_health',registry),\
+                override_settings(VISION_CIRCUIT_BREAKER={'FAILURE_THRESHOLD':2}):
+            for _ in range(5):
+                service._call_provider(api,None,expired)
+
+            stats = registry.snapshot()['Clarifai']
+            self.assertEqual((stats['state'],stats['consecutive_failures'],stats['cancelled']),('closed',0,5))
+
+            service._call_provider(api,None,Deadline(30))
+            service._call_provider(api,None,Deadline(30))
+            self.assertEqual(registry.snapshot()['Clarifai']['state'],'open')
+
+
+@LOCAL_CACHE
+class LabelCategorizerTests(TestCase):
+
+    def test_unknown_label_is_looked_up_once_per_ttl(self):
+        categorizer = LabelCategorizer(enrich=False,miss_ttl=300)
+        with self.assertNumQueries(1):
+            self.assertEqual(categorizer.categorize('qwzx gadget'),'other')
+            self.assertEqual(categorizer.categorize('qwzx gadget'),'other')
+
+    def test_expired_miss_is_looked_up_again(self):
+        categorizer = LabelCategorizer(enrich=False,miss_ttl=0)
+        categorizer.categorize('qwzx gadget')
+        LabelCategory.objects.create(label='qwzx gadget',category='electronics',source='manual')
+        self.assertEqual(categorizer.categorize('qwzx gadget'),'electronics')
+
+
+@LOCAL_CACHE
+class ScanTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('scanner',password='secret')
+        self.profile = UserProfile.objects.get(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertRollupMatches(self):
+        expected = {
+            (row['day'],row['user_id'],row['scan_type'],row['status']):row['total']
+            for row in ScannedItem.objects.order_by().annotate(day=TruncDate('timestamp')).values('day','user_id','scan_type','status').annotate(total=Count('id'))
+        }
+        rollup = {
+            (row.day,row.user_id,row.scan_type,row.status):row.count
+            for row in ScanDailyStats.objects.exclude(count=0)
+        }
+        self.assertEqual(rollup,expected)
+
+    def make_scan(self,**fields):
+        fields.setdefault('scan_data','hello')
+        fields.setdefault('scan_type','text')
+        return ScannedItem.objects.create(user=fields.pop('user',self.user),**fields)
+
+
+class ScanLeaseFieldTests(ScanTestCase):
+
+    def test_patch_cannot_change_lease_state(self):
+        scan = self.make_scan(status='pending',attempts=1,locked_by='worker-1',lease_expires_at=timezone.now() + timedelta(minutes=2))
+        response = self.client.patch(f"/api/scans/{scan.id}/",{
+            'attempts':99,
+            'locked_by':'intruder',
+            'lease_expires_at':None,
+            'last_error':'boom'
+        },format='json')
+
+        self.assertEqual(response.status_code,200)
+        for field in ('attempts','locked_by','lease_expires_at','last_error'):
+            self.assertNotIn(field,response.json())
+        scan.refresh_from_db()
+        self.assertEqual((scan.attempts,scan.locked_by,scan.last_error),(1,'worker-1',''))
+        self.assertIsNotNone(scan.lease_expires_at)
+
+
+class ScanDetailAccessTests(ScanTestCase):
+
+    def test_other_users_scans_are_not_found(self):
+        scan = self.make_scan(user=User.objects.create_user('other',password='secret'),status='pending')
+
+        self.assertEqual(self.client.get(f"/api/scans/{scan.id}/").status_code,404)
+        self.assertEqual(self.client.patch(f"/api/scans/{scan.id}/",{'status':'processed'},format='json').status_code,404)
+        self.assertEqual(self.client.delete(f"/api/scans/{scan.id}/").status_code,404)
+        scan.refresh_from_db()
+        self.assertEqual(scan.status,'pending')
+
+    def test_anonymous_callers_are_refused(self):
+        scan = self.make_scan()
+        self.assertIn(APIClient().get(f"/api/scans/{scan.id}/").status_code,(401,403))
+
+    def test_owner_cannot_rewrite_status_or_owner(self):
+        scan = self.make_scan(status='pending')
+        other = User.objects.create_user('other',password='secret')
+
+        response = self.client.patch(f"/api/scans/{scan.id}/",{'status':'processed','user':other.id,'scan_data':'edited'},format='json')
+
+        self.assertEqual(response.status_code,200)
+        scan.refresh_from_db()
+        self.assertEqual((scan.status,scan.user_id,scan.scan_data),('pending',self.user.id,'edited'))
+
+
+class ScannedItemListSerializerTests(ScanTestCase):
+
+    def test_matches_model_serializer(self):
+        product = ProductInfo.objects.create(name='Mug',brand='Acme')
+        self.make_scan(scan_type='image',image='scans/mug.jpg',product_info=product,is_object_detected=True,object_labels=['mug'],metadata={'detection':{'confidence':91.5}})
+        self.make_scan(scan_type='qr',image=None,product_info=None,object_labels=[],metadata={})
+        self.make_scan(status='failed',last_error='timeout',attempts=3)
+        scans = ScannedItem.objects.order_by('-timestamp','-id')
+        request = APIRequestFactory().get('/api/scans/')
+
+        for context in ({},{'request':request}):
+            expected = [dict(item) for item in ScannedItemSerializer(scans,many=True,context=context).data]
+            fast = ScannedItemListSerializer(scans.values(*ScannedItemListSerializer.COLUMNS),many=True,context=context).data
+            self.assertEqual(fast,expected)
+
+        self.assertNotIn('locked_by',fast[0])
+
+
+class RecognitionBatchingTests(ScanTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media_root = media.name
+        os.makedirs(os.path.join(self.media_root,'scans'))
+
+    def make_image_scan(self,index):
+        name = f"scans/batch-{index}.jpg"
+        Image.new('RGB',(32,32),(index * 40 % 256,index * 90 % 256,200)).save(os.path.join(self.media_root,name))
+        return self.make_scan(scan_type='image',image=name,status='pending')
+
+    def test_claimed_batch_shares_provider_calls(self):
+        calls = []
+        lock = threading.Lock()
+
+        def annotate(images,timeout=10):
+            with lock:
+                calls.append(len(images))
+            return [{'labelAnnotations':[{'description':'bottle','score':0.9}]} for _ in images]
+
+        with override_settings(
+            MEDIA_ROOT=self.media_root,
+            IMAGGA_API_KEY='',
+            GOOGLE_VISION_API_KEY='test',
+            CLARIFAI_API_KEY='',
+            GEMINI_API_KEY='',
+            OPENA1_API_KEY='',
+            VISION_DETECTION_MODE='sequential',
+            VISION_BATCHING={'ENABLED':True,'MAX_BATCH_SIZE':16,'MAX_WAIT':0.5}
+        ),mock.patch.object(VisionService,'_annotate_with_google_vision',staticmethod(annotate)),\
+                mock.patch.dict(vision_service._batchers,clear=True),\
+                mock.patch.object(categorizer,'_label_categorizer',LabelCategorizer(enrich=False)):
+            scans = [self.make_image_scan(index) for index in range(4)]
+            queue = RecognitionQueue('worker-test',batch_size=4)
+            items = queue.claim()
+            self.assertEqual(len(items),4)
+
+            self.assertEqual(queue.process_batch(items),[True] * 4)
+
+        self.assertEqual(sum(calls),4)
+        self.assertLess(len(calls),4)
+        self.assertEqual(ScannedItem.objects.filter(id__in=[scan.id for scan in scans],status='processed').count(),4)
+
+
+class MicroBatcherTests(SimpleTestCase):
+
+    def test_batch_timeout_is_the_tightest_caller_budget(self):
+        sent = []
+
+        def send_batch(items,timeout):
+            sent.append((list(items),timeout))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher('test',send_batch,max_batch_size=2,max_wait=1)
+        futures = [batcher.submit(1,5.0),batcher.submit(2,0.5)]
+
+        self.assertEqual([future.result(timeout=2) for future in futures],[2,4])
+        self.assertEqual(sent[0][0],[1,2])
+        self.assertTrue(0 < sent[0][1] <= 0.5)
+
+    def test_spent_budget_fails_without_a_call(self):
+        sent = []
+        batcher = MicroBatcher('test',lambda items,timeout: sent.append(items) or items,max_batch_size=2,max_wait=0.05)
+
+        with self.assertRaises(TimeoutError):
+            batcher.submit(1,0.0).result(timeout=2)
+        self.assertEqual(sent,[])
+
+
+class ScanQuotaTests(ScanTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.profile.free_scans_used = self.profile.max_free_scans
+        self.profile.save()
+        # Basic auth rather than a session, as API clients send it.
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'scanner:secret').decode())
+
+    def test_out_of_quota_post_gets_402(self):
+        response = self.client.post('/api/scans/',{'scan_data':'hello','scan_type':'text'},format='json')
+
+        self.assertEqual(response.status_code,402)
+        self.assertEqual(response.json()['remaining_scans'],0)
+        self.assertFalse(ScannedItem.objects.exists())
+
+    def test_upgrade_is_seen_immediately(self):
+        self.assertEqual(self.client.post('/api/scans/',{'scan_data':'a'},format='json').status_code,402)
+
+        self.profile.is_premium = True
+        self.profile.premium_expiry = timezone.now() + timedelta(days=30)
+        self.profile.save()
+
+        self.assertEqual(self.client.post('/api/scans/',{'scan_data':'b'},format='json').status_code,201)
+
+    def test_expiry_invalidates_cached_entitlement(self):
+        plan = SubscriptionPlan.objects.create(name='Monthly',plan_type='monthly',price=99)
+        payment = Payment.objects.create(user=self.user,subscription_plan=plan,razorpay_order_id='order_1',amount=99,status='success')
+        UserSubscription.objects.create(user=self.user,subscription_plan=plan,Payment=payment,end_date=timezone.now() - timedelta(minutes=1),is_active=True)
+        UserProfile.objects.filter(user=self.user).update(is_premium=True,premium_expiry=timezone.now() + timedelta(days=1))
+        cache.clear()
+        self.assertEqual(self.client.post('/api/scans/',{'scan_data':'a'},format='json').status_code,201)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(SubscriptionService.expire_subscriptions(),1)
+
+        self.assertEqual(self.client.post('/api/scans/',{'scan_data':'b'},format='json').status_code,402)
+
+
+class ConsumeScanTests(ScanTestCase):
+
+    def quota(self):
+        return UserProfile.objects.filter(user=self.user).values_list('free_scans_used','scan_count').get()
+
+    def test_at_limit_updates_nothing(self):
+        UserProfile.objects.filter(user=self.user).update(free_scans_used=self.profile.max_free_scans,scan_count=7)
+
+        self.assertFalse(ScanService.consume_scan(self.user))
+        self.assertEqual(self.quota(),(self.profile.max_free_scans,7))
+
+    def test_last_free_scan_is_spent(self):
+        UserProfile.objects.filter(user=self.user).update(free_scans_used=self.profile.max_free_scans - 1,scan_count=7)
+
+        self.assertTrue(ScanService.consume_scan(self.user))
+        self.assertEqual(self.quota(),(self.profile.max_free_scans,8))
+        self.assertFalse(ScanService.consume_scan(self.user))
+
+    def test_premium_counts_scans_without_spending_free_ones(self):
+        UserProfile.objects.filter(user=self.user).update(
+            free_scans_used=self.profile.max_free_scans,
+            scan_count=7,
+            is_premium=True,
+            premium_expiry=timezone.now() + timedelta(days=1)
+        )
+
+        self.assertTrue(ScanService.consume_scan(self.user,3))
+        self.assertEqual(self.quota(),(self.profile.max_free_scans,10))
+
+
+class ScanStatsRollupTests(ScanTestCase):
+
+    def test_create(self):
+        self.assertEqual(self.client.post('/api/scans/',{'scan_data':'a','scan_type':'text'},format='json').status_code,201)
+        self.make_scan(scan_type='qr')
+        self.assertRollupMatches()
+
+    def test_status_change(self):
+        scan = self.make_scan(status='pending')
+        scan.status = 'processed'
+        scan.save()
+        self.assertRollupMatches()
+
+    def test_type_change(self):
+        scans = [self.make_scan() for _ in range(4)]
+        response = self.client.patch(f"/api/scans/{scans[0].id}/",{'scan_type':'qr'},format='json')
+        self.assertEqual(response.status_code,200)
+        self.assertRollupMatches()
+
+    def test_timestamp_and_user_change(self):
+        other = User.objects.create_user('other')
+        scan = self.make_scan()
+        scan.timestamp = scan.timestamp - timedelta(days=3)
+        scan.user = other
+        scan.save()
+        self.assertRollupMatches()
+
+    def test_delete(self):
+        scans = [self.make_scan() for _ in range(2)]
+        self.assertEqual(self.client.delete(f"/api/scans/{scans[0].id}/").status_code,204)
+        self.assertRollupMatches()
+
+    def test_bulk_create(self):
+        response = self.client.post('/api/scans/bulk/',[
+            {'scan_data':'blue widget','scan_type':'text'},
+            {'scan_data':'red widget','scan_type':'barcode','status':'processed'}
+        ],format='json')
+
+        self.assertEqual(response.status_code,201)
+        self.assertEqual(response.json()['remaining_scans'],self.profile.max_free_scans - 2)
+        # status is read-only; every new scan starts pending.
+        self.assertEqual(list(ScannedItem.objects.filter(user=self.user).values_list('status',flat=True)),['pending','pending'])
+        self.assertRollupMatches()
+        if SearchService.enabled():
+            rows,_ = SearchService.search(self.user,'widget',('id','scan_data'))
+            self.assertEqual(sorted(row['scan_data'] for row in rows),['blue widget','red widget'])
+
+
+    def test_bulk_create_refuses_a_batch_over_quota(self):
+        UserProfile.objects.filter(user=self.user).update(free_scans_used=self.profile.max_free_scans - 1)
+        cache.clear()
+
+        response = self.client.post('/api/scans/bulk/',[{'scan_data':'a','scan_type':'text'},{'scan_data':'b','scan_type':'text'}],format='json')
+
+        self.assertEqual(response.status_code,402)
+        self.assertEqual(response.json()['remaining_scans'],1)
+        self.assertFalse(ScannedItem.objects.exists())
+        self.assertEqual(UserProfile.objects.get(user=self.user).free_scans_used,self.profile.max_free_scans - 1)
+
+    def test_bulk_create_requires_quota(self):
+        UserProfile.objects.filter(user=self.user).update(free_scans_used=self.profile.max_free_scans)
+        cache.clear()
+
+        response = self.client.post('/api/scans/bulk/',[{'scan_data':'a','scan_type':'text'}],format='json')
+
+        self.assertEqual(response.status_code,402)
+        self.assertFalse(ScannedItem.objects.exists())
+
+
+class ExportFormatTests(ScanTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.profile.is_premium = True
+        self.profile.premium_expiry = timezone.now() + timedelta(days=30)
+        self.profile.save()
+        self.make_scan(scan_data='a,"b"',object_labels=['mug','cup'],metadata={'source':'camera','tags':[1,2]},is_object_detected=True)
+        self.make_scan(scan_data='plain')
+        # Microseconds that millisecond formatting would drop.
+        ScannedItem.objects.update(timestamp=datetime(2026,3,1,12,30,45,123456,tzinfo=dt_timezone.utc))
+
+    def export(self,file_format,**params):
+        response = self.client.get('/api/scans/export/',{'file_format':file_format,**params})
+        self.assertEqual(response.status_code,200)
+        return b''.join(response.streaming_content)
+
+    def decode_csv(self,body):
+        rows = []
+        for row in csv.DictReader(io.StringIO(body.decode('utf-8'))):
+            row['id'] = int(row['id'])
+            row['is_object_detected'] = row['is_object_detected'] == 'True'
+            row['object_labels'] = json.loads(row['object_labels'])
+            row['metadata'] = json.loads(row['metadata'])
+            rows.append(row)
+        return rows
+
+    def test_formats_export_the_same_values(self):
+        import pyarrow.parquet as parquet
+
+        csv_rows = self.decode_csv(self.export('csv'))
+        gzip_rows = self.decode_csv(gzip.decompress(self.export('csv',compress='gzip')))
+        ndjson_rows = [json.loads(line) for line in self.export('ndjson').decode('utf-8').splitlines()]
+        parquet_rows = parquet.read_table(io.BytesIO(self.export('parquet'))).to_pylist()
+        for row in parquet_rows:
+            row['timestamp'] = ExportService.format_timestamp(row['timestamp'])
+            row['metadata'] = json.loads(row['metadata'])
+
+        self.assertEqual(len(csv_rows),2)
+        self.assertEqual(csv_rows[0]['timestamp'],'2026-03-01T12:30:45.123456Z')
+        self.assertEqual(gzip_rows,csv_rows)
+        self.assertEqual(ndjson_rows,csv_rows)
+        self.assertEqual(parquet_rows,csv_rows)
+
+
+class ArchiveTests(ScanTestCase):
+
+    def test_archive_moves_old_scans_and_their_labels(self):
+        old = timezone.now() - timedelta(days=400)
+        scans = [self.make_scan(status=status) for status in ('processed','processed','failed','pending')]
+        recent = self.make_scan(status='processed')
+        ScannedItem.objects.filter(id__in=[scan.id for scan in scans]).update(timestamp=old)
+        for scan in scans + [recent]:
+            ScanLabel.objects.create(scan=scan,user=self.user,label='mug',scanned_at=old)
+        StatsService.rebuild()
+
+        self.assertEqual(ArchiveService.archive(days=180,chunk_size=2),3)
+
+        self.assertEqual(set(ScannedItem.objects.values_list('id',flat=True)),{scans[3].id,recent.id})
+        self.assertEqual(set(ScanLabel.objects.values_list('scan_id',flat=True)),{scans[3].id,recent.id})
+        self.assertEqual(set(ArchivedScan.objects.values_list('id',flat=True)),{scan.id for scan in scans[:3]})
+        self.assertEqual(
+            {(row.status,row.count) for row in ScanDailyStats.objects.filter(day=timezone.localdate(old)).exclude(count=0)},
+            {('archived',3),('pending',1)}
+        )
+        self.assertEqual(ScanDailyStats.objects.get(day=timezone.localdate(recent.timestamp),status='processed').count,1)
+
+
+@LOCAL_CACHE
+class MetricsEndpointTests(TestCase):
+
+    def test_unlisted_address_is_refused(self):
+        self.assertEqual(self.client.get('/metrics',REMOTE_ADDR='203.0.113.9').status_code,403)
+        self.assertEqual(self.client.get('/metrics').status_code,200)
+
+    @override_settings(METRICS={'ALLOWED_IPS':['10.0.0.0/8'],'TOKEN':'scrape-token'})
+    def test_token_or_network(self):
+        self.assertEqual(self.client.get('/metrics').status_code,403)
+        self.assertEqual(self.client.get('/metrics',HTTP_AUTHORIZATION='Bearer wrong').status_code,403)
+        self.assertEqual(self.client.get('/metrics',HTTP_AUTHORIZATION='Bearer scrape-token').status_code,200)
+        self.assertEqual(self.client.get('/metrics',REMOTE_ADDR='10.4.5.6').status_code,200)
+
+    def test_unknown_methods_share_one_label(self):
+        self.client.generic('BREW','/api/scans/')
+        body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('method="other"',body)
+        self.assertNotIn('BREW',body)
+
+    def test_multiprocess_directory_is_aggregated(self):
+        from prometheus_client import Counter as PrometheusCounter, values
+
+        self.addCleanup(setattr,values,'ValueClass',values.ValueClass)
+        # Two "workers" write their samples to the directory the way gunicorn
+        # processes would; /metrics must report their sum.
+        with tempfile.TemporaryDirectory() as directory,mock.patch.dict(os.environ,{'PROMETHEUS_MULTIPROC_DIR':directory}):
+            for pid in (101,102):
+                values.ValueClass = values.MultiProcessValue(lambda pid=pid: pid)
+                PrometheusCounter('scanning_test_worker_calls','Calls per test worker',registry=None).inc()
+            body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('scanning_test_worker_calls_total 2.0',body)
+
+
+@override_settings(TRACING={'ENABLED':True,'SAMPLE_RATE':1.0,'EXPORTER':'scanning_app.tracing.NullExporter','OPTIONS':{},'PROPAGATE_HOSTS':['.internal.example','billing']})
+class TraceparentPropagationTests(SimpleTestCase):
+
+    def setUp(self):
+        tracing.set_exporter(tracing.NullExporter())
+        self.addCleanup(tracing.set_exporter,None)
+
+    def sent_headers(self,url):
+        session = mock.Mock()
+        with mock.patch.object(http_pool,'get_session',return_value=session),tracing.span('test'):
+            http_pool.get(url,headers={'Accept':'application/json'})
+        return session.request.call_args.kwargs['headers']
+
+    def test_only_listed_hosts_get_traceparent(self):
+        self.assertIn('traceparent',self.sent_headers('https://api.internal.example/v1/items'))
+        self.assertIn('traceparent',self.sent_headers('http://billing:8000/charge'))
+        self.assertNotIn('traceparent',self.sent_headers('https://api.imagga.com/v2/tags'))
+        self.assertNotIn('traceparent',self.sent_headers('https://evilinternal.example/'))
+
+
+class ProfilingMiddlewareTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def middleware(self,**config):
+        with override_settings(PROFILING=dict({'ENABLED':True,'TOKEN':'profile-token','DIRECTORY':self.directory},**config)):
+            middleware = ProfilingMiddleware(lambda request: HttpResponse('ok'))
+        self.addCleanup(atexit.unregister,middleware.flush)
+        return middleware
+
+    def test_only_requested_profiles_name_their_file(self):
+        middleware = self.middleware(SAMPLE_RATE=1.0)
+
+        sampled = middleware(RequestFactory().get('/api/scans/'))
+        requested = middleware(RequestFactory().get('/api/scans/',HTTP_X_PROFILE='profile-token'))
+
+        self.assertNotIn('X-Profile-File',sampled)
+        self.assertTrue(os.path.exists(os.path.join(self.directory,requested['X-Profile-File'])))
+
+    def test_same_second_profiles_get_distinct_files(self):
+        middleware = self.middleware()
+        request = RequestFactory().get('/api/scans/',HTTP_X_PROFILE='profile-token')
+
+        names = {middleware(request)['X-Profile-File'] for _ in range(3)}
+
+        self.assertEqual(len(names),3)
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.collapsed')]),3)
+
+    def test_totals_are_flushed_periodically(self):
+        middleware = self.middleware(FLUSH_INTERVAL=3600)
+        aggregate = os.path.join(self.directory,f"collapsed-{os.getpid()}.txt")
+        request = RequestFactory().get('/api/scans/',HTTP_X_PROFILE='profile-token')
+
+        middleware(request)
+        self.assertFalse(os.path.exists(aggregate))
+
+        middleware.flushed_at -= 3600
+        middleware(request)
+        self.assertTrue(os.path.exists(aggregate))
+
+    def test_overlapping_cprofile_request_is_sampled(self):
+        middleware = self.middleware(MODE='cprofile')
+        request = RequestFactory().get('/api/scans/',HTTP_X_PROFILE='profile-token')
+
+        self.assertTrue(middleware(request)['X-Profile-File'].endswith('.prof'))
+        with middleware.cprofile_lock:
+            self.assertTrue(middleware(request)['X-Profile-File'].endswith('.collapsed'))
+
+
+class QueryBudgetTests(QueryBudgetMixin,ScanTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # A session login, as the budgets include authentication.
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        for index in range(3):
+            scan = self.make_scan(scan_data=f"mug {index}",status='processed',object_labels=['mug'])
+            ScanLabel.objects.create(scan=scan,user=self.user,label='mug',scanned_at=scan.timestamp)
+
+    def test_scan_list(self):
+        self.assertQueryBudget('get','/api/scans/')
+
+    def test_text_scan_create(self):
+        response = self.assertQueryBudget('post','/api/scans/',data={'scan_data':'hello','scan_type':'text'},format='json')
+        self.assertEqual(response.status_code,201)
+
+    def test_image_scan_create(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+        buffer = io.BytesIO()
+        Image.new('RGB',(8,8)).save(buffer,'JPEG')
+        buffer.seek(0)
+        buffer.name = 'scan.jpg'
+        response = self.assertQueryBudget('post','/api/scans/',data={'scan_data':'photo','scan_type':'image','image':buffer},format='multipart')
+        self.assertEqual(response.status_code,202)
+
+    def test_recent_scans(self):
+        self.assertQueryBudget('get','/api/scans/stats')
+
+    def test_scan_stats(self):
+        self.assertQueryBudget('get','/api/scans/stats/')
+
+    def test_search_scans(self):
+        self.assertQueryBudget('get','/api/scans/search/?q=mug')
+
+    def test_top_labels(self):
+        self.assertQueryBudget('get','/api/scans/labels/top/')
+
+    @override_settings(ROOT_URLCONF='scanning_app.test_urls')
+    def test_user_subscription_status(self):
+        # Not routed by the project; test_urls adds it.
+        self.assertQueryBudget('get','/api/subscription/status/')
+
+
+class DetectionCacheChecks:
+    # Shared by the per-backend classes below; each payload is 12 bytes of JSON.
+    VALUE = 'x' * 10
+
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.patch.object(detection_cache,'time')
+        clock.start().time.side_effect = lambda: self.now
+        self.addCleanup(clock.stop)
+
+    def fill(self,cache,*keys):
+        for key in keys:
+            self.now += 1
+            cache.set(key,self.VALUE)
+
+    def surviving(self,cache,*keys):
+        return [key for key in keys if cache.store.get(key) is not None]
+
+    def test_max_entries_evicts_least_recently_used(self):
+        cache = DetectionCache(self.make_store(max_entries=3,max_bytes=1024),ttl=3600)
+        self.fill(cache,'a','b','c')
+        self.now += 1
+        self.assertEqual(cache.get('a'),self.VALUE)
+        self.fill(cache,'d')
+
+        self.assertEqual(self.surviving(cache,'a','b','c','d'),['a','c','d'])
+        self.assertEqual(cache.stats()['evictions'],1)
+        self.assertEqual(cache.stats()['entries'],3)
+
+    def test_max_bytes_evicts_oldest(self):
+        cache = DetectionCache(self.make_store(max_entries=100,max_bytes=30),ttl=3600)
+        self.fill(cache,'a','b','c')
+
+        self.assertEqual(self.surviving(cache,'a','b','c'),['b','c'])
+        self.assertEqual(cache.stats()['bytes'],24)
+
+    def test_oversized_value_is_not_stored(self):
+        cache = DetectionCache(self.make_store(max_entries=100,max_bytes=8),ttl=3600)
+        self.fill(cache,'a')
+        self.assertEqual(cache.stats()['entries'],0)
+
+    def test_ttl_expiry_and_hit_miss_counts(self):
+        cache = DetectionCache(self.make_store(max_entries=100,max_bytes=1024),ttl=60)
+        self.fill(cache,'a')
+        self.assertEqual(cache.get('a'),self.VALUE)
+        self.now += 61
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'],stats['misses'],stats['entries']),(1,2,0))
+
+
+class LRUDetectionCacheTests(DetectionCacheChecks,SimpleTestCase):
+
+    def make_store(self,max_entries,max_bytes):
+        return LRUCacheStore(max_entries,max_bytes)
+
+
+class SQLiteDetectionCacheTests(DetectionCacheChecks,SimpleTestCase):
+
+    def make_store(self,max_entries,max_bytes):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SQLiteCacheStore(os.path.join(directory.name,'vision_cache.sqlite3'),max_entries,max_bytes)
+
+
+class VisionServiceTests(SimpleTestCase):
+
+    def setUp(self):
+        health = mock.patch.object(vision_service,'provider_health',ProviderHealthRegistry(rand=lambda: 1.0))
+        health.start()
+        self.addCleanup(health.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.image_path = os.path.join(directory.name,'scan.jpg')
+        Image.frombytes('RGB',(16,16),os.urandom(16 * 16 * 3)).save(self.image_path,'JPEG')
+        self.service = VisionService()
+        # Nothing fits, so only in-flight deduplication can save a provider call.
+        self.service.cache = DetectionCache(LRUCacheStore(max_entries=10,max_bytes=0),ttl=60)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def provider(self,name,priority,function):
+        return {'name':name,'function':function,'priority':priority,'enabled':True}
+
+    def result(self,name):
+        return {'success':True,'objects':[{'name':'mug','confidence':0.9}],'source':name,'api_used':name,'confidence':0.9}
+
+    def test_fallback_is_last_and_untracked(self):
+        self.assertNotIn('Fallback',[api['name'] for api in VisionService().apis])
+        self.service.apis = [self.provider('Broken',1,lambda image,deadline: {'success':False})]
+
+        result = self.service.detect_objects(self.image_path,deadline=Deadline(5))
+
+        self.assertEqual(result['api_used'],'Fallback')
+        self.assertEqual(list(vision_service.provider_health.snapshot()),['Broken'])
+
+    def test_hedge_beats_a_slow_primary(self):
+        calls = []
+
+        def slow(image,deadline):
+            calls.append('Slow')
+            self.release.wait(5)
+            return self.result('Slow')
+
+        def fast(image,deadline):
+            calls.append('Fast')
+            return self.result('Fast')
+
+        self.service.apis = [self.provider('Slow',1,slow),self.provider('Fast',2,fast)]
+        self.service.detection_mode = 'hedged'
+        self.service.hedge_delay = 0.05
+
+        started = time.monotonic()
+        result = self.service.detect_objects(self.image_path,deadline=Deadline(5))
+
+        self.assertEqual(result['api_used'],'Fast')
+        self.assertEqual(calls,['Slow','Fast'])
+        self.assertLess(time.monotonic() - started,2)
+
+    def test_identical_images_share_one_provider_call(self):
+        calls = []
+        entered = threading.Event()
+
+        def detect(image,deadline):
+            calls.append(image.sha256)
+            entered.set()
+            self.release.wait(5)
+            return self.result('Stub')
+
+        self.service.apis = [self.provider('Stub',1,detect)]
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.service.detect_objects(self.image_path,deadline=Deadline(5)))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        self.assertTrue(entered.wait(5))
+        # Give the other callers time to join the in-flight call.
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls),1)
+        self.assertEqual([result['api_used'] for result in results],['Stub'] * 5)
+
+
+class ScanCursorPaginationTests(ScanTestCase):
+
+    def test_pages_are_stable_when_timestamps_tie(self):
+        scans = [self.make_scan(scan_data=f"scan {index}") for index in range(7)]
+        other = User.objects.create_user('other',password='secret')
+        self.make_scan(user=other)
+        ScannedItem.objects.update(timestamp=timezone.now())
+
+        pages = []
+        url = '/api/scans/?page_size=3'
+        while url:
+            body = self.client.get(url).json()
+            pages.append([row['id'] for row in body['results']])
+            url = body['next']
+
+        expected = sorted((scan.id for scan in scans),reverse=True)
+        self.assertEqual(pages,[expected[0:3],expected[3:6],expected[6:7]])
+
+        third = self.client.get('/api/scans/?page_size=3').json()
+        third = self.client.get(self.client.get(third['next']).json()['next']).json()
+        self.assertEqual([row['id'] for row in self.client.get(third['previous']).json()['results']],expected[3:6])
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.client.get('/api/scans/?cursor=bm9wZQ==').status_code,404)
+
+
+class ScanSearchTests(ScanTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.mug = self.make_scan(scan_data='blue ceramic mug')
+        self.bike = self.make_scan(scan_data='photo 12',object_labels=['bicycle','wheel'])
+        self.kettle = self.make_scan(scan_data='item 7',product_info=ProductInfo.objects.create(name='Kettle',brand='Acme'))
+        self.make_scan(user=User.objects.create_user('other',password='secret'),scan_data='blue mug')
+
+    def search(self,query,**params):
+        response = self.client.get('/api/scans/search/',{'q':query,**params})
+        self.assertEqual(response.status_code,200)
+        return response.json()
+
+    def ids(self,query):
+        return [row['id'] for row in self.search(query)['results']]
+
+    def test_matches_text_labels_and_product_for_the_owner_only(self):
+        self.assertEqual(self.ids('mug'),[self.mug.id])
+        self.assertEqual(self.ids('ceram'),[self.mug.id])
+        self.assertEqual(self.ids('bicycle'),[self.bike.id])
+        self.assertEqual(self.ids('acme kettle'),[self.kettle.id])
+        self.assertEqual(self.ids('mug bicycle'),[])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.assertEqual(self.client.patch(f"/api/scans/{self.mug.id}/",{'scan_data':'green teapot'},format='json').status_code,200)
+        self.assertEqual(self.ids('mug'),[])
+        self.assertEqual(self.ids('teapot'),[self.mug.id])
+
+        self.assertEqual(self.client.delete(f"/api/scans/{self.mug.id}/").status_code,204)
+        self.assertEqual(self.ids('teapot'),[])
+
+    def test_pages_and_validation(self):
+        self.make_scan(scan_data='spare blue mug')
+        first = self.search('mug',page_size=1)
+        second = self.search('mug',page_size=1,page=2)
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(len({first['results'][0]['id'],second['results'][0]['id']}),2)
+        self.assertEqual(self.client.get('/api/scans/search/').status_code,400)
+        self.assertEqual(self.client.get('/api/scans/search/',{'q':'mug','page':'x'}).status_code,400)
+
+
+class ScanLabelApiTests(ScanTestCase):
+
+    def labelled(self,*names,**fields):
+        scan = self.make_scan(object_labels=list(names),**fields)
+        LabelService.record(scan,[{'name':name,'confidence':0.9} for name in names])
+        return scan
+
+    def test_label_filter(self):
+        mugs = [self.labelled('Mug','Table'),self.labelled('mug ')]
+        self.labelled('Table')
+        self.labelled('Mug',user=User.objects.create_user('other',password='secret'))
+
+        response = self.client.get('/api/scans/',{'label':'MUG'})
+
+        self.assertEqual(response.status_code,200)
+        self.assertEqual([row['id'] for row in response.json()['results']],sorted((scan.id for scan in mugs),reverse=True))
+
+    def test_top_labels(self):
+        for names in (('mug','table'),('mug',),('mug','lamp'),('table',)):
+            self.labelled(*names)
+        old = self.labelled('sofa','sofa-bed')
+        ScanLabel.objects.filter(scan=old).update(scanned_at=timezone.now() - timedelta(days=30))
+
+        response = self.client.get('/api/scans/labels/top/',{'days':7,'limit':2})
+
+        self.assertEqual(response.status_code,200)
+        self.assertEqual(response.json()['labels'],[{'label':'mug','count':3},{'label':'table','count':2}])
+        self.assertEqual(len(self.client.get('/api/scans/labels/top/',{'days':60}).json()['labels']),5)
+        self.assertEqual(self.client.get('/api/scans/labels/top/',{'days':'x'}).status_code,400)
 
-# Create your tests here.
@@ -0,0 +1,261 @@
+import contextvars
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Spans follow one scan through the view, services, provider calls and
+# outbound HTTP. The current span lives in a ContextVar, so nesting works
+# across function calls; code that hands work to another thread wraps the
+# callable with bind() to carry it along. Across processes (the recognition
+# workers) the W3C traceparent string is the carrier.
+#
+# TRACING = {
+#     'ENABLED': False,
+#     'SAMPLE_RATE': 1.0,
+#     'EXPORTER': 'scanning_app.tracing.JSONLExporter',
+#     'OPTIONS': {'path': 'traces.jsonl'},
+#     'PROPAGATE_HOSTS': [],
+# }
+#
+# Outbound requests only carry traceparent to PROPAGATE_HOSTS (exact host
+# names, or '.example.com' for a domain and its subdomains), so trace ids
+# aren't handed to third-party APIs.
+
+TRACEPARENT_PATTERN = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_current_span = contextvars.ContextVar('current_span',default=None)
+
+
+class Span:
+
+    def __init__(self,name,trace_id,parent_id=None,attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.status = 'ok'
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set_attribute(self,key,value):
+        self.attributes[key] = value
+
+    def set_attributes(self,**attributes):
+        self.attributes.update(attributes)
+
+    def record_error(self,error):
+        self.status = 'error'
+        self.attributes['error.type'] = type(error).__name__
+        self.attributes['error.message'] = str(error)[:500]
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {
+            'trace_id':self.trace_id,
+            'span_id':self.span_id,
+            'parent_id':self.parent_id,
+            'name':self.name,
+            'start':self.start_time,
+            'duration_ms':round(self.duration * 1000,3) if self.duration is not None else None,
+            'status':self.status,
+            'attributes':self.attributes,
+            'pid':os.getpid(),
+            'thread':threading.current_thread().name
+        }
+
+
+class _NoopSpan:
+    # Stands in when tracing is off or the trace wasn't sampled, so callers
+    # never have to check.
+
+    def set_attribute(self,key,value):
+        pass
+
+    def set_attributes(self,**attributes):
+        pass
+
+    def record_error(self,error):
+        pass
+
+    def traceparent(self):
+        return None
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class JSONLExporter:
+    # Appends one JSON object per finished span. Lines are small and the file
+    # is opened in append mode, so several workers can share one file.
+
+    def __init__(self,path='traces.jsonl'):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self,span):
+        line = json.dumps(span.to_dict(),cls=DjangoJSONEncoder,default=str) + '\n'
+        with self.lock:
+            with open(self.path,'a',encoding='utf-8') as handle:
+                handle.write(line)
+
+
+class LoggingExporter:
+
+    def export(self,span):
+        logger.info(f"span {span.name} {span.duration * 1000:.1f}ms trace={span.trace_id} {span.attributes}")
+
+
+class NullExporter:
+
+    def export(self,span):
+        pass
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def _config():
+    config = {'ENABLED':False,'SAMPLE_RATE':1.0,'EXPORTER':'scanning_app.tracing.JSONLExporter','OPTIONS':{},'PROPAGATE_HOSTS':[]}
+    config.update(getattr(settings,'TRACING',{}))
+    return config
+
+
+def enabled():
+    return _config()['ENABLED']
+
+
+def get_exporter():
+    global _exporter
+    if _exporter is None:
+        with _exporter_lock:
+            if _exporter is None:
+                config = _config()
+                _exporter = import_string(config['EXPORTER'])(**config['OPTIONS'])
+    return _exporter
+
+
+def set_exporter(exporter):
+    global _exporter
+    with _exporter_lock:
+        _exporter = exporter
+
+
+def parse_traceparent(value):
+    match = TRACEPARENT_PATTERN.match(value or '')
+    if match is None:
+        return None
+    return match.group(1),match.group(2),match.group(3) != '00'
+
+
+def propagates_to(host):
+    host = (host or '').lower()
+    for allowed in _config()['PROPAGATE_HOSTS']:
+        allowed = allowed.lower()
+        if host == allowed.lstrip('.') or (allowed.startswith('.') and host.endswith(allowed)):
+            return True
+    return False
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+def current_traceparent():
+    return current_span().traceparent()
+
+
+@contextmanager
+def span(name,traceparent=None,**attributes):
+    # traceparent continues a trace started elsewhere (e.g. the request that
+    # queued a scan); otherwise the current span, if any, is the parent.
+    if not enabled():
+        yield NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    if parent is NOOP_SPAN:
+        yield NOOP_SPAN
+        return
+
+    if traceparent:
+        remote = parse_traceparent(traceparent)
+        parent = None
+    else:
+        remote = None
+
+    if parent is not None:
+        current = Span(name,parent.trace_id,parent.span_id,attributes)
+    elif remote is not None:
+        trace_id,parent_id,sampled = remote
+        if not sampled:
+            yield NOOP_SPAN
+            return
+        current = Span(name,trace_id,parent_id,attributes)
+    else:
+        # A new trace: the sampling decision is made once, here.
+        if random.random() >= _config()['SAMPLE_RATE']:
+            token = _current_span.set(NOOP_SPAN)
+            try:
+                yield NOOP_SPAN
+            finally:
+                _current_span.reset(token)
+            return
+        current = Span(name,secrets.token_hex(16),None,attributes)
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+        try:
+            get_exporter().export(current)
+        except Exception as e:
+            logger.warning(f"Span export failed: {e}")
+
+
+def traced(name=None,**attributes):
+    # Decorator form of span(); the default name is the function's qualname.
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args,**kwargs):
+            with span(span_name,**attributes):
+                return fn(*args,**kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn):
+    # Runs fn in a copy of the caller's context, so a span opened in an
+    # executor thread gets the submitting span as its parent.
+    context = contextvars.copy_context()
+
+    @wraps(fn)
+    def wrapper(*args,**kwargs):
+        return context.run(fn,*args,**kwargs)
+    return wrapper
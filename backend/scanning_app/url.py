@@ -1,5 +1,5 @@
-from django.url import path, include
-from rest_framework import DefaultRouter
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
 from . import views
 
 router = DefaultRouter()
@@ -9,5 +9,10 @@ urlpatterns = [
     path('<int:pk>/',views.ScannedItemDetailView.as_view(),name='scan-detail'),
     path('bulk/',views.bulk_scan_create,name='bulk-scan'),
     path('stats/',views.scan_stats,name='scan-stats'),
+    path('stats/global/',views.global_scan_stats,name='global-scan-stats'),
     path('stats',views.recent_scans,name='recent-scans'),
+    path('labels/top/',views.top_labels,name='top-labels'),
+    path('search/',views.search_scans,name='scan-search'),
+    path('export/',views.export_scans,name='scan-export'),
+    path('health/providers/',views.provider_health_status,name='provider-health'),
 ]
\ No newline at end of file
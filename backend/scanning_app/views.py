@@ -1,29 +1,57 @@
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth.models import User
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from .models import ScannedItem, SubscriptionPlan, Payment, UserSubscription
-from .serializers import ScannedItemSerializer, SubscriptionPlanSerializer, PaymentSerializer
+from .serializers import ScannedItemSerializer, ScannedItemListSerializer, ScannedCreateSerializer, SubscriptionPlanSerializer, PaymentSerializer
+from .pagination import ScanCursorPagination, RecentScansPagination
+from .permissions import HasScanQuota
 from .services.scan_service import ScanService
+from .services.stats_service import StatsService
 from .services.payment_service import PaymentService
 from .services.subscription_service import SubscriptionService
+from .services.provider_health import provider_health
+from .services.detection_cache import get_detection_cache
+from .services.entitlement_service import EntitlementService
+from .services.export_service import ExportService
+from .services.search_service import SearchService
+from .services.label_service import LabelService
+from .services.archive_service import ArchiveService
+from . import tracing
+from .querycount import query_budget
 import json
 class ScannedItemDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = ScannedItem.objects.all()
+    # Owners only; other users' scans are a 404 rather than a 403.
     serializer_class = ScannedItemSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ScannedItem.objects.filter(user = self.request.user)
 
 @api_view(['POST'])
+@permission_classes([IsAuthenticated,HasScanQuota])
 def bulk_scan_create(request):
     serializer = ScannedCreateSerializer(data = request.data , many = True)
     if serializer.is_valid():
-        scan = [ScannedItem(**data) for data in serializer.validated_data]
-        ScannedItem.objects.bulk_create(scan)
+        result = ScanService.create_scans(request.user,serializer.validated_data)
+        if not result['success']:
+            return Response(
+                {
+                    'error':result['error'],
+                    'remaining_scans':result.get('remaining_scans',0)
+                },
+                status = status.HTTP_402_PAYMENT_REQUIRED
+            )
 
         return Response(
             {
-                "message": f"{len(scan)} scan created"
+                "message": f"{len(result['scans'])} scan created",
+                'remaining_scans': result['remaining_scans']
             },
             status = status.HTTP_201_CREATED
         )
@@ -40,60 +68,79 @@ def upgrade_link():
 
 
 @api_view(['GET'])
-def scan_stats(request):
-
-    total_scans = ScannedItem.objects.count()
-
-    today = timezone.now().date()
-    today_scans = ScannedItem.objects.filter(timestamp_date=today).count()
-
-    if today_scans == 5:
-        return Response(
-            {
-                "message": "limit extended"
-            },
-            upgrade_link()
-        )
-    
-    scan_type_breakfown = dict(ScannedItem.objects.value_list('scan_type').annotate(
-        count = Count('id')
-    ).order_by('-count'))
-
-    status_breakdown = dict(ScannedItem.objects.values_list('status').annotate(
-        count=Count('id')
-    ).order_by('-count'))
-
-    stats = {
-        'total_scans' : total_scans,
-        'today_scans': today_scans,
-        'scan_type_breakdown': scan_type_breakfown,
-        'status_breakdown': status_breakdown
-    }
-
-    return Response(stats)
+@permission_classes([IsAdminUser])
+def global_scan_stats(request):
+    return Response(StatsService.global_stats())
 
 
+@query_budget(3)
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
 def recent_scans(request):
-    limit = request.GET.get('limit',5)
-    scans = ScannedItem.objects.all()[:int(limit)]
-    serializer = ScannedItemSerializer(scans,many = True)
-    return Response(serializer.data)
+    paginator = RecentScansPagination()
+    scans = paginator.paginate_queryset(ScannedItem.objects.filter(user = request.user).values(*ScannedItemListSerializer.COLUMNS),request)
+    serializer = ScannedItemListSerializer(scans,many = True,context = {'request':request})
+    return paginator.get_paginated_response(serializer.data)
 
 
 
 
 class ScannedItemListCreateView(generics.ListCreateAPIView):
     serializer_class = ScannedItemSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated,HasScanQuota]
+    pagination_class = ScanCursorPagination
+    # Session/token auth included; POST also spends quota, updates the rollup
+    # and search index and re-reads the entitlement (13 measured for text and
+    # image scans, see QueryBudgetTests).
+    query_budget = {'GET':4,'POST':13}
 
     def get_queryset(self):
+        label = self.request.GET.get('label')
+        if label:
+            return LabelService.scans_with_label(self.request.user,label)
         return ScannedItem.objects.filter(user = self.request.user)
+
+    def list(self,request,*args,**kwargs):
+        if request.GET.get('include_archived') in ('1','true'):
+            return self.list_with_archived(request)
+        scans = self.filter_queryset(self.get_queryset()).values(*ScannedItemListSerializer.COLUMNS)
+        page = self.paginate_queryset(scans)
+        serializer = ScannedItemListSerializer(page,many = True,context = self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    def list_with_archived(self,request):
+        # Hot and archived scans merged newest first, with its own keyset cursor.
+        paginator = self.paginator
+        try:
+            scans,next_cursor = ArchiveService.history_page(
+                request.user,
+                ScannedItemListSerializer.COLUMNS,
+                limit = paginator.get_page_size(request),
+                cursor = request.GET.get('cursor'),
+                scan_type = request.GET.get('scan_type')
+            )
+        except ValueError:
+            return Response(
+                {'error':'Invalid cursor'},
+                status = status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = ScannedItemListSerializer(scans,many = True,context = self.get_serializer_context())
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(request.build_absolute_uri(),'cursor',next_cursor)
+        return Response({
+            'next': next_url,
+            'previous': None,
+            'results': serializer.data
+        })
     
+    @tracing.traced('ScannedItemListCreateView.create')
     def create(self,request,*args,**kwargs):
         scan_data = request.data.get('scan_data')
-        scan_type = request.data.get('scan_data','text')
+        scan_type = request.data.get('scan_type','text')
         metadata = request.data.get('metadata',{})
+        image = request.FILES.get('image')
 
         if not scan_data:
             return Response(
@@ -103,19 +150,23 @@ class ScannedItemListCreateView(generics.ListCreateAPIView):
                 status = status.HTTP_400_BAD_REQUEST
             )
         
-        result = ScanService.create.scan(
+        result = ScanService.create_scan(
             user = request.user,
             scan_data = scan_data,
             scan_type = scan_type,
-            metadata = metatdat
+            metadata = metadata,
+            image = image
         )
 
         if result['success']:
-            serializer = ScannedItemSerializer(result['scan'])
+            scan = result['scan']
+            serializer = ScannedItemSerializer(scan)
+            # Image scans are recognised by the process_scans workers; the
+            # client polls the detail endpoint until the status leaves 'pending'.
             return Response({
                 'scan': serializer.data,
                 'remaining_scans': result['remaining_scans']
-            },status = status.HTTP_201_CREATED)
+            },status = status.HTTP_202_ACCEPTED if scan.image else status.HTTP_201_CREATED)
         else:
             return Response(
                 {
@@ -126,19 +177,21 @@ class ScannedItemListCreateView(generics.ListCreateAPIView):
             )
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def scan_stats(request):
-    stats: ScanService.get_user_stats(request.user)
+    stats = ScanService.get_user_stats(request.user)
     if stats:
         return Response(stats)
     else:
         return Response(
             {'error':'User stats not found'},
-            status = Status.HTTP_404_NOT_FOUND
+            status = status.HTTP_404_NOT_FOUND
         )
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_subscription_status(request):
@@ -150,7 +203,7 @@ def user_subscription_status(request):
         'premium_expiry': profile.premium_expiry,
         'free_scans_used': profile.free_scans_used,
         'max_free_scans': profile.max_free_scans,
-        'remaining_scans':profile.get_remaining_scan(),
+        'remaining_scans':profile.get_remaining_scans(),
         'total_scans': profile.scan_count
     }
 
@@ -161,7 +214,7 @@ def user_subscription_status(request):
             'end_date': subscription.end_date
         }
 
-        return Response(response_data)
+    return Response(response_data)
     
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -248,4 +301,113 @@ def payment_status(request,payment_id):
         return Response(
             {'error': result['error']}, 
             status=status.HTTP_404_NOT_FOUND
-        )
\ No newline at end of file
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def provider_health_status(request):
+    # Breaker state and latency stats as seen by the worker serving this request.
+    return Response({
+        'providers': provider_health.snapshot(),
+        'detection_cache': get_detection_cache().stats()
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_scans(request):
+    # ?file_format= rather than ?format=, which DRF reserves for renderer selection.
+    snapshot = EntitlementService.get_snapshot(request.user)
+    if snapshot is None or not EntitlementService.premium_active(snapshot):
+        return Response(
+            {'error':'Export is a premium feature. Please upgrade to premium.'},
+            status = status.HTTP_402_PAYMENT_REQUIRED
+        )
+
+    export_format = request.GET.get('file_format','csv')
+    if export_format not in ExportService.available_formats():
+        return Response(
+            {'error':f"Unsupported format. Choose one of: {', '.join(ExportService.available_formats())}"},
+            status = status.HTTP_400_BAD_REQUEST
+        )
+
+    dates = {}
+    for name in ('start','end'):
+        value = request.GET.get(name)
+        if not value:
+            continue
+        try:
+            dates[name] = parse_date(value)
+        except ValueError:
+            dates[name] = None
+        if dates[name] is None:
+            return Response(
+                {'error':f"{name} must be a date in YYYY-MM-DD format"},
+                status = status.HTTP_400_BAD_REQUEST
+            )
+
+    compress = request.GET.get('compress') == 'gzip'
+    rows = ExportService.rows(
+        request.user,
+        scan_type = request.GET.get('scan_type'),
+        include_archived = request.GET.get('include_archived') in ('1','true'),
+        **dates
+    )
+
+    content_type = ExportService.FORMATS[export_format][0]
+    if compress and export_format != 'parquet':
+        content_type = 'application/gzip'
+
+    response = StreamingHttpResponse(ExportService.stream(rows,export_format,compress),content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{ExportService.filename(request.user,export_format,compress)}"'
+    return response
+
+
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_scans(request):
+    query = request.GET.get('q','').strip()
+    if not query:
+        return Response(
+            {'error':'Search query (q) is required'},
+            status = status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        page = max(1,int(request.GET.get('page',1)))
+        page_size = min(100,max(1,int(request.GET.get('page_size',20))))
+    except ValueError:
+        return Response(
+            {'error':'page and page_size must be integers'},
+            status = status.HTTP_400_BAD_REQUEST
+        )
+
+    scans,has_more = SearchService.search(request.user,query,ScannedItemListSerializer.COLUMNS,limit=page_size,offset=(page - 1) * page_size)
+    serializer = ScannedItemListSerializer(scans,many = True,context = {'request':request})
+    return Response({
+        'query': query,
+        'page': page,
+        'has_more': has_more,
+        'results': serializer.data
+    })
+
+
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def top_labels(request):
+    try:
+        days = min(365,max(1,int(request.GET.get('days',7))))
+        limit = min(100,max(1,int(request.GET.get('limit',10))))
+    except ValueError:
+        return Response(
+            {'error':'days and limit must be integers'},
+            status = status.HTTP_400_BAD_REQUEST
+        )
+
+    return Response({
+        'days': days,
+        'labels': LabelService.top_labels(request.user,days=days,limit=limit)
+    })
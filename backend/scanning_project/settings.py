@@ -44,11 +44,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'scanning_app.middleware.metrics_middleware.MetricsMiddleware',
+    'scanning_app.middleware.query_count_middleware.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'scanning_app.middleware.profiling_middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -132,6 +135,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'scanning_app.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -144,3 +151,137 @@ STATICFILES_DIRS = [(os.path.join(BASE_DIR, 'static'))]
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Vision service
+# 'sequential' tries providers one after another, 'hedged' starts the next
+# provider after VISION_HEDGE_DELAY seconds (or on failure) and keeps the first answer.
+VISION_DETECTION_MODE = 'sequential'
+VISION_HEDGE_DELAY = 1.5
+VISION_HEDGE_MAX_WORKERS = 8
+
+# Detection/product cache, keyed by the SHA-256 of the image bytes.
+# BACKEND is 'lru' (per process), 'sqlite' (shared file) or 'django' (CACHES alias).
+VISION_CACHE = {
+    'BACKEND': 'lru',
+    'MAX_ENTRIES': 1024,
+    'MAX_BYTES': 64 * 1024 * 1024,
+    'TTL': 3600,
+    'PATH': os.path.join(BASE_DIR, 'vision_cache.sqlite3'),
+    'CACHE_ALIAS': 'default',
+}
+
+# Outbound provider HTTP: pooled keep-alive session per upstream host.
+VISION_HTTP_POOL_SIZE = 10
+VISION_HTTP_CONNECT_RETRIES = 2
+# Upstream host -> base URL rewrites ('*' matches every host), used to point
+# providers at the run_provider_standin server for benchmarks.
+VISION_HTTP_HOST_OVERRIDES = {}
+
+# Per-provider circuit breaker: open after FAILURE_THRESHOLD consecutive
+# failures, allow one probe after COOLDOWN seconds. Latency/success stats fade
+# back to the untried prior with DECAY_HALF_LIFE seconds without samples, and
+# EXPLORE_RATE of rankings try a lower-ranked provider first.
+VISION_CIRCUIT_BREAKER = {
+    'FAILURE_THRESHOLD': 5,
+    'COOLDOWN': 30,
+    'EWMA_ALPHA': 0.2,
+    'DECAY_HALF_LIFE': 60,
+    'EXPLORE_RATE': 0.02,
+}
+
+# Label categorization runs locally; unknown labels are looked up on Datamuse
+# in the background and remembered in the LabelCategory table. Labels not
+# found anywhere are answered 'other' without a lookup for MISS_TTL seconds.
+VISION_CATEGORY_ENRICHMENT = True
+VISION_CATEGORY_MEMO_SIZE = 10000
+VISION_CATEGORY_MISS_TTL = 300
+
+# Images are oriented, downscaled and re-encoded once before upload to providers.
+VISION_IMAGE_MAX_EDGE = 1600
+VISION_IMAGE_FORMAT = 'JPEG'
+VISION_IMAGE_QUALITY = 85
+
+# Micro-batching for providers with batch endpoints (Google Vision, Clarifai):
+# concurrent detections are grouped for up to MAX_WAIT seconds per upstream call.
+# Only detections running at the same time in one process are merged: a
+# process_scans worker's claimed batch (--batch-size > 1) or concurrent web
+# requests in a threaded server. With one detection at a time it only adds
+# MAX_WAIT to each call.
+VISION_BATCHING = {
+    'ENABLED': False,
+    'MAX_BATCH_SIZE': 16,
+    'MAX_WAIT': 0.05,
+}
+
+# Hard upper bound, in seconds, on the provider/enrichment waterfall for one scan.
+VISION_SCAN_DEADLINE = 20
+
+# Scan quota enforcement (HasScanQuota on the scan create view): cached
+# per-user entitlement snapshot lifetime in seconds.
+SCAN_ENTITLEMENT_TTL = 30
+
+# Entitlement snapshots and cached stats must be shared by every worker, or a
+# purchase or expiry only invalidates the snapshot in the process that saw
+# it. The file cache covers all workers on one host; with several hosts point
+# this at Redis or Memcached instead.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    }
+}
+
+# Global scan stats are summed from the daily rollup and cached for this many seconds.
+SCAN_STATS_CACHE_TTL = 60
+
+# Rows fetched per database round trip (and per Parquet row group) when exporting scan history.
+SCAN_EXPORT_CHUNK_SIZE = 2000
+
+# archive_scans moves processed/failed scans older than this many days into
+# zlib-compressed ArchivedScan rows, keeping the hot ScannedItem table small.
+SCAN_ARCHIVE_RETENTION_DAYS = 180
+SCAN_ARCHIVE_COMPRESSION_LEVEL = 6
+
+# Prometheus metrics are served at /metrics. Under gunicorn, set the
+# PROMETHEUS_MULTIPROC_DIR environment variable to an empty directory before
+# the workers start, and use scanning_app.metrics.child_exit as the
+# child_exit hook, so all workers are aggregated. Only clients in ALLOWED_IPS
+# (addresses or CIDR networks), or sending "Authorization: Bearer <TOKEN>"
+# when TOKEN is set, may read them.
+METRICS = {
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+    'TOKEN': '',
+}
+
+# Span tracing of a scan from the view through providers and outbound HTTP.
+# EXPORTER is any class with export(span); JSONLExporter appends to OPTIONS['path'].
+# Outbound calls send the traceparent header only to PROPAGATE_HOSTS (host
+# names, or '.example.com' for a whole domain), never to the vision providers.
+TRACING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 1.0,
+    'EXPORTER': 'scanning_app.tracing.JSONLExporter',
+    'OPTIONS': {'path': os.path.join(BASE_DIR, 'traces.jsonl')},
+    'PROPAGATE_HOSTS': [],
+}
+
+# Opt-in request profiling. When ENABLED is False the middleware is dropped at
+# startup. SAMPLE_RATE of requests, and requests carrying the X-Profile header
+# from a staff user (or with TOKEN as its value), are profiled into DIRECTORY:
+# MODE 'sampling' writes collapsed stacks for flamegraphs (plus a per-process
+# running total, rewritten every FLUSH_INTERVAL seconds), MODE 'cprofile'
+# writes .prof files for pstats/snakeviz.
+PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.0,
+    'HEADER': 'X-Profile',
+    'TOKEN': '',
+    'MODE': 'sampling',
+    'INTERVAL': 0.005,
+    'FLUSH_INTERVAL': 60,
+    'DIRECTORY': os.path.join(BASE_DIR, 'profiles'),
+}
+
+# Per-request SQL counts go to the scanning_request_db_* metrics; with this on
+# they are also sent as X-DB-Query-Count / X-DB-Query-Time-Ms headers.
+QUERY_COUNT_HEADERS = DEBUG